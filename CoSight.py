@@ -16,17 +16,21 @@ from datetime import datetime
 from app.cosight.agent.actor.instance.actor_agent_instance import create_actor_instance
 from llm import llm_for_plan, llm_for_act, llm_for_tool, llm_for_vision
 from app.cosight.task.plan_report_manager import plan_report_event_manager
+from app.agent_dispatcher.domain.plan.action.skill.mcp.tool_cache import mcp_tool_cache
 
 
+import asyncio
 import os
 import time
-from threading import Thread
+from functools import partial
 
 from app.cosight.agent.actor.task_actor_agent import TaskActorAgent
 from app.cosight.agent.planner.instance.planner_agent_instance import create_planner_instance
 from app.cosight.agent.planner.task_plannr_agent import TaskPlannerAgent
 from app.cosight.task.task_manager import TaskManager
 from app.cosight.task.todolist import Plan
+from app.cosight.task.step_scheduler import step_scheduler
+from config.config import get_step_scheduler_config
 from app.cosight.task.time_record_util import time_record
 from app.common.logger_util import logger
 
@@ -42,6 +46,8 @@ class CoSight:
         self.act_llm = act_llm  # Store llm for later use
         self.tool_llm = tool_llm
         self.vision_llm = vision_llm
+        # 规划期间在后台预热MCP工具列表，步骤开始时构造执行智能体无需等待工具发现
+        mcp_tool_cache.prefetch_configured()
 
     @time_record
     def execute(self, question, output_format=""):
@@ -52,62 +58,44 @@ class CoSight:
             create_task += f"\nThe plan creation result is: {create_result}\nCreation failed, please carefully review the plan creation rules and select the create_plan tool to create the plan"
             retry_count += 1
         
-        # 使用持续监控的方式，而不是等待所有步骤完成
-        active_threads = {}  # 存储活跃的线程 {step_index: thread}
-        
-        while True:
-            # 检查是否有新的可执行步骤
-            ready_steps = self.plan.get_ready_steps()
-            
-            # 启动新的可执行步骤
-            for step_index in ready_steps:
-                if step_index not in active_threads:
-                    logger.info(f"Starting new step {step_index}")
-                    thread = Thread(target=self._execute_single_step, args=(question, step_index))
-                    thread.daemon = True
-                    thread.start()
-                    active_threads[step_index] = thread
-            
-            # 检查已完成的线程
-            completed_steps = []
-            for step_index, thread in active_threads.items():
-                if not thread.is_alive():
-                    completed_steps.append(step_index)
-            
-            # 移除已完成的线程
-            for step_index in completed_steps:
-                del active_threads[step_index]
-                logger.info(f"Step {step_index} completed and thread removed")
-            
-            # 如果没有活跃线程且没有可执行步骤，则退出
-            if not active_threads and not ready_steps:
-                logger.info("No more ready steps to execute and no active threads")
-                break
-            
-            # 短暂休眠，避免CPU占用过高
-            import time
-            time.sleep(0.1)
-        
+        # 事件驱动调度：步骤结束即唤醒调度器，DAG执行完毕后立即进入总结
+        execute_step = self._aexecute_single_step if get_step_scheduler_config()["async_agent"] else self._execute_single_step
+        step_scheduler.run(self.plan_id, self.plan, partial(execute_step, question))
+
         return self.task_planner_agent.finalize_plan(question, output_format)
 
+    def _create_actor_agent(self, step_index) -> TaskActorAgent:
+        return TaskActorAgent(
+            create_actor_instance(f"actor_for_step_{step_index}", self.work_space_path),
+            self.act_llm,
+            self.vision_llm,
+            self.tool_llm,
+            self.plan_id,
+            work_space_path=self.work_space_path
+        )
+
     def _execute_single_step(self, question, step_index):
         """执行单个步骤"""
         try:
             logger.info(f"Starting execution of step {step_index}")
             # 每个线程创建独立的TaskActorAgent实例
-            task_actor_agent = TaskActorAgent(
-                create_actor_instance(f"actor_for_step_{step_index}", self.work_space_path),
-                self.act_llm,
-                self.vision_llm,
-                self.tool_llm,
-                self.plan_id,
-                work_space_path=self.work_space_path
-            )
+            task_actor_agent = self._create_actor_agent(step_index)
             result = task_actor_agent.act(question=question, step_index=step_index)
             logger.info(f"Completed execution of step {step_index} with result: {result}")
         except Exception as e:
             logger.error(f"Error executing step {step_index}: {e}", exc_info=True)
 
+    async def _aexecute_single_step(self, question, step_index):
+        """以协程方式执行单个步骤，模型调用期间不占用线程"""
+        try:
+            logger.info(f"Starting execution of step {step_index}")
+            # 构造时可能等待MCP工具发现，放到线程中执行
+            task_actor_agent = await asyncio.to_thread(self._create_actor_agent, step_index)
+            result = await task_actor_agent.aact(question=question, step_index=step_index)
+            logger.info(f"Completed execution of step {step_index} with result: {result}")
+        except Exception as e:
+            logger.error(f"Error executing step {step_index}: {e}", exc_info=True)
+
     def execute_steps(self, question, ready_steps):
         from threading import Thread, Semaphore
         from queue import Queue
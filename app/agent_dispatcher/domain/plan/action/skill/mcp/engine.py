@@ -20,6 +20,7 @@ from app.agent_dispatcher.infrastructure.entity.exception.ZaeFrameworkException
     NaeFrameworkException
 
 from app.agent_dispatcher.domain.plan.action.skill.mcp.server import MCPServerStdio, MCPServerSse
+from app.agent_dispatcher.domain.plan.action.skill.mcp.session_pool import MCPSessionPool
 from app.common.logger_util import logger
 
 mcp_servers = []
@@ -39,34 +40,45 @@ class MCPEngine:
     @staticmethod
     async def get_mcp_tools(name, config) -> list[MCPTool]:
         """Get all function tools from a single MCP server."""
-        server = None
         try:
-            server = MCPEngine.get_server(name, config)
-            await server.connect()
-            tools = await server.list_tools()
-            return tools
+            return await mcp_session_pool.alist_tools(name, config)
+        except Exception as e:
+            logger.error(f"Error invoking MCP tool {name}: {e}",exc_info=True)
+            return []
+
+    @staticmethod
+    def get_mcp_tools_sync(name, config) -> list[MCPTool]:
+        """Synchronous version of `get_mcp_tools`, no event loop needed in the calling thread."""
+        try:
+            return mcp_session_pool.list_tools(name, config)
         except Exception as e:
             logger.error(f"Error invoking MCP tool {name}: {e}",exc_info=True)
             return []
-        finally:
-            if server:
-                await server.cleanup()
 
     @staticmethod
     async def invoke_mcp_tool(name, config, tool_name, input_json: dict = {}):
         """Invoke an MCP tool and return the result as a string."""
         logger.info(f"Invoke MCP tool {tool_name}, {input_json}")
-        server = None
         try:
-            server = MCPEngine.get_server(name, config)
-            await server.connect()
-            result = await server.call_tool(tool_name, input_json)
+            result = await mcp_session_pool.acall_tool(name, config, tool_name, input_json)
         except Exception as e:
             logger.error(f"Error invoking MCP tool {tool_name}: {e}",exc_info=True)
             raise NaeFrameworkException(MCP_ERROR, f"Error invoking MCP tool {tool_name}")
-        finally:
-            if server:
-                await server.cleanup()
+        return MCPEngine._to_tool_output(tool_name, result)
+
+    @staticmethod
+    def invoke_mcp_tool_sync(name, config, tool_name, input_json: dict = {}):
+        """Synchronous version of `invoke_mcp_tool`, no event loop needed in the calling thread."""
+        logger.info(f"Invoke MCP tool {tool_name}, {input_json}")
+        try:
+            result = mcp_session_pool.call_tool(name, config, tool_name, input_json)
+        except Exception as e:
+            logger.error(f"Error invoking MCP tool {tool_name}: {e}",exc_info=True)
+            raise NaeFrameworkException(MCP_ERROR, f"Error invoking MCP tool {tool_name}")
+        return MCPEngine._to_tool_output(tool_name, result)
+
+    @staticmethod
+    def _to_tool_output(tool_name, result) -> str:
         logger.info(f"MCP tool {tool_name} returned {result}")
 
         # The MCP tool result is a list of content items, whereas OpenAI tool outputs are a single
@@ -85,3 +97,7 @@ class MCPEngine:
             tool_output = "Error running tool."
 
         return tool_output
+
+
+# Sessions are pooled process-wide and reused across tool calls instead of connecting per call
+mcp_session_pool = MCPSessionPool(MCPEngine.get_server)
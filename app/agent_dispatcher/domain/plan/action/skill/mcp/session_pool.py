@@ -0,0 +1,295 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import atexit
+import hashlib
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from mcp import Tool as MCPTool
+from mcp.types import CallToolResult
+
+from app.agent_dispatcher.domain.plan.action.skill.mcp.server import MCPServer
+from app.common.logger_util import logger
+from config.config import get_mcp_pool_config
+
+# Interval (seconds) between scans for idle connections
+_REAPER_INTERVAL = 30
+# Timeout (seconds) of the ping used as health check
+_PING_TIMEOUT = 10
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """Stable hash of an MCP server config, part of the pool key."""
+    return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class _PooledServer:
+    """A pooled connection to one MCP server. Only touched from the pool's event loop."""
+
+    def __init__(self, name: str, config: Dict[str, Any], max_concurrent_calls: int):
+        self.name = name
+        self.config = config
+        self.server: Optional[MCPServer] = None
+        self.semaphore = asyncio.Semaphore(max_concurrent_calls)
+        self.connect_lock = asyncio.Lock()
+        self.closed: Optional[asyncio.Event] = None
+        # The task that connected the server also cleans it up: the transports use anyio
+        # cancel scopes, which must be exited from the task that entered them.
+        self.owner_task: Optional[asyncio.Task] = None
+        self.in_flight = 0
+        self.calls = 0
+        self.connects = 0
+        self.last_used = time.monotonic()
+        self.last_checked = time.monotonic()
+
+
+class MCPSessionPool:
+    """Process-wide pool of connected MCP sessions keyed by (mcp_name, config hash).
+
+    All sessions live on one dedicated background event loop, so stdio servers are spawned
+    and initialized once and then reused across tool calls, agents and threads. Connections
+    are health-checked with a ping after being idle, closed after an idle timeout, limited
+    to a number of concurrent calls per server, and reconnected when the server has died.
+    """
+
+    def __init__(self, server_factory: Callable[[str, Dict[str, Any]], MCPServer]):
+        self._server_factory = server_factory
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._start_lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], _PooledServer] = {}
+        self._config: Optional[Dict[str, Any]] = None
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        if self._config is None:
+            self._config = get_mcp_pool_config()
+        return self._config
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                # Subprocess transports need the proactor loop on Windows
+                loop = asyncio.ProactorEventLoop() if sys.platform == "win32" else asyncio.new_event_loop()
+                started = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(started.set)
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="mcp-session-pool", daemon=True).start()
+                started.wait()
+                self._loop = loop
+                asyncio.run_coroutine_threadsafe(self._reap_idle(), loop)
+                atexit.register(self.shutdown)
+                logger.info("MCP session pool started")
+            return self._loop
+
+    def _submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _request_timeout(self) -> float:
+        """Upper bound for one request, including queueing, connecting and the health check."""
+        return self.config["connect_timeout"] + self.config["call_timeout"] + _PING_TIMEOUT
+
+    def _wait(self, future: Future, what: str):
+        """Wait for a request submitted to the pool loop, cancelling it if it exceeds the request timeout."""
+        timeout = self._request_timeout()
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if future.done():
+                # A timeout raised by the request itself
+                raise
+            future.cancel()
+            raise TimeoutError(f"MCP {what} did not complete within {timeout:.0f}s")
+
+    def call_tool(self, name: str, config: Dict[str, Any], tool_name: str,
+                  arguments: Optional[Dict[str, Any]] = None) -> CallToolResult:
+        """Invoke a tool from synchronous code (blocks the calling thread only)."""
+        return self._wait(self._submit(self._call_tool(name, config, tool_name, arguments)),
+                          f"call {name}.{tool_name}")
+
+    async def acall_tool(self, name: str, config: Dict[str, Any], tool_name: str,
+                         arguments: Optional[Dict[str, Any]] = None) -> CallToolResult:
+        """Invoke a tool from any event loop."""
+        return await asyncio.wait_for(asyncio.wrap_future(self._submit(self._call_tool(name, config, tool_name, arguments))),
+                                      timeout=self._request_timeout())
+
+    def list_tools(self, name: str, config: Dict[str, Any]) -> list[MCPTool]:
+        return self._wait(self._submit(self._list_tools(name, config)), f"list_tools of {name}")
+
+    async def alist_tools(self, name: str, config: Dict[str, Any]) -> list[MCPTool]:
+        return await asyncio.wait_for(asyncio.wrap_future(self._submit(self._list_tools(name, config))),
+                                      timeout=self._request_timeout())
+
+    def _get_entry(self, name: str, config: Dict[str, Any]) -> _PooledServer:
+        key = (name, config_hash(config))
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = _PooledServer(name, config, self.config["max_concurrent_calls"])
+            self._entries[key] = entry
+        return entry
+
+    async def _call_tool(self, name, config, tool_name, arguments) -> CallToolResult:
+        entry = self._get_entry(name, config)
+        async with entry.semaphore:
+            entry.in_flight += 1
+            try:
+                for attempt in range(2):
+                    server = await self._ensure_connected(entry)
+                    try:
+                        result = await asyncio.wait_for(server.call_tool(tool_name, arguments),
+                                                        timeout=self.config["call_timeout"])
+                        entry.calls += 1
+                        entry.last_checked = time.monotonic()
+                        return result
+                    except asyncio.TimeoutError:
+                        # The call may still be running on the server, do not retry it
+                        raise
+                    except Exception as e:
+                        # Errors from a live server are tool errors; only a dead connection is retried
+                        if attempt > 0 or await self._is_healthy(server):
+                            raise
+                        logger.warning(f"MCP server {name} connection lost during {tool_name}, reconnecting: {e}")
+                        async with entry.connect_lock:
+                            if entry.server is server:
+                                await self._close(entry)
+            finally:
+                entry.in_flight -= 1
+                entry.last_used = time.monotonic()
+
+    async def _list_tools(self, name, config) -> list[MCPTool]:
+        entry = self._get_entry(name, config)
+        server = await self._ensure_connected(entry)
+        entry.last_used = time.monotonic()
+        return await asyncio.wait_for(server.list_tools(), timeout=self.config["call_timeout"])
+
+    async def _ensure_connected(self, entry: _PooledServer) -> MCPServer:
+        async with entry.connect_lock:
+            server = entry.server
+            if server is not None and entry.owner_task is not None and not entry.owner_task.done():
+                if time.monotonic() - entry.last_checked < self.config["health_check_interval"]:
+                    return server
+                if await self._is_healthy(server):
+                    entry.last_checked = time.monotonic()
+                    return server
+                logger.warning(f"MCP server {entry.name} failed health check, reconnecting")
+            if entry.owner_task is not None:
+                await self._close(entry)
+            await self._open(entry)
+            return entry.server
+
+    async def _open(self, entry: _PooledServer) -> None:
+        ready = asyncio.get_running_loop().create_future()
+        entry.closed = asyncio.Event()
+        entry.owner_task = asyncio.create_task(self._own_server(entry, ready))
+        await ready
+        entry.connects += 1
+        entry.last_checked = time.monotonic()
+
+    async def _own_server(self, entry: _PooledServer, ready: asyncio.Future) -> None:
+        start = time.monotonic()
+        server = self._server_factory(entry.name, entry.config)
+        timeout = self.config["connect_timeout"]
+        try:
+            await asyncio.wait_for(server.connect(), timeout=timeout)
+        except asyncio.TimeoutError:
+            # connect() only cleans up after errors, not after being cancelled by the timeout
+            await server.cleanup()
+            ready.set_exception(TimeoutError(f"MCP server {entry.name} did not connect within {timeout:.0f}s"))
+            return
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        except BaseException:
+            ready.cancel()
+            raise
+        entry.server = server
+        ready.set_result(None)
+        logger.info(f"MCP server {entry.name} connected in {time.monotonic() - start:.2f}s and pooled")
+        try:
+            await entry.closed.wait()
+        finally:
+            entry.server = None
+            await server.cleanup()
+
+    async def _close(self, entry: _PooledServer) -> None:
+        task, entry.owner_task = entry.owner_task, None
+        if entry.closed is not None:
+            entry.closed.set()
+        if task is not None:
+            try:
+                await task
+            except Exception as e:
+                logger.warning(f"Error closing MCP server {entry.name}: {e}")
+        entry.server = None
+
+    @staticmethod
+    async def _is_healthy(server: MCPServer) -> bool:
+        session = getattr(server, "session", None)
+        if session is None:
+            return False
+        try:
+            await asyncio.wait_for(session.send_ping(), timeout=_PING_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _reap_idle(self) -> None:
+        """Close connections that have been idle longer than the idle timeout."""
+        while True:
+            await asyncio.sleep(_REAPER_INTERVAL)
+            idle_timeout = self.config["idle_timeout"]
+            for entry in list(self._entries.values()):
+                if entry.owner_task is None or entry.in_flight or time.monotonic() - entry.last_used < idle_timeout:
+                    continue
+                async with entry.connect_lock:
+                    if entry.owner_task is not None and not entry.in_flight:
+                        logger.info(f"Closing idle MCP server {entry.name}")
+                        await self._close(entry)
+
+    async def _close_all(self) -> None:
+        for entry in list(self._entries.values()):
+            await self._close(entry)
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """Close all pooled connections (registered to run at interpreter exit)."""
+        if self._loop is None or not self._loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close_all(), self._loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"Error shutting down MCP session pool: {e}")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Connection state, call counts and in-flight calls per pooled server."""
+        now = time.monotonic()
+        return {
+            f"{name}|{digest}": {
+                "connected": entry.server is not None,
+                "in_flight": entry.in_flight,
+                "calls": entry.calls,
+                "connects": entry.connects,
+                "idle_seconds": round(now - entry.last_used, 1)
+            }
+            for (name, digest), entry in list(self._entries.items())
+        }
@@ -0,0 +1,193 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from mcp import Tool as MCPTool
+
+from app.agent_dispatcher.domain.plan.action.skill.mcp.const import LOCAL_MCP
+from app.agent_dispatcher.domain.plan.action.skill.mcp.engine import mcp_session_pool
+from app.agent_dispatcher.domain.plan.action.skill.mcp.session_pool import config_hash
+from app.common.domain.util.json_util import JsonUtil
+from app.common.logger_util import logger
+from config import mcp_server_config_dir
+from config.config import get_mcp_tool_cache_config
+
+# Seconds before a failed discovery is retried; the previous tool list (if any) is served meanwhile
+_FAILURE_TTL = 30
+# Minimum interval (seconds) between checks of the MCP server config files
+_CONFIG_CHECK_INTERVAL = 1.0
+
+
+def mcp_config_signature(config_dir: str = mcp_server_config_dir) -> Optional[tuple]:
+    """Name, mtime and size of every JSON file in the MCP server config directory, None if unreadable."""
+    try:
+        return tuple(sorted((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size)
+                            for entry in os.scandir(config_dir)
+                            if entry.is_file() and entry.name.endswith(".json")))
+    except OSError:
+        return None
+
+
+class _CachedTools:
+    __slots__ = ("tools", "loaded_at", "generation", "failed")
+
+    def __init__(self, tools: list[MCPTool], loaded_at: float, generation: int, failed: bool = False):
+        self.tools = tools
+        self.loaded_at = loaded_at
+        self.generation = generation
+        self.failed = failed
+
+
+class MCPToolCache:
+    """Process-wide cache of MCP tool schemas keyed by (mcp_name, config hash).
+
+    Entries expire after a TTL and all of them become stale when a JSON file in the MCP server
+    config directory changes. Stale entries are still returned immediately while a single
+    background refresh reloads them, so only the very first discovery of a server waits, and
+    concurrent misses for the same server share one load.
+    """
+
+    def __init__(self, loader: Callable[[str, Dict[str, Any]], list[MCPTool]], config_dir: str,
+                 config: Optional[Dict[str, Any]] = None):
+        self._loader = loader
+        self._config_dir = config_dir
+        self._config = config
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], _CachedTools] = {}
+        self._loading: Dict[Tuple[str, str], Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._generation = 0
+        self._config_signature = None
+        self._config_checked_at = 0.0
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "loads": 0, "failures": 0, "invalidations": 0}
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        if self._config is None:
+            self._config = get_mcp_tool_cache_config()
+        return self._config
+
+    def get(self, name: str, config: Dict[str, Any]) -> list[MCPTool]:
+        """Return the tools of one MCP server, waiting only if they were never discovered before."""
+        self._check_config_changed()
+        key = (name, config_hash(config))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_fresh(entry):
+                    self._stats["hits"] += 1
+                else:
+                    self._stats["stale_hits"] += 1
+                    self._schedule(key, name, config)
+                return entry.tools
+            self._stats["misses"] += 1
+            future = self._schedule(key, name, config)
+        try:
+            return future.result(self.config["load_timeout"])
+        except FutureTimeoutError:
+            # The load keeps running in the background and fills the cache when it finishes
+            logger.warning(f"Discovering tools of MCP server {name} is taking longer than "
+                           f"{self.config['load_timeout']:.0f}s, continuing without them")
+            return []
+
+    def prefetch(self, servers: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Start discovery in the background for servers that are not cached or are stale."""
+        self._check_config_changed()
+        with self._lock:
+            for name, config in servers:
+                key = (name, config_hash(config))
+                entry = self._entries.get(key)
+                if entry is None or not self._is_fresh(entry):
+                    self._schedule(key, name, config)
+
+    def prefetch_configured(self) -> None:
+        """Warm up the cache for every server in the MCP server config directory."""
+        try:
+            skills = JsonUtil.read_all_data(self._config_dir)
+        except Exception as e:
+            logger.warning(f"Failed to read MCP server config for tool prefetch: {e}")
+            return
+        self.prefetch((skill["skill_name"], skill["mcp_server_config"]) for skill in skills
+                      if skill.get("skill_type") == LOCAL_MCP and skill.get("mcp_server_config"))
+
+    def invalidate(self) -> None:
+        """Mark every cached entry stale; they are refreshed on next use."""
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+
+    def _is_fresh(self, entry: _CachedTools) -> bool:
+        ttl = _FAILURE_TTL if entry.failed else self.config["ttl"]
+        return entry.generation == self._generation and time.monotonic() - entry.loaded_at < ttl
+
+    def _schedule(self, key: Tuple[str, str], name: str, config: Dict[str, Any]) -> Future:
+        """Start a load unless one is already running for the key; must be called with the lock held."""
+        future = self._loading.get(key)
+        if future is None:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.config["max_workers"],
+                                                    thread_name_prefix="mcp-tool-cache")
+            future = self._executor.submit(self._load, key, name, config, self._generation)
+            self._loading[key] = future
+        return future
+
+    def _load(self, key: Tuple[str, str], name: str, config: Dict[str, Any], generation: int) -> list[MCPTool]:
+        start = time.monotonic()
+        try:
+            tools = self._loader(name, config)
+            entry = _CachedTools(tools, time.monotonic(), generation)
+            logger.info(f"Discovered {len(tools)} tools from MCP server {name} in {time.monotonic() - start:.2f}s")
+        except Exception as e:
+            logger.error(f"Error listing tools of MCP server {name}: {e}", exc_info=True)
+            with self._lock:
+                previous = self._entries.get(key)
+            entry = _CachedTools(previous.tools if previous else [], time.monotonic(), generation, failed=True)
+        with self._lock:
+            self._entries[key] = entry
+            self._loading.pop(key, None)
+            self._stats["failures" if entry.failed else "loads"] += 1
+        return entry.tools
+
+    def _check_config_changed(self) -> None:
+        now = time.monotonic()
+        if now - self._config_checked_at < _CONFIG_CHECK_INTERVAL:
+            return
+        self._config_checked_at = now
+        signature = mcp_config_signature(self._config_dir)
+        if signature is None:
+            return
+        with self._lock:
+            if self._config_signature is not None and signature != self._config_signature:
+                self._generation += 1
+                self._stats["invalidations"] += 1
+                logger.info("MCP server config changed, cached tool lists marked stale")
+            self._config_signature = signature
+
+    def get_stats(self) -> Dict[str, int]:
+        """Hit/miss counters and the number of cached servers."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["loading"] = len(self._loading)
+        return stats
+
+
+# Tool schemas are discovered once per process and shared by all agents
+mcp_tool_cache = MCPToolCache(mcp_session_pool.list_tools, mcp_server_config_dir)
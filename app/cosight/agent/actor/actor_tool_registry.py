@@ -0,0 +1,148 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from dataclasses import dataclass
+from threading import Lock
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+from app.cosight.llm.chat_llm import ChatLLM
+from app.cosight.task.todolist import Plan
+from app.cosight.tool.act_toolkit import ActToolkit
+from app.cosight.tool.audio_toolkit import AudioTool
+from app.cosight.tool.code_toolkit import CodeToolkit
+from app.cosight.tool.document_processing_toolkit import DocumentProcessingToolkit
+from app.cosight.tool.file_toolkit import FileToolkit
+from app.cosight.tool.html_visualization_toolkit import HtmlVisualizationToolkit
+from app.cosight.tool.image_analysis_toolkit import VisionTool
+from app.cosight.tool.scrape_website_toolkit import fetch_website_content, fetch_website_content_with_images, fetch_website_images_only
+from app.cosight.tool.search_toolkit import SearchToolkit
+from app.cosight.tool.search_util import search_baidu
+from app.cosight.tool.video_analysis_toolkit import VideoTool
+from app.common.logger_util import logger
+
+# 绑定到步骤上下文的工具及其所属工具包，每个步骤单独创建（构造开销可忽略）
+_STEP_FUNCTIONS = {
+    "mark_step": "ActToolkit",
+    "file_saver": "FileToolkit",
+    "file_read": "FileToolkit",
+    "file_str_replace": "FileToolkit",
+    "file_find_in_content": "FileToolkit",
+    "create_html_report": "HtmlVisualizationToolkit",
+}
+
+
+@dataclass(slots=True)
+class StepContext:
+    """单个步骤的执行上下文，工具中所有随步骤变化的状态都从这里获取"""
+    plan_id: str
+    plan: Plan
+    work_space_path: str
+    step_index: Optional[int] = None
+    question: Optional[str] = None
+
+
+class ActorToolRegistry:
+    """执行智能体的进程级工具注册表
+
+    无状态的工具包按模型端点只创建一次，由所有步骤共享；工作区、计划、步骤序号等状态通过
+    StepContext 在 bind 时绑定，构造 TaskActorAgent 时无需重复实例化十几个工具包。
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        # 结构: {vision_llm 端点: {function_name: callable}}
+        self._shared: Dict[Tuple, Mapping[str, Callable]] = {}
+
+    def get_shared_functions(self, vision_llm: ChatLLM) -> Mapping[str, Callable]:
+        """获取共享的无状态工具函数（只读映射）"""
+        key = (vision_llm.base_url, vision_llm.model, vision_llm.api_key)
+        with self._lock:
+            functions = self._shared.get(key)
+            if functions is None:
+                functions = self._build_shared_functions(vision_llm)
+                self._shared[key] = functions
+                logger.info(f"Registered {len(functions)} shared actor tools for vision model {vision_llm.model}")
+            return functions
+
+    @staticmethod
+    def _build_shared_functions(vision_llm: ChatLLM) -> Mapping[str, Callable]:
+        vision_config = {"base_url": vision_llm.base_url,
+                         "model": vision_llm.model,
+                         "api_key": vision_llm.api_key}
+        image_toolkit = VisionTool(vision_config)
+        audio_toolkit = AudioTool(vision_config)
+        video_toolkit = VideoTool(vision_config)
+        doc_toolkit = DocumentProcessingToolkit()
+        search_toolkit = SearchToolkit()
+        code_toolkit = CodeToolkit(sandbox="subprocess")
+        return MappingProxyType({
+            # "deep_search": deep_search_toolkit.deep_search,
+            "search_baidu": search_baidu,
+            "search_google": search_toolkit.search_google,
+            "search_wiki": search_toolkit.search_wiki,
+            "tavily_search": search_toolkit.tavily_search,
+            #  "image_search": tavily_search.search,
+            "audio_recognition": audio_toolkit.speech_to_text,
+            # "search_duckgo": search_toolkit.search_duckduckgo,
+            "execute_code": code_toolkit.execute_code,
+            #  "browser_use": web_toolkit.browser_use,
+            "ask_question_about_image": image_toolkit.ask_question_about_image,
+            "ask_question_about_video": video_toolkit.ask_question_about_video,
+            "fetch_website_content": fetch_website_content,
+            "fetch_website_content_with_images": fetch_website_content_with_images,
+            "fetch_website_images_only": fetch_website_images_only,
+            "extract_document_content": doc_toolkit.extract_document_content,
+        })
+
+    def bind(self, context: StepContext, tool_llm: ChatLLM, vision_llm: ChatLLM) -> Dict[str, Callable]:
+        """返回绑定了步骤上下文的完整工具函数表"""
+        functions = dict(self.get_shared_functions(vision_llm))
+        act_toolkit = ActToolkit(context.plan)
+        file_toolkit = FileToolkit(context.work_space_path)
+        html_toolkit = HtmlVisualizationToolkit(workspace_path=context.work_space_path, tool_llm=tool_llm)
+        functions.update({
+            "mark_step": act_toolkit.mark_step,
+            "file_saver": file_toolkit.file_saver,
+            "file_read": file_toolkit.file_read,
+            "file_str_replace": file_toolkit.file_str_replace,
+            "file_find_in_content": file_toolkit.file_find_in_content,
+            "create_html_report": lambda title=None, include_charts=True, chart_types=['all'], output_filename=None: html_toolkit.create_html_report(
+                title=title,
+                include_charts=include_charts,
+                chart_types=chart_types,
+                output_filename=output_filename,
+                user_query=context.question
+            ),
+        })
+        return functions
+
+    def list_tools(self) -> List[Dict[str, Any]]:
+        """列出已注册的工具：名称、所属工具包与作用域（shared 为进程共享，step 为按步骤绑定）"""
+        with self._lock:
+            shared = list(self._shared.values())
+        tools = {}
+        for functions in shared:
+            for name, function in functions.items():
+                owner = getattr(function, "__self__", None)
+                tools[name] = {"name": name,
+                               "toolkit": type(owner).__name__ if owner is not None else function.__module__,
+                               "scope": "shared"}
+        for name, toolkit in _STEP_FUNCTIONS.items():
+            tools[name] = {"name": name, "toolkit": toolkit, "scope": "step"}
+        return sorted(tools.values(), key=lambda tool: tool["name"])
+
+
+actor_tool_registry = ActorToolRegistry()
@@ -13,10 +13,22 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Tuple
+
+from app.agent_dispatcher.domain.plan.action.skill.mcp.tool_cache import mcp_config_signature
 from app.agent_dispatcher.infrastructure.entity.AgentInstance import AgentInstance
 from app.agent_dispatcher.infrastructure.entity.AgentTemplate import AgentTemplate
 from app.cosight.agent.actor.instance.actor_agent_skill import *
 
+# 每次任务使用独立的工作区，只缓存最近使用的若干个
+_TEMPLATE_CACHE_SIZE = 16
+# 结构: {(work_space_path, mcp_config_signature): AgentTemplate}
+_template_cache: "OrderedDict[Tuple[str, tuple], AgentTemplate]" = OrderedDict()
+_template_cache_lock = Lock()
+
 
 def create_actor_instance(agent_instance_name, work_space_path):
     agent_params = {
@@ -30,11 +42,28 @@ def create_actor_instance(agent_instance_name, work_space_path):
         'description_en': 'Specialized assistant for task execution and operations',
         "service_name": 'execution_service',
         "service_version": 'v1',
-        "template": create_actor_template("actor_agent_template", work_space_path)
+        "template": get_actor_template(work_space_path)
     }
     return AgentInstance(**agent_params)
 
 
+def get_actor_template(work_space_path) -> AgentTemplate:
+    """获取共享的执行智能体模板，按工作区与MCP服务配置缓存，模板只读，不应被修改"""
+    work_space_path = work_space_path or os.getenv("WORKSPACE_PATH") or os.getcwd()
+    key = (work_space_path, mcp_config_signature())
+    with _template_cache_lock:
+        template = _template_cache.get(key)
+        if template is None:
+            # MCP配置变更后签名变化，旧模板不再命中，随后被淘汰
+            template = create_actor_template("actor_agent_template", work_space_path)
+            _template_cache[key] = template
+            while len(_template_cache) > _TEMPLATE_CACHE_SIZE:
+                _template_cache.popitem(last=False)
+        else:
+            _template_cache.move_to_end(key)
+        return template
+
+
 def create_actor_template(template_name, work_space_path):
     template_content = {
         'template_name': template_name,
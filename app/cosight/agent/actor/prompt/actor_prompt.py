@@ -123,10 +123,15 @@ You are an assistant helping complete complex tasks. Your goal is to execute tas
 """
     return system_prompt
 
+def _list_workspace_files(workspace_path: str):
+    """工作区文件列表：排序保证提示词前缀稳定（利于提示词缓存），忽略隐藏目录（如落盘的工具结果）"""
+    return sorted(f for f in os.listdir(workspace_path) if not f.startswith('.'))
+
+
 def actor_execute_task_prompt(task, step_index, plan, workspace_path: str):
     workspace_path = workspace_path if workspace_path else os.environ.get("WORKSPACE_PATH") or os.getcwd()
     try:
-        files_list = "\n".join([f"  - {f}" for f in os.listdir(workspace_path)])
+        files_list = "\n".join([f"  - {f}" for f in _list_workspace_files(workspace_path)])
     except Exception as e:
         logger.error(f"Unhandled exception: {e}", exc_info=True)
         files_list = f"  - Error listing files: {str(e)}"
@@ -281,7 +286,7 @@ def actor_system_prompt_zh(work_space_path):
 def actor_execute_task_prompt_zh(task, step_index, plan, workspace_path):
     workspace_path = workspace_path if workspace_path else os.environ.get("WORKSPACE_PATH") or os.getcwd()
     try:
-        files_list = "\n".join([f"  - {f}" for f in os.listdir(workspace_path)])
+        files_list = "\n".join([f"  - {f}" for f in _list_workspace_files(workspace_path)])
     except Exception as e:
         logger.error(f"未处理的异常: {e}", exc_info=True)
         files_list = f"  - 文件列表错误: {str(e)}"
@@ -18,28 +18,13 @@ import re
 from typing import Dict
 
 from app.agent_dispatcher.infrastructure.entity.AgentInstance import AgentInstance
+from app.cosight.agent.actor.actor_tool_registry import StepContext, actor_tool_registry
 from app.cosight.agent.actor.prompt.actor_prompt import actor_system_prompt, actor_system_prompt_zh, actor_execute_task_prompt, actor_execute_task_prompt_zh
 from app.cosight.agent.base.base_agent import BaseAgent
 from app.cosight.llm.chat_llm import ChatLLM
-from app.cosight.task.plan_report_manager import plan_report_event_manager
+from app.cosight.task.plan_report_manager import plan_report_event_manager, PlanStreamListener
 from app.cosight.task.task_manager import TaskManager
 from app.cosight.task.time_record_util import time_record
-from app.cosight.tool.act_toolkit import ActToolkit
-from app.cosight.tool.code_toolkit import CodeToolkit
-from app.cosight.tool.file_toolkit import FileToolkit
-from app.cosight.tool.deep_search.deep_search import DeepSearchToolkit
-from app.cosight.tool.terminate_toolkit import TerminateToolkit
-from app.cosight.tool.web_util import WebToolkit
-from app.cosight.tool.image_analysis_toolkit import VisionTool
-from app.cosight.tool.document_processing_toolkit import DocumentProcessingToolkit
-from app.cosight.tool.search_toolkit import SearchToolkit
-from app.cosight.tool.search_util import search_baidu
-from app.cosight.tool.scrape_website_toolkit import fetch_website_content, fetch_website_content_with_images, fetch_website_images_only
-from app.cosight.tool.deep_search.searchers.tavily_search import TavilySearch
-from app.cosight.tool.audio_toolkit import AudioTool
-from app.cosight.tool.video_analysis_toolkit import VideoTool
-from app.cosight.tool.html_visualization_toolkit import HtmlVisualizationToolkit
-from config.config import get_tavily_config
 from app.common.logger_util import logger
 
 
@@ -63,67 +48,9 @@ class TaskActorAgent(BaseAgent):
             logger.error(f"TaskActorAgent: Plan not found for plan_id: {plan_id}, error: {e}")
             raise ValueError(f"Plan with id '{plan_id}' not found in TaskManager. Available plans: {list(TaskManager.plans.keys())}")
         
-        self.question = None  # Store the question for later use
-        act_toolkit = ActToolkit(self.plan)
-        terminate_toolkit = TerminateToolkit()
-        file_toolkit = FileToolkit(work_space_path)
-        web_toolkit = WebToolkit({"base_url": tool_llm.base_url,
-                                  "model": tool_llm.model,
-                                  "api_key": tool_llm.api_key})
-        image_toolkit = VisionTool({"base_url": vision_llm.base_url,
-                                    "model": vision_llm.model,
-                                    "api_key": vision_llm.api_key})
-        audio_toolkit = AudioTool({"base_url": vision_llm.base_url,
-                                   "model": vision_llm.model,
-                                   "api_key": vision_llm.api_key})
-        video_toolkit = VideoTool({"base_url": vision_llm.base_url,
-                                   "model": vision_llm.model,
-                                   "api_key": vision_llm.api_key})
-        doc_toolkit = DocumentProcessingToolkit()
-        search_toolkit = SearchToolkit()
-        deep_search_toolkit = DeepSearchToolkit({
-            "base_url": tool_llm.base_url,
-            "api_key": tool_llm.api_key,
-            "model_name": tool_llm.model,
-
-        }, {
-
-            # 配置tavily
-            "api_key": get_tavily_config()
-        })
-        code_toolkit = CodeToolkit(sandbox="subprocess")
-        tavily_search = TavilySearch()
-        html_toolkit = HtmlVisualizationToolkit(workspace_path=work_space_path, tool_llm=tool_llm)
-        code_toolkit = CodeToolkit(sandbox="subprocess")
-        all_functions = {"mark_step": act_toolkit.mark_step,
-                         # "deep_search": deep_search_toolkit.deep_search,
-                         "search_baidu": search_baidu,
-                         "search_google": search_toolkit.search_google,
-                         "search_wiki": search_toolkit.search_wiki,
-                         "tavily_search": search_toolkit.tavily_search,
-                        #  "image_search": tavily_search.search,
-                         "audio_recognition": audio_toolkit.speech_to_text,
-                         # "search_duckgo": search_toolkit.search_duckduckgo,
-                         "execute_code": code_toolkit.execute_code,
-                         "file_saver": file_toolkit.file_saver,
-                         "file_read": file_toolkit.file_read,
-                         "file_str_replace": file_toolkit.file_str_replace,
-                         "file_find_in_content": file_toolkit.file_find_in_content,
-                        #  "browser_use": web_toolkit.browser_use,
-                         "ask_question_about_image": image_toolkit.ask_question_about_image,
-                         "ask_question_about_video": video_toolkit.ask_question_about_video,
-                         "fetch_website_content": fetch_website_content,
-                         "fetch_website_content_with_images": fetch_website_content_with_images,
-                         "fetch_website_images_only": fetch_website_images_only,
-                         "extract_document_content": doc_toolkit.extract_document_content,
-                         "create_html_report": lambda title=None, include_charts=True, chart_types=['all'], output_filename=None: html_toolkit.create_html_report(
-                             title=title,
-                             include_charts=include_charts,
-                             chart_types=chart_types,
-                             output_filename=output_filename,
-                             user_query=self.question
-                         ),
-                         }
+        # 工具包由进程级注册表共享，按步骤变化的状态通过 StepContext 绑定
+        self.step_context = StepContext(plan_id, self.plan, self.work_space_path)
+        all_functions = actor_tool_registry.bind(self.step_context, tool_llm, vision_llm)
         if functions:
             all_functions.update(functions)
         
@@ -138,9 +65,43 @@ class TaskActorAgent(BaseAgent):
             sys_prompt = actor_system_prompt(self.work_space_path)
         self.history.append({"role": "system", "content": sys_prompt})
 
+    @property
+    def question(self):
+        return self.step_context.question
+
+    @question.setter
+    def question(self, question):
+        self.step_context.question = question
+
+    def _create_stream_listener(self, step_index=None):
+        """执行步骤时流式推送 mark_step 中的步骤备注"""
+        if step_index is None or self.plan is None:
+            return None
+        step = self.plan.get_step_record(step_index).text
+        return PlanStreamListener.create(self.plan_id, "step_notes", step=step, step_index=step_index)
+
     @time_record
     def act(self, question, step_index):
+        self._start_step(question, step_index)
+        try:
+            result = self.execute(self.history, step_index=step_index)
+            return self._complete_step(step_index, result)
+        except Exception as e:
+            return self._fail_step(step_index, e)
+
+    @time_record
+    async def aact(self, question, step_index):
+        """act 的协程版本：模型调用在事件循环中 await，工具调用在线程中执行，步骤执行期间不占用线程"""
+        self._start_step(question, step_index)
+        try:
+            result = await self.aexecute(self.history, step_index=step_index)
+            return self._complete_step(step_index, result)
+        except Exception as e:
+            return self._fail_step(step_index, e)
+
+    def _start_step(self, question, step_index):
         self.question = question  # Store the question for use in tools
+        self.step_context.step_index = step_index
         
         # Ensure plan is available
         if self.plan is None:
@@ -157,16 +118,17 @@ class TaskActorAgent(BaseAgent):
 
         self.history.append(
             {"role": "user", "content": task_prompt})
-        try:
-            result = self.execute(self.history, step_index=step_index)
-            if self.plan.step_statuses.get(self.plan.steps[step_index], "") == "in_progress":
-                self.plan.mark_step(step_index, step_status="completed", step_notes=str(result))
-                # 步骤完成后，主动上报一次计划进度，确保前端收到manus-step
-                plan_report_event_manager.publish("plan_process", self.plan)
-            return result
-        except Exception as e:
-            logger.error(f'act agent execute error: {str(e)}', exc_info=True)
-            self.plan.mark_step(step_index, step_status="blocked", step_notes=str(e))
-            # 步骤失败同样上报一次计划进度
+
+    def _complete_step(self, step_index, result):
+        if self.plan.get_step_status(step_index) == "in_progress":
+            self.plan.mark_step(step_index, step_status="completed", step_notes=str(result))
+            # 步骤完成后，主动上报一次计划进度，确保前端收到manus-step
             plan_report_event_manager.publish("plan_process", self.plan)
-            return str(e)
+        return result
+
+    def _fail_step(self, step_index, e: Exception):
+        logger.error(f'act agent execute error: {str(e)}', exc_info=True)
+        self.plan.mark_step(step_index, step_status="blocked", step_notes=str(e))
+        # 步骤失败同样上报一次计划进度
+        plan_report_event_manager.publish("plan_process", self.plan)
+        return str(e)
@@ -15,36 +15,40 @@
 
 import inspect
 import json
-import sys
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from app.agent_dispatcher.domain.plan.action.skill.mcp.engine import MCPEngine
 from app.agent_dispatcher.infrastructure.entity.AgentInstance import AgentInstance
-from app.cosight.agent.base.skill_to_tool import convert_skill_to_tool,get_mcp_tools,convert_mcp_tools
+from app.cosight.agent.base.context_compactor import ContextCompactor
+from app.cosight.agent.base.skill_to_tool import get_skill_tools,get_mcp_tools,convert_mcp_tools
 from app.cosight.llm.chat_llm import ChatLLM
+from app.cosight.llm.chat_stream import StreamListener
+from app.cosight.llm.rate_limiter import current_plan_id
 from app.cosight.task.time_record_util import time_record
+from app.cosight.tool.async_runtime import run_coro
 from app.cosight.tool.tool_result_processor import ToolResultProcessor
 from app.cosight.task.plan_report_manager import plan_report_event_manager
 from app.common.logger_util import logger
 from app.cosight.agent.base.tool_arg_mapping import FUNCTION_ARG_MAPPING
+from config.config import get_async_runtime_config
 
 
 class BaseAgent:
     def __init__(self, agent_instance: AgentInstance, llm: ChatLLM, functions: {}, plan_id: str = None):
         self.agent_instance = agent_instance
         self.llm = llm
-        self.tools = []
-        self.mcp_tools = []
         self.mcp_tools = get_mcp_tools(self.agent_instance.template.skills)
-        for skill in self.agent_instance.template.skills:
-            self.tools.extend(convert_skill_to_tool(skill.model_dump(), 'en'))
+        # 技能的工具定义按模板缓存并在智能体之间共享
+        self.tools = list(get_skill_tools(self.agent_instance.template, 'en'))
         self.tools.extend(convert_mcp_tools(self.mcp_tools))
         self.functions = functions
         self.history = []
         self.plan_id = plan_id
+        # 模型调用前按token预算压缩对话历史，超大的工具结果落盘到工作区（子类需在此之前设置 work_space_path）
+        self.context_compactor = ContextCompactor(getattr(self, 'work_space_path', None))
         self._tool_event_sequence = 0  # 工具事件序列号
         self._file_saver_call_count = {}  # 记录每个步骤的file_saver调用次数
         # Only set plan to None if it hasn't been set by subclass
@@ -140,7 +144,7 @@ class BaseAgent:
         推送工具执行事件到队列
         
         Args:
-            event_type: 事件类型 ('tool_start', 'tool_complete', 'tool_error')
+            event_type: 事件类型 ('tool_start', 'tool_complete', 'tool_error')，后续更新见 _push_tool_update
             tool_name: 工具名称
             tool_args: 工具参数
             tool_result: 工具结果
@@ -175,25 +179,62 @@ class BaseAgent:
             if duration is not None:
                 event_data["duration"] = round(duration, 2)
             
+            prepare = None
             if error:
                 event_data["error"] = error
             elif tool_result:
-                # 处理工具结果
                 task_title = self.plan.title if self.plan else ""
-                processed_result = ToolResultProcessor.process_tool_result(tool_name, tool_args, tool_result, task_title)
-                event_data["processed_result"] = processed_result
-                event_data["raw_result_length"] = len(tool_result)
-                
-                # 注入验证信息，包含URL
-                self._inject_verification_info(event_data, tool_name, processed_result)
+
+                def prepare_result(data: dict) -> dict:
+                    # 在事件投递线程中整理工具结果，智能体线程发布后即可继续执行
+                    processed_result = ToolResultProcessor.process_tool_result(tool_name, tool_args, tool_result, task_title,
+                                                                               defer_embeddable_check=True)
+                    data["processed_result"] = processed_result
+                    data["raw_result_length"] = len(tool_result)
+                    
+                    # 注入验证信息，包含URL
+                    self._inject_verification_info(data, tool_name, processed_result)
+                    
+                    # 搜索结果的iframe可嵌入性检查在后台进行，结论稍后以 tool_update 事件推送
+                    ToolResultProcessor.resolve_pending_embeddable(
+                        tool_name, tool_args, processed_result,
+                        lambda updated: self._push_tool_update(data, updated),
+                        task_title
+                    )
+                    return data
+
+                prepare = prepare_result
             
-            # 携带路由键（plan_id）发布事件
-            plan_report_event_manager.publish("tool_event", self.plan_id, event_data)
+            # 携带路由键（plan_id）发布事件，按序号顺序异步投递
+            plan_report_event_manager.publish("tool_event", self.plan_id, event_data, prepare=prepare)
             logger.info(f"Pushed tool event: {event_type} for {tool_name}")
             
         except Exception as e:
             logger.error(f"Failed to push tool event: {e}")
 
+    def _push_tool_update(self, event_data: dict, processed_result: dict):
+        """
+        推送工具事件的后续更新（如搜索结果的iframe可嵌入性检查结论），
+        sequence 与被更新的原事件相同，前端据此替换对应记录的处理结果
+        """
+        try:
+            update_data = {
+                "event_type": "tool_update",
+                "tool_name": event_data["tool_name"],
+                "tool_name_zh": event_data["tool_name_zh"],
+                "tool_args": event_data["tool_args"],
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "step_index": event_data["step_index"],
+                "sequence": event_data["sequence"],
+                "update_of": event_data["event_type"],
+                "processed_result": processed_result
+            }
+            self._inject_verification_info(update_data, event_data["tool_name"], processed_result)
+            plan_report_event_manager.publish("tool_event", self.plan_id, update_data)
+            logger.info(f"Pushed tool update for {event_data['tool_name']} (sequence {event_data['sequence']})")
+        except Exception as e:
+            logger.error(f"Failed to push tool update: {e}")
+
     def _inject_verification_info(self, event_data: dict, tool_name: str, processed_result: dict):
         """注入验证信息到事件数据中"""
         try:
@@ -362,10 +403,18 @@ class BaseAgent:
         # 未在清单中的工具：不返回任何步骤
         return []
 
+    def _create_stream_listener(self, step_index=None) -> Optional[StreamListener]:
+        """模型调用的流式监听者，返回 None 时以非流式调用；子类按需覆盖"""
+        return None
+
     def execute(self, messages: List[Dict[str, Any]], step_index=None, max_iteration=10):  #调试修改的10
+        # 标记当前线程的模型调用所属计划，限流器据此在计划间公平排队
+        current_plan_id.set(self.plan_id or "")
+        listener = self._create_stream_listener(step_index)
         for i in range(max_iteration):
+            self.context_compactor.compact(messages, step_index)
             logger.info(f'act agent call with tools message: {messages}')
-            response = self.llm.create_with_tools(messages, self.tools)
+            response = self.llm.create_with_tools(messages, self.tools, listener=listener)
             logger.info(f'act agent call with tools response: {response}')
 
             # Process initial response
@@ -378,6 +427,26 @@ class BaseAgent:
             return self._handle_max_iteration(messages, step_index)
         return messages[-1].get("content")
 
+    async def aexecute(self, messages: List[Dict[str, Any]], step_index=None, max_iteration=10):
+        """execute 的协程版本：模型调用在事件循环中 await，工具调用放到线程中执行，不阻塞事件循环"""
+        current_plan_id.set(self.plan_id or "")
+        listener = self._create_stream_listener(step_index)
+        for i in range(max_iteration):
+            self.context_compactor.compact(messages, step_index)
+            logger.info(f'act agent call with tools message: {messages}')
+            response = await self.llm.acreate_with_tools(messages, self.tools, listener=listener)
+            logger.info(f'act agent call with tools response: {response}')
+
+            # Process initial response
+            result = await asyncio.to_thread(self._process_response, response, messages, step_index)
+            logger.info(f'iter {i} for {self.agent_instance.instance_name} call tools result: {result}')
+            if result:
+                return result
+
+        if max_iteration > 1:
+            return await self._ahandle_max_iteration(messages, step_index)
+        return messages[-1].get("content")
+
     def _process_response(self, response, messages, step_index):
         if not response.tool_calls:
             messages.append({"role": "assistant", "content": response.content})
@@ -438,7 +507,9 @@ class BaseAgent:
     def _handle_max_iteration(self, messages, step_index):
         messages.append({"role": "user", "content": "Summarize the above conversation, use mark_step to mark the step"})
         mark_step_tools = [tool for tool in self.tools if tool['function']['name'] == 'mark_step']
-        response = self.llm.create_with_tools(messages, mark_step_tools)
+        self.context_compactor.compact(messages, step_index)
+        response = self.llm.create_with_tools(messages, mark_step_tools,
+                                              listener=self._create_stream_listener(step_index))
 
         result = self._process_response(response, messages, step_index)
         if result:
@@ -446,6 +517,19 @@ class BaseAgent:
 
         return messages[-1].get("content")
 
+    async def _ahandle_max_iteration(self, messages, step_index):
+        messages.append({"role": "user", "content": "Summarize the above conversation, use mark_step to mark the step"})
+        mark_step_tools = [tool for tool in self.tools if tool['function']['name'] == 'mark_step']
+        self.context_compactor.compact(messages, step_index)
+        response = await self.llm.acreate_with_tools(messages, mark_step_tools,
+                                                     listener=self._create_stream_listener(step_index))
+
+        result = await asyncio.to_thread(self._process_response, response, messages, step_index)
+        if result:
+            return result
+
+        return messages[-1].get("content")
+
     @time_record
     def _execute_tool_call(self, function_name="", function_args="", tool_call_id="", step_index=None):
         start_time = time.time()
@@ -498,15 +582,10 @@ class BaseAgent:
 
             # 检查是否是异步函数
             if inspect.iscoroutinefunction(function_to_call):
-                # 创建新的事件循环来运行异步函数
-                loop = asyncio.new_event_loop()
-                try:
-                    asyncio.set_event_loop(loop)
-                    # 归一化参数键（含函数名定制映射）
-                    norm_args = self._normalize_tool_args(function_to_call, args_dict, function_name)
-                    result = loop.run_until_complete(function_to_call(**norm_args))
-                finally:
-                    loop.close()
+                # 异步工具提交到共享的后台事件循环执行，超时后取消
+                # 归一化参数键（含函数名定制映射）
+                norm_args = self._normalize_tool_args(function_to_call, args_dict, function_name)
+                result = run_coro(function_to_call(**norm_args), timeout=get_async_runtime_config()["tool_timeout"])
             else:
                 # 同步函数直接调用
                 norm_args = self._normalize_tool_args(function_to_call, args_dict, function_name)
@@ -555,29 +634,18 @@ class BaseAgent:
         # 推送MCP工具开始执行事件
         self._push_tool_event("tool_start", function_name, function_args, step_index=-1)
         
-        loop = None
         try:
             mcp_tool, tool_name = self.find_mcp_tool(function_name)
             if mcp_tool and tool_name:
                 cleaned_args = function_args.replace('\\\'', '\'')
                 args_dict = json.loads(cleaned_args or "{}")
-                # Windows系统需要特殊处理
-                if sys.platform == "win32":
-                    from asyncio import ProactorEventLoop
-                    loop = ProactorEventLoop()
-                else:
-                    loop = asyncio.new_event_loop()
 
-                asyncio.set_event_loop(loop)
-
-                # 执行异步调用
-                result = loop.run_until_complete(
-                    MCPEngine.invoke_mcp_tool(
-                        mcp_tool['mcp_name'],
-                        mcp_tool['mcp_config'],
-                        tool_name,
-                        args_dict
-                    )
+                # 通过进程级MCP会话池调用，复用已建立的连接，无需每次新建事件循环与子进程
+                result = MCPEngine.invoke_mcp_tool_sync(
+                    mcp_tool['mcp_name'],
+                    mcp_tool['mcp_config'],
+                    tool_name,
+                    args_dict
                 )
                 
                 # 计算执行时间
@@ -630,8 +698,3 @@ class BaseAgent:
                 "tool_call_id": tool_call_id,
                 "content": f"Execution error: {str(e)}"
             }
-        finally:
-            # 清理事件循环
-            if loop:
-                loop.close()
-                asyncio.set_event_loop(None)
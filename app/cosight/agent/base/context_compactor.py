@@ -0,0 +1,138 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+
+from app.cosight.llm.rate_limiter import estimate_tokens
+from app.common.logger_util import logger
+from config.config import get_context_compaction_config
+
+# 工作区内存放完整工具结果的目录
+TOOL_RESULTS_DIR = ".tool_results"
+
+
+@dataclass(slots=True)
+class CompactionStats:
+    """单次模型调用前的压缩结果"""
+    tokens: int
+    tokens_saved: int
+    newly_saved: int
+    offloaded: int
+    truncated: int
+
+
+class ContextCompactor:
+    """模型调用前的上下文压缩：在 BaseAgent 与 ChatLLM 之间按 token 预算压缩对话历史
+
+    - 首条 assistant 消息之前的系统提示词与任务提示词原样保留，保证前缀字节稳定，便于服务端命中提示词缓存
+    - 超大的工具结果首次出现时即落盘到工作区，上下文中只保留预览与文件路径
+    - 超出预算时从最早的工具结果开始截断，最近的若干个工具结果保留原文
+    每条消息只压缩一次且直接修改历史，之后的调用中已压缩部分同样保持字节稳定。
+    """
+
+    def __init__(self, work_space_path: Optional[str] = None, token_budget: Optional[int] = None,
+                 keep_recent_tool_results: Optional[int] = None, offload_chars: Optional[int] = None,
+                 truncate_chars: Optional[int] = None):
+        config = get_context_compaction_config()
+        self.work_space_path = work_space_path
+        self.token_budget = token_budget if token_budget is not None else config["token_budget"]
+        self.keep_recent_tool_results = keep_recent_tool_results if keep_recent_tool_results is not None \
+            else config["keep_recent_tool_results"]
+        self.offload_chars = offload_chars if offload_chars is not None else config["offload_chars"]
+        self.truncate_chars = truncate_chars if truncate_chars is not None else config["truncate_chars"]
+        # 已检查过是否需要落盘、已截断的工具消息（按 tool_call_id）
+        self._inspected: Set[str] = set()
+        self._compacted: Set[str] = set()
+        # 历史中累计节省的token数（相对未压缩的历史）
+        self.tokens_saved = 0
+
+    def compact(self, messages: List[Dict[str, Any]], step_index: Optional[int] = None) -> CompactionStats:
+        """就地压缩 messages，返回压缩后的估算token数与节省量"""
+        prefix_end = next((i for i, message in enumerate(messages) if message.get("role") in ("assistant", "tool")),
+                          len(messages))
+        tool_messages = [message for message in messages[prefix_end:]
+                         if message.get("role") == "tool" and isinstance(message.get("content"), str)]
+
+        newly_saved, offloaded, truncated = 0, 0, 0
+        for message in tool_messages:
+            key = self._key(message)
+            if key in self._inspected:
+                continue
+            self._inspected.add(key)
+            if len(message["content"]) > self.offload_chars:
+                saved = self._replace(message, self._offload(message, step_index))
+                if saved is not None:
+                    newly_saved += saved
+                    offloaded += 1
+
+        tokens = estimate_tokens(messages)
+        if tokens > self.token_budget:
+            keep = self.keep_recent_tool_results
+            candidates = tool_messages[:-keep] if keep > 0 else tool_messages
+            for message in candidates:
+                if tokens <= self.token_budget:
+                    break
+                key = self._key(message)
+                if key in self._compacted or len(message["content"]) <= self.truncate_chars:
+                    continue
+                content = message["content"]
+                saved = self._replace(message, content[:self.truncate_chars]
+                                      + f"\n...[Older tool output truncated: {len(content) - self.truncate_chars} more characters omitted]")
+                if saved is not None:
+                    tokens -= saved
+                    newly_saved += saved
+                    truncated += 1
+
+        self.tokens_saved += newly_saved
+        if self.tokens_saved:
+            logger.info(f"Context compaction for step {step_index}: ~{tokens} tokens sent, ~{self.tokens_saved} tokens saved "
+                        f"({newly_saved} this call, {offloaded} offloaded, {truncated} truncated)")
+        return CompactionStats(tokens, self.tokens_saved, newly_saved, offloaded, truncated)
+
+    @staticmethod
+    def _key(message: Dict[str, Any]) -> str:
+        return message.get("tool_call_id") or str(id(message))
+
+    def _replace(self, message: Dict[str, Any], new_content: str) -> Optional[int]:
+        """替换消息内容并标记为已压缩，返回节省的估算token数；内容没有变短时不替换"""
+        old_content = message["content"]
+        self._compacted.add(self._key(message))
+        if len(new_content) >= len(old_content):
+            return None
+        message["content"] = new_content
+        return (len(old_content) - len(new_content)) // 3
+
+    def _offload(self, message: Dict[str, Any], step_index: Optional[int]) -> str:
+        """把完整的工具结果写入工作区文件，返回替换到上下文中的预览与引用"""
+        content = message["content"]
+        preview = content[:self.truncate_chars]
+        omitted = len(content) - len(preview)
+        if not self.work_space_path:
+            return preview + f"\n...[Tool output truncated: {omitted} more characters omitted]"
+        try:
+            results_dir = os.path.join(self.work_space_path, TOOL_RESULTS_DIR)
+            os.makedirs(results_dir, exist_ok=True)
+            name = re.sub(r"[^\w.-]", "_", f"step{step_index}_{message.get('name') or 'tool'}_{self._key(message)}")
+            file_path = os.path.join(results_dir, f"{name}.txt")
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(content)
+        except Exception as e:
+            logger.warning(f"Failed to offload tool result to workspace: {e}")
+            return preview + f"\n...[Tool output truncated: {omitted} more characters omitted]"
+        return preview + (f"\n...[Tool output truncated: {omitted} more characters omitted. "
+                          f"Full result saved to {file_path}, use file_read to view it]")
@@ -13,24 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Tuple
+
 from app.agent_dispatcher.domain.plan.action.skill.mcp.const import LOCAL_MCP
-from app.agent_dispatcher.domain.plan.action.skill.mcp.engine import MCPEngine
-import asyncio
-from contextlib import contextmanager
-
-
-@contextmanager
-def async_event_loop():
-    """线程安全的事件循环上下文管理器"""
-    try:
-        # 创建新的事件循环
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        yield loop
-    finally:
-        # 清理事件循环
-        loop.close()
-        asyncio.set_event_loop(None)
+from app.agent_dispatcher.domain.plan.action.skill.mcp.tool_cache import mcp_tool_cache
+from app.common.logger_util import logger
+
 
 def convert_skill_to_tool(skill, lang='en') -> dict:
     """Convert skill to tool format for llm.create_with_tools
@@ -66,19 +56,37 @@ def convert_skill_to_tool(skill, lang='en') -> dict:
     return tools
 
 
+# 结构: {id(template): (template, tools)}，同时持有模板引用，保证 id 在缓存期间不被复用
+_skill_tools_cache: "OrderedDict[int, Tuple[object, Tuple[Dict, ...]]]" = OrderedDict()
+_skill_tools_cache_lock = Lock()
+_SKILL_TOOLS_CACHE_SIZE = 32
+
+
+def get_skill_tools(template, lang='en') -> Tuple[Dict, ...]:
+    """获取模板中全部技能的工具定义，按模板对象缓存；返回的工具定义在智能体之间共享，只读"""
+    with _skill_tools_cache_lock:
+        cached = _skill_tools_cache.get(id(template))
+        if cached is not None and cached[0] is template:
+            _skill_tools_cache.move_to_end(id(template))
+            return cached[1]
+    tools = []
+    for skill in template.skills:
+        tools.extend(convert_skill_to_tool(skill.model_dump(), lang))
+    tools = tuple(tools)
+    with _skill_tools_cache_lock:
+        _skill_tools_cache[id(template)] = (template, tools)
+        while len(_skill_tools_cache) > _SKILL_TOOLS_CACHE_SIZE:
+            _skill_tools_cache.popitem(last=False)
+    return tools
+
+
 def get_mcp_tools(skills):
     tools = []
     for skill in skills:
         if skill.skill_type in [LOCAL_MCP]:
             try:
-                with async_event_loop() as loop:
-                    mcp_tools = loop.run_until_complete(
-                        MCPEngine.get_mcp_tools(
-                            skill.skill_name,
-                            skill.mcp_server_config
-                        )
-                    )
-                print(f"mcp_tools:{mcp_tools}")
+                # 进程级缓存，过期时返回旧列表并在后台刷新，不阻塞智能体构造
+                mcp_tools = mcp_tool_cache.get(skill.skill_name, skill.mcp_server_config)
                 result = {
                     "mcp_name": skill.skill_name,
                     "mcp_config": skill.mcp_server_config,
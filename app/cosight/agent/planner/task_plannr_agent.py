@@ -20,7 +20,7 @@ from app.cosight.agent.base.base_agent import BaseAgent
 from app.cosight.agent.planner.prompt.planner_prompt import planner_system_prompt, \
     planner_create_plan_prompt, planner_re_plan_prompt, planner_finalize_plan_prompt
 from app.cosight.llm.chat_llm import ChatLLM
-from app.cosight.task.plan_report_manager import plan_report_event_manager
+from app.cosight.task.plan_report_manager import plan_report_event_manager, PlanStreamListener
 from app.cosight.task.task_manager import TaskManager
 from app.cosight.tool.plan_toolkit import PlanToolkit
 from app.cosight.tool.terminate_toolkit import TerminateToolkit
@@ -52,7 +52,9 @@ class TaskPlannerAgent(BaseAgent):
     def finalize_plan(self, question, output_format=""):
         self.history.append(
             {"role": "user", "content": planner_finalize_plan_prompt(question, self.plan.format(), output_format)})
-        result = self.llm.chat_to_llm(self.history)
+        # 最终总结通常是耗时最长的一次生成，流式推送以尽早展示给用户
+        listener = PlanStreamListener.create(TaskManager.get_plan_id(self.plan), "result")
+        result = self.llm.chat_to_llm(self.history, listener=listener)
         self.plan.set_plan_result(result)
         plan_report_event_manager.publish("plan_result", self.plan)
         return f"""
@@ -0,0 +1,314 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import importlib.util
+import json
+import weakref
+from json import JSONDecodeError
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+
+from app.agent_dispatcher.infrastructure.entity.exception.ZaeFrameworkException import ZaeFrameworkException
+from app.cosight.llm.chat_stream import ChatCompletionAccumulator, StreamListener
+from app.cosight.llm.rate_limiter import estimate_tokens, llm_rate_limiter
+from app.cosight.llm.response_cache import get_cache_key, llm_response_cache
+from app.cosight.llm.retry_policy import compute_retry_delay
+from app.cosight.task.time_record_util import time_record
+from app.common.logger_util import logger
+from config.config import get_llm_http_config
+
+# 安装了 h2 时启用 HTTP/2，同一连接上多路复用并发请求
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# 结构: {event_loop: {(base_url, api_key, proxy): AsyncOpenAI}}
+# httpx.AsyncClient 绑定创建它的事件循环，因此按事件循环分别维护连接池，事件循环销毁后自动释放
+_client_pool: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+_client_pool_lock = Lock()
+
+
+def get_async_openai_client(base_url: str, api_key: str, proxy: Optional[str] = None) -> AsyncOpenAI:
+    """获取当前事件循环下按 base_url 共享的 AsyncOpenAI 客户端（底层为长连接池）"""
+    loop = asyncio.get_running_loop()
+    key = (base_url, api_key, proxy)
+    with _client_pool_lock:
+        clients = _client_pool.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            config = get_llm_http_config()
+            http_client_kwargs = {
+                "headers": {
+                    'Content-Type': 'application/json',
+                    'Authorization': api_key
+                },
+                "verify": False,
+                "trust_env": False,
+                "http2": _HTTP2_AVAILABLE,
+                "timeout": httpx.Timeout(config["timeout"], connect=10.0),
+                "limits": httpx.Limits(
+                    max_connections=config["max_connections"],
+                    max_keepalive_connections=config["max_keepalive_connections"],
+                    keepalive_expiry=config["keepalive_expiry"]
+                )
+            }
+            if proxy:
+                http_client_kwargs["proxy"] = proxy
+            # 重试由 AsyncChatLLM 统一处理，关闭 SDK 内置重试避免叠加
+            client = AsyncOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                max_retries=0,
+                http_client=httpx.AsyncClient(**http_client_kwargs)
+            )
+            clients[key] = client
+            logger.info(f"Created pooled async LLM client for {base_url}, http2: {_HTTP2_AVAILABLE}")
+        return client
+
+
+async def close_async_openai_clients() -> None:
+    """关闭当前事件循环下的所有连接池（事件循环退出前调用）"""
+    loop = asyncio.get_running_loop()
+    with _client_pool_lock:
+        clients = _client_pool.pop(loop, {})
+    for client in clients.values():
+        await client.close()
+
+
+class AsyncChatLLM:
+    """模型调用的实现，单个事件循环即可驱动大量并发的模型调用，无需每个步骤占用一个线程
+
+    同步接口 ChatLLM 通过后台事件循环调用本类，缓存、限流、重试与工具调用参数修复只在这里实现一份。
+    """
+
+    def __init__(self, base_url: str, api_key: str, model: str, max_tokens: int = 4096,
+                 temperature: float = 0.0, stream: bool = False, proxy: Optional[str] = None,
+                 rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stream = stream
+        self.proxy = proxy
+        # 按 (base_url, model) 进程内共享的客户端限流器，未配置 RPM/TPM 时为 None
+        self.rate_limiter = llm_rate_limiter.get(base_url, model, rpm, tpm)
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        return get_async_openai_client(self.base_url, self.api_key, self.proxy)
+
+    @staticmethod
+    def clean_none_values(data):
+        """
+        递归遍历数据结构，将所有 None 替换为 ""
+        静态方法，无需实例化类即可调用
+        """
+        if isinstance(data, dict):
+            return {k: AsyncChatLLM.clean_none_values(v) for k, v in data.items()}
+        elif isinstance(data, list):
+            return [AsyncChatLLM.clean_none_values(item) for item in data]
+        elif data is None:
+            return ""
+        else:
+            return data
+
+    @staticmethod
+    def record_usage(rate_limiter, response, estimated_tokens: int):
+        """按模型返回的实际用量校正限流器"""
+        if rate_limiter is not None:
+            usage = getattr(response, "usage", None)
+            rate_limiter.record_usage(estimated_tokens, getattr(usage, "total_tokens", None))
+
+    @staticmethod
+    def replay_to_listener(listener: Optional[StreamListener], message: ChatCompletionMessage):
+        """命中缓存时把完整结果一次性回放给流式监听者"""
+        if listener is None:
+            return
+        if message.content:
+            listener.on_content(message.content)
+        for index, tool_call in enumerate(message.tool_calls or []):
+            listener.on_tool_call(index, tool_call.function.name, tool_call.function.arguments)
+        listener.on_complete()
+
+    @staticmethod
+    def strip_think(response: ChatCompletion) -> ChatCompletion:
+        """去除回复内容中的think标签"""
+        content = response.choices[0].message.content
+        if content is not None and '</think>' in content:
+            response.choices[0].message.content = content.split('</think>')[-1].strip('\n')
+        return response
+
+    @staticmethod
+    def describe_response(response) -> str:
+        """返回内容解析失败时，记录便于排查的响应摘要"""
+        if response is None:
+            return "No response object"
+        if hasattr(response, 'content'):
+            return f"Response content: {response.content}"
+        if hasattr(response, 'text'):
+            return f"Response text: {response.text}"
+        if hasattr(response, 'choices') and response.choices:
+            try:
+                content = response.choices[0].message.content if response.choices[0].message else "No message content"
+                return f"Response message content: {content[:500]}..." if len(str(content)) > 500 else f"Response message content: {content}"
+            except Exception:
+                pass
+        return f"Response object: {type(response)} - {str(response)[:500]}..."
+
+    async def _acquire_rate_limit(self, messages: List[Dict[str, Any]], tools: List[Dict] = None) -> int:
+        """请求前按限流器排队（不占用线程），返回估算的token数用于事后校正"""
+        if self.rate_limiter is None:
+            return 0
+        estimated_tokens = estimate_tokens(messages, tools)
+        await self.rate_limiter.aacquire(estimated_tokens)
+        return estimated_tokens
+
+    async def _create_stream(self, listener: Optional[StreamListener], **kwargs) -> ChatCompletion:
+        """以流式方式调用模型，增量转发给监听者，结束后拼装为完整的 ChatCompletion"""
+        accumulator = ChatCompletionAccumulator(self.model, listener)
+        stream = await self.client.chat.completions.create(model=self.model, stream=True, **kwargs)
+        async with stream:
+            async for chunk in stream:
+                accumulator.add_chunk(chunk)
+        return accumulator.finish()
+
+    @time_record
+    async def create_with_tools(self, messages: List[Dict[str, Any]], tools: List[Dict],
+                                listener: Optional[StreamListener] = None, cacheable: bool = True):
+        """
+        Create a chat completion with support for function/tool calls
+
+        传入 listener（或 stream=True）时以流式调用，正文与工具调用参数在生成过程中增量回调；
+        启用响应缓存时，temperature=0 且 cacheable 的调用优先返回缓存结果
+        """
+        # 清洗提示词，去除None
+        messages = AsyncChatLLM.clean_none_values(messages)
+        cache_key = get_cache_key(self, messages, tools, cacheable)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(llm_response_cache.get, cache_key)
+            if cached is not None:
+                message = ChatCompletionMessage.model_validate(cached)
+                AsyncChatLLM.replay_to_listener(listener, message)
+                return message
+        max_retries = get_llm_http_config()["max_retries"]
+        response = None
+        for attempt in range(max_retries):
+            try:
+                estimated_tokens = await self._acquire_rate_limit(messages, tools)
+                if self.stream or listener is not None:
+                    response = await self._create_stream(listener, messages=messages, tools=tools, tool_choice="auto",
+                                                         temperature=self.temperature)
+                else:
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        tools=tools,
+                        tool_choice="auto",
+                        temperature=self.temperature
+                    )
+                AsyncChatLLM.record_usage(self.rate_limiter, response, estimated_tokens)
+                logger.info(f"LLM with tools chat completions response is {response}")
+                if hasattr(response, 'choices') and response.choices and len(response.choices) > 0:
+                    await self.check_and_fix_tool_call_params(response)
+                elif hasattr(response, 'message') and response.message:
+                    raise Exception(response.message)
+                else:
+                    raise Exception(response)
+                break
+            except json.JSONDecodeError as json_error:
+                logger.error(f"JSON decode error on attempt {attempt + 1}: {json_error}")
+                logger.error(f"Response details: {AsyncChatLLM.describe_response(response)}")
+                if listener is not None:
+                    listener.on_reset()
+                if attempt == max_retries - 1:
+                    raise ZaeFrameworkException(400, f"JSON decode error after {max_retries} attempts: {json_error}")
+                await asyncio.sleep(compute_retry_delay(attempt, json_error))
+            except Exception as e:
+                logger.warning(f"chat with LLM error: {e} on attempt {attempt + 1}, retrying...", exc_info=True)
+                if listener is not None:
+                    listener.on_reset()
+                if attempt == max_retries - 1:
+                    logger.error(f"Failed to create after {max_retries} attempts.")
+                    raise ZaeFrameworkException(400, f"chat with LLM failed, please check LLM config. reason：{e}")
+                # 指数退避加随机抖动，服务端返回 Retry-After 时优先遵循
+                await asyncio.sleep(compute_retry_delay(attempt, e))
+
+        if response and isinstance(response, ChatCompletion):
+            # 去除think标签
+            message = AsyncChatLLM.strip_think(response).choices[0].message
+            if cache_key is not None:
+                await asyncio.to_thread(llm_response_cache.put, cache_key, message.model_dump(exclude_none=True))
+            return message
+        raise ZaeFrameworkException(400, f"chat with LLM failed, LLM response：{response}")
+
+    async def check_and_fix_tool_call_params(self, response):
+        if response.choices[0].message.tool_calls:
+            for attempt in range(3):
+                try:
+                    tool_call = response.choices[0].message.tool_calls[0].function
+                    json.loads(tool_call.arguments)
+                    break
+                except JSONDecodeError as jsone:
+                    logger.warning(f"Tool call arguments JSON decode error on attempt {attempt + 1}: {jsone}")
+                    logger.warning(f"Invalid arguments: {tool_call.arguments}")
+
+                    try:
+                        # 尝试修复JSON格式
+                        fixed_arguments = await self.chat_to_llm([{"role": "user",
+                                                                 "content": f"下面的json字符串格式有错误，请帮忙修正。重要：仅输出修正的字符串。\n{tool_call.arguments}"}])
+                        # 验证修复后的JSON是否有效
+                        json.loads(fixed_arguments)
+                        tool_call.arguments = fixed_arguments
+                        logger.info(f"Successfully fixed tool call arguments on attempt {attempt + 1}")
+                        break
+                    except Exception as fix_error:
+                        logger.error(f"Failed to fix tool call arguments on attempt {attempt + 1}: {fix_error}")
+                        if attempt == 2:  # 最后一次尝试
+                            # 如果修复失败，使用默认的空JSON对象
+                            tool_call.arguments = "{}"
+                            logger.warning("Using empty JSON object as fallback for tool call arguments")
+                            break
+
+    @time_record
+    async def chat_to_llm(self, messages: List[Dict[str, Any]], listener: Optional[StreamListener] = None,
+                          cacheable: bool = True):
+        # 清洗提示词，去除None
+        messages = AsyncChatLLM.clean_none_values(messages)
+        cache_key = get_cache_key(self, messages, None, cacheable)
+        if cache_key is not None:
+            cached = await asyncio.to_thread(llm_response_cache.get, cache_key)
+            if cached is not None:
+                AsyncChatLLM.replay_to_listener(listener, ChatCompletionMessage(role="assistant", content=cached))
+                return cached
+        estimated_tokens = await self._acquire_rate_limit(messages)
+        if self.stream or listener is not None:
+            response = await self._create_stream(listener, messages=messages, temperature=self.temperature)
+        else:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature
+            )
+        AsyncChatLLM.record_usage(self.rate_limiter, response, estimated_tokens)
+        logger.info(f"LLM chat completions response is {response}")
+        # 去除think标签
+        content = AsyncChatLLM.strip_think(response).choices[0].message.content
+        if cache_key is not None and content is not None:
+            await asyncio.to_thread(llm_response_cache.put, cache_key, content)
+        return content
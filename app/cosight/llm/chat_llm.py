@@ -12,160 +12,64 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
-import json
-import time
-from json import JSONDecodeError
+from typing import List, Dict, Any, Optional
 
-from typing import List, Dict, Any
+from app.cosight.llm.async_chat_llm import AsyncChatLLM, close_async_openai_clients
+from app.cosight.llm.chat_stream import StreamListener
+from app.cosight.llm.rate_limiter import current_plan_id
+from app.cosight.tool.async_runtime import async_runtime, run_coro
 
-from openai import OpenAI
-from openai.types.chat import ChatCompletion
+# 同步调用在进程级后台事件循环中执行，退出时关闭该事件循环下的模型连接池
+async_runtime.add_shutdown_hook(close_async_openai_clients)
 
-from app.agent_dispatcher.infrastructure.entity.exception.ZaeFrameworkException import ZaeFrameworkException
-from app.cosight.task.time_record_util import time_record
-from app.common.logger_util import logger
+
+async def _with_plan_id(coro, plan_id: str):
+    """后台事件循环中的任务不继承调用线程的上下文，这里带上调用方所属计划，限流器据此在计划间公平排队"""
+    current_plan_id.set(plan_id)
+    return await coro
 
 
 class ChatLLM:
-    def __init__(self, base_url: str, api_key: str, model: str, client: OpenAI, max_tokens: int = 4096,
-                 temperature: float = 0.0, stream: bool = False, tools: List[Any] = None):
+    """模型调用的同步接口：在进程级后台事件循环中执行 AsyncChatLLM 并等待结果，与协程调用共用连接池、缓存与限流"""
+
+    def __init__(self, base_url: str, api_key: str, model: str, max_tokens: int = 4096,
+                 temperature: float = 0.0, stream: bool = False, tools: List[Any] = None,
+                 proxy: Optional[str] = None, rpm: int = None, tpm: int = None):
         self.tools = tools or []
-        self.client = client
         self.base_url = base_url
         self.api_key = api_key
         self.model = model
         self.stream = stream
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.async_llm = AsyncChatLLM(base_url, api_key, model, max_tokens=max_tokens, temperature=temperature,
+                                      stream=stream, proxy=proxy, rpm=rpm, tpm=tpm)
 
-    @staticmethod
-    def clean_none_values(data):
-        """
-        递归遍历数据结构，将所有 None 替换为 ""
-        静态方法，无需实例化类即可调用
-        """
-        if isinstance(data, dict):
-            return {k: ChatLLM.clean_none_values(v) for k, v in data.items()}
-        elif isinstance(data, list):
-            return [ChatLLM.clean_none_values(item) for item in data]
-        elif data is None:
-            return ""
-        else:
-            return data
+    clean_none_values = staticmethod(AsyncChatLLM.clean_none_values)
 
-    @time_record
-    def create_with_tools(self, messages: List[Dict[str, Any]], tools: List[Dict]):
-        """
-        Create a chat completion with support for function/tool calls
-        """
-        # 清洗提示词，去除None
-        messages = ChatLLM.clean_none_values(messages)
-        max_retries = 5
-        response = None
-        for attempt in range(max_retries):
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    tools=tools,
-                    tool_choice="auto",
-                    temperature=self.temperature
-                )
-                logger.info(f"LLM with tools chat completions response is {response}")
-                if hasattr(response, 'choices') and response.choices and len(response.choices) > 0:
-                    self.check_and_fix_tool_call_params(response)
-                elif hasattr(response, 'message') and response.message:
-                    raise Exception(response.message)
-                else:
-                    raise Exception(response)
-                break
-            except json.JSONDecodeError as json_error:
-                logger.error(f"JSON decode error on attempt {attempt + 1}: {json_error}")
-                
-                # 更详细的错误信息记录
-                response_info = "No response object"
-                if response is not None:
-                    if hasattr(response, 'content'):
-                        response_info = f"Response content: {response.content}"
-                    elif hasattr(response, 'text'):
-                        response_info = f"Response text: {response.text}"
-                    elif hasattr(response, 'choices') and response.choices:
-                        try:
-                            content = response.choices[0].message.content if response.choices[0].message else "No message content"
-                            response_info = f"Response message content: {content[:500]}..." if len(str(content)) > 500 else f"Response message content: {content}"
-                        except Exception:
-                            response_info = f"Response object: {type(response)} - {str(response)[:500]}..."
-                    else:
-                        response_info = f"Response object: {type(response)} - {str(response)[:500]}..."
-                
-                logger.error(f"Response details: {response_info}")
-                
-                if attempt == max_retries - 1:
-                    raise ZaeFrameworkException(400, f"JSON decode error after {max_retries} attempts: {json_error}")
-                time.sleep(5)  # 增加等待时间
-            except Exception as e:
-                logger.warning(f"chat with LLM error: {e} on attempt {attempt + 1}, retrying...", exc_info=True)
-                if "TPM limit reached" in str(e):
-                    time.sleep(60)
-                elif "rate limit" in str(e).lower():
-                    time.sleep(30)
-                elif "timeout" in str(e).lower():
-                    time.sleep(10)
-                if attempt == max_retries-1:
-                    logger.error(f"Failed to create after {max_retries} attempts.")
-                    raise ZaeFrameworkException(400, f"chat with LLM failed, please check LLM config. reason：{e}")
-                time.sleep(3)  # 增加等待时间，避免频繁重试
+    @property
+    def rate_limiter(self):
+        return self.async_llm.rate_limiter
+
+    @staticmethod
+    def _run(coro):
+        return run_coro(_with_plan_id(coro, current_plan_id.get()))
 
-        if response and isinstance(response, ChatCompletion):
-            # 去除think标签
-            content = response.choices[0].message.content
-            if content is not None and '</think>' in content:
-                response.choices[0].message.content = content.split('</think>')[-1].strip('\n')
-            return response.choices[0].message
-        else:
-            raise ZaeFrameworkException(400, f"chat with LLM failed, LLM response：{response}")
+    def create_with_tools(self, messages: List[Dict[str, Any]], tools: List[Dict],
+                          listener: Optional[StreamListener] = None, cacheable: bool = True):
+        """Create a chat completion with support for function/tool calls，见 AsyncChatLLM.create_with_tools"""
+        return self._run(self.async_llm.create_with_tools(messages, tools, listener=listener, cacheable=cacheable))
 
-    def check_and_fix_tool_call_params(self, response):
-        if response.choices[0].message.tool_calls:
-            for attempt in range(3):
-                try:
-                    tool_call = response.choices[0].message.tool_calls[0].function
-                    json.loads(tool_call.arguments)
-                    break
-                except JSONDecodeError as jsone:
-                    logger.warning(f"Tool call arguments JSON decode error on attempt {attempt + 1}: {jsone}")
-                    logger.warning(f"Invalid arguments: {tool_call.arguments}")
-                    
-                    try:
-                        # 尝试修复JSON格式
-                        fixed_arguments = self.chat_to_llm([{"role": "user",
-                                                           "content": f"下面的json字符串格式有错误，请帮忙修正。重要：仅输出修正的字符串。\n{tool_call.arguments}"}])
-                        # 验证修复后的JSON是否有效
-                        json.loads(fixed_arguments)
-                        tool_call.arguments = fixed_arguments
-                        logger.info(f"Successfully fixed tool call arguments on attempt {attempt + 1}")
-                        break
-                    except Exception as fix_error:
-                        logger.error(f"Failed to fix tool call arguments on attempt {attempt + 1}: {fix_error}")
-                        if attempt == 2:  # 最后一次尝试
-                            # 如果修复失败，使用默认的空JSON对象
-                            tool_call.arguments = "{}"
-                            logger.warning("Using empty JSON object as fallback for tool call arguments")
-                            break
+    def chat_to_llm(self, messages: List[Dict[str, Any]], listener: Optional[StreamListener] = None,
+                    cacheable: bool = True):
+        return self._run(self.async_llm.chat_to_llm(messages, listener=listener, cacheable=cacheable))
 
-    @time_record
-    def chat_to_llm(self, messages: List[Dict[str, Any]]):
-        # 清洗提示词，去除None
-        messages = ChatLLM.clean_none_values(messages)
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=self.temperature
-        )
-        logger.info(f"LLM chat completions response is {response}")
-        # 去除think标签
-        content = response.choices[0].message.content
-        if content is not None and '</think>' in content:
-            response.choices[0].message.content = content.split('</think>')[-1].strip('\n')
+    async def acreate_with_tools(self, messages: List[Dict[str, Any]], tools: List[Dict],
+                                 listener: Optional[StreamListener] = None, cacheable: bool = True):
+        """create_with_tools 的协程版本，在调用方所在的事件循环中执行"""
+        return await self.async_llm.create_with_tools(messages, tools, listener=listener, cacheable=cacheable)
 
-        return response.choices[0].message.content
+    async def achat_to_llm(self, messages: List[Dict[str, Any]], listener: Optional[StreamListener] = None,
+                           cacheable: bool = True):
+        """chat_to_llm 的协程版本，在调用方所在的事件循环中执行"""
+        return await self.async_llm.chat_to_llm(messages, listener=listener, cacheable=cacheable)
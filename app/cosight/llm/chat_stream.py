@@ -0,0 +1,229 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+from typing import Dict, List, Optional
+
+from openai.types.chat import ChatCompletion, ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+_THINK_START = "<think>"
+_THINK_END = "</think>"
+_FINISH_REASONS = ("stop", "length", "tool_calls", "content_filter", "function_call")
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class StreamListener:
+    """流式输出的回调接口，默认实现均为空操作，按需覆盖"""
+
+    def on_content(self, delta: str):
+        """收到一段正文增量（已去除think内容）"""
+
+    def on_tool_call(self, index: int, name: Optional[str], arguments_delta: str):
+        """收到一段工具调用参数增量，name 为已知的工具名（可能尚未到达）"""
+
+    def on_reset(self):
+        """本次生成失败即将重试，之前推送的增量作废"""
+
+    def on_complete(self):
+        """本次生成结束"""
+
+
+class ThinkTagFilter:
+    """过滤流式正文开头的 <think>...</think> 内容，与 ChatLLM.strip_think 的效果保持一致"""
+
+    def __init__(self):
+        self._buffer = ""
+        self._passthrough = False
+        # </think> 之后紧跟的换行可能分散在后续增量中，同样需要去除
+        self._strip_newlines = False
+
+    def feed(self, delta: str) -> str:
+        if self._passthrough:
+            if self._strip_newlines:
+                delta = delta.lstrip('\n')
+                self._strip_newlines = not delta
+            return delta
+        self._buffer += delta
+        stripped = self._buffer.lstrip()
+        if not stripped:
+            return ""
+        if _THINK_START.startswith(stripped[:len(_THINK_START)]) and len(stripped) < len(_THINK_START):
+            # 还无法判断是否以 <think> 开头
+            return ""
+        if not stripped.startswith(_THINK_START):
+            self._passthrough = True
+            output, self._buffer = self._buffer, ""
+            return output
+        if _THINK_END not in self._buffer:
+            return ""
+        self._passthrough = True
+        output = self._buffer.split(_THINK_END, 1)[1].lstrip('\n')
+        self._strip_newlines = not output
+        self._buffer = ""
+        return output
+
+    def flush(self) -> str:
+        """流结束时仍未出现 </think>，按原文输出"""
+        output, self._buffer = self._buffer, ""
+        self._passthrough = True
+        return output
+
+
+class JsonStringFieldStreamer:
+    """从逐段到达的JSON参数文本中，增量解码指定字符串字段的值
+
+    例如 mark_step 的参数 {"step_index": 1, "step_notes": "..."} 在生成过程中即可逐段取出 step_notes。
+    只识别顶层 "field": "value" 形式，字段不存在或不是字符串时不输出。
+    """
+
+    def __init__(self, field: str):
+        self._key = f'"{field}"'
+        self._text = ""
+        self._pos = 0
+        # None: 尚未找到字段；True: 正在解码字段值；False: 字段值已结束
+        self._in_value: Optional[bool] = None
+
+    def feed(self, delta: str) -> str:
+        self._text += delta
+        if self._in_value is None:
+            key_pos = self._text.find(self._key)
+            if key_pos < 0:
+                return ""
+            pos = key_pos + len(self._key)
+            while pos < len(self._text) and self._text[pos] in " \t\r\n:":
+                pos += 1
+            if pos >= len(self._text):
+                return ""
+            if self._text[pos] != '"':
+                self._in_value = False
+                return ""
+            self._in_value = True
+            self._pos = pos + 1
+        if not self._in_value:
+            return ""
+
+        output: List[str] = []
+        text, pos = self._text, self._pos
+        while pos < len(text):
+            char = text[pos]
+            if char == '"':
+                self._in_value = False
+                pos += 1
+                break
+            if char != '\\':
+                output.append(char)
+                pos += 1
+                continue
+            # 转义序列不完整时等待后续增量
+            if pos + 1 >= len(text):
+                break
+            escape = text[pos + 1]
+            if escape == 'u':
+                if pos + 6 > len(text):
+                    break
+                try:
+                    output.append(chr(int(text[pos + 2:pos + 6], 16)))
+                except ValueError:
+                    pass
+                pos += 6
+            else:
+                output.append(_JSON_ESCAPES.get(escape, escape))
+                pos += 2
+        self._pos = pos
+        return "".join(output)
+
+
+class ChatCompletionAccumulator:
+    """把流式 chunk 拼装成与非流式接口一致的 ChatCompletion，并把增量转发给监听者"""
+
+    def __init__(self, model: str, listener: Optional[StreamListener] = None):
+        self.model = model
+        self.listener = listener
+        self.usage = None
+        self._id = ""
+        self._created = int(time.time())
+        self._content: List[str] = []
+        self._finish_reason = None
+        # 结构: {index: {"id": str, "name": str, "arguments": [str]}}
+        self._tool_calls: Dict[int, Dict] = {}
+        self._think_filter = ThinkTagFilter()
+
+    def add_chunk(self, chunk) -> None:
+        self._id = getattr(chunk, "id", None) or self._id
+        self._created = getattr(chunk, "created", None) or self._created
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+        for choice in getattr(chunk, "choices", None) or []:
+            if choice.finish_reason:
+                self._finish_reason = choice.finish_reason
+            delta = choice.delta
+            if delta is None:
+                continue
+            if delta.content:
+                self._content.append(delta.content)
+                visible = self._think_filter.feed(delta.content)
+                if visible and self.listener:
+                    self.listener.on_content(visible)
+            for tool_call_delta in delta.tool_calls or []:
+                self._add_tool_call_delta(tool_call_delta)
+
+    def _add_tool_call_delta(self, tool_call_delta) -> None:
+        index = tool_call_delta.index if tool_call_delta.index is not None else len(self._tool_calls)
+        tool_call = self._tool_calls.setdefault(index, {"id": "", "name": "", "arguments": []})
+        if tool_call_delta.id:
+            tool_call["id"] = tool_call_delta.id
+        function = tool_call_delta.function
+        if function is None:
+            return
+        if function.name:
+            # 工具名通常完整出现在首个增量中，部分服务会在后续增量中重复携带
+            tool_call["name"] = function.name
+        if function.arguments:
+            tool_call["arguments"].append(function.arguments)
+            if self.listener:
+                self.listener.on_tool_call(index, tool_call["name"] or None, function.arguments)
+
+    def finish(self) -> ChatCompletion:
+        remaining = self._think_filter.flush()
+        if remaining and self.listener:
+            self.listener.on_content(remaining)
+        if self.listener:
+            self.listener.on_complete()
+
+        tool_calls = [
+            ChatCompletionMessageToolCall(
+                id=tool_call["id"] or f"call_{index}",
+                type="function",
+                function=Function(name=tool_call["name"], arguments="".join(tool_call["arguments"]))
+            )
+            for index, tool_call in sorted(self._tool_calls.items())
+        ]
+        message = ChatCompletionMessage(
+            role="assistant",
+            content="".join(self._content) if self._content else None,
+            tool_calls=tool_calls or None
+        )
+        finish_reason = self._finish_reason if self._finish_reason in _FINISH_REASONS else None
+        finish_reason = finish_reason or ("tool_calls" if tool_calls else "stop")
+        return ChatCompletion(
+            id=self._id or "stream",
+            object="chat.completion",
+            created=self._created,
+            model=self.model,
+            choices=[Choice(index=0, finish_reason=finish_reason, message=message)],
+            usage=self.usage
+        )
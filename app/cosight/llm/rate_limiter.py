@@ -0,0 +1,239 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.common.logger_util import logger
+
+# 当前调用所属的计划ID，用于在多个计划之间公平排队；未设置时归入默认队列
+current_plan_id: ContextVar[str] = ContextVar("current_plan_id", default="")
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], tools: Optional[List[Dict]] = None) -> int:
+    """粗略估算请求的 token 数（约3个字符一个token），调用结束后再按实际用量校正"""
+    try:
+        size = len(json.dumps(messages, ensure_ascii=False, default=str))
+        if tools:
+            size += len(json.dumps(tools, ensure_ascii=False, default=str))
+    except Exception:
+        size = sum(len(str(message)) for message in messages)
+    return max(1, size // 3)
+
+
+class _Waiter:
+    """排队中的一次调用；调用方可能位于不同的事件循环，唤醒时投递到其所在的事件循环"""
+    __slots__ = ("plan_id", "tokens", "enqueued_at", "loop", "wakeup")
+
+    def __init__(self, plan_id: str, tokens: int):
+        self.plan_id = plan_id
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+
+class EndpointRateLimiter:
+    """单个模型端点的令牌桶限流器，同时限制每分钟请求数（RPM）与估算的每分钟token数（TPM）
+
+    等待中的调用按计划分组，计划之间轮转放行，避免一个计划的突发请求饿死其他计划。
+    只有队首等待者按令牌恢复所需时间定时检查，其余等待者在成为队首时才被唤醒，排队期间不产生轮询。
+    """
+
+    def __init__(self, key: Tuple[str, str], rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.key = key
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = Lock()
+        self._available_requests = float(rpm or 0)
+        self._available_tokens = float(tpm or 0)
+        self._updated_at = time.monotonic()
+        # 结构: {plan_id: deque[_Waiter]}，队首计划的队首等待者优先放行
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        # 统计信息
+        self._acquired = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._last_wait = 0.0
+
+    def update_limits(self, rpm: Optional[int], tpm: Optional[int]) -> None:
+        """多个角色共用同一端点时取更严格的限制"""
+        with self._lock:
+            if rpm and (not self.rpm or rpm < self.rpm):
+                self._available_requests = min(self._available_requests, rpm) if self.rpm else float(rpm)
+                self.rpm = rpm
+            if tpm and (not self.tpm or tpm < self.tpm):
+                self._available_tokens = min(self._available_tokens, tpm) if self.tpm else float(tpm)
+                self.tpm = tpm
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self.rpm:
+            self._available_requests = min(float(self.rpm), self._available_requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._available_tokens = min(float(self.tpm), self._available_tokens + elapsed * self.tpm / 60)
+
+    def _enqueue(self, waiter: _Waiter) -> None:
+        self._queues.setdefault(waiter.plan_id, deque()).append(waiter)
+
+    def _head(self) -> Optional[_Waiter]:
+        return next(iter(self._queues.values()))[0] if self._queues else None
+
+    def _try_grant(self, waiter: _Waiter) -> Optional[float]:
+        """尝试放行等待者，须在持有锁时调用。放行返回 None，否则返回需等待的秒数（非队首时为无穷大）"""
+        plan_id, queue = next(iter(self._queues.items()))
+        if queue[0] is not waiter:
+            return math.inf
+
+        now = time.monotonic()
+        self._refill(now)
+        # 单次请求超过桶容量时按容量计，避免永远无法放行
+        tokens = min(waiter.tokens, self.tpm) if self.tpm else 0
+        request_wait = (1 - self._available_requests) * 60 / self.rpm if self.rpm and self._available_requests < 1 else 0.0
+        token_wait = (tokens - self._available_tokens) * 60 / self.tpm if self.tpm and self._available_tokens < tokens else 0.0
+        wait = max(request_wait, token_wait)
+        if wait > 0:
+            return wait
+
+        if self.rpm:
+            self._available_requests -= 1
+        if self.tpm:
+            self._available_tokens -= tokens
+        queue.popleft()
+        # 当前计划放行一次后轮转到队尾
+        if queue:
+            self._queues.move_to_end(plan_id)
+        else:
+            del self._queues[plan_id]
+
+        waited = now - waiter.enqueued_at
+        self._acquired += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+        self._last_wait = waited
+        if waited > 1:
+            logger.info(f"LLM rate limiter {self.key} delayed request of plan '{plan_id}' for {waited:.2f}s")
+        self._wake_head()
+        return None
+
+    def _wake_head(self) -> None:
+        """队首变化后唤醒新的队首，由其计算自己的等待时间"""
+        head = self._head()
+        if head is not None:
+            head.wake()
+
+    def _cancel(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.plan_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.plan_id]
+            self._wake_head()
+
+    async def aacquire(self, tokens: int, plan_id: Optional[str] = None) -> float:
+        """等待直到获得一次请求配额（不占用线程），返回排队等待的秒数"""
+        waiter = _Waiter(current_plan_id.get() if plan_id is None else plan_id, tokens)
+        with self._lock:
+            self._enqueue(waiter)
+        try:
+            while True:
+                # 先清除再检查，检查之后到来的唤醒不会丢失
+                waiter.wakeup.clear()
+                with self._lock:
+                    wait = self._try_grant(waiter)
+                if wait is None:
+                    return time.monotonic() - waiter.enqueued_at
+                try:
+                    await asyncio.wait_for(waiter.wakeup.wait(), None if math.isinf(wait) else wait)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with self._lock:
+                self._cancel(waiter)
+            raise
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """按模型返回的实际 token 用量校正令牌桶（可为负，形成欠账）"""
+        if not self.tpm or actual_tokens is None:
+            return
+        with self._lock:
+            self._available_tokens -= actual_tokens - min(estimated_tokens, self.tpm)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            now = time.monotonic()
+            queue_depth_by_plan = {plan_id: len(queue) for plan_id, queue in self._queues.items()}
+            oldest_wait = max((now - queue[0].enqueued_at for queue in self._queues.values()), default=0.0)
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "available_requests": round(self._available_requests, 2) if self.rpm else None,
+                "available_tokens": round(self._available_tokens) if self.tpm else None,
+                "queue_depth": sum(queue_depth_by_plan.values()),
+                "queue_depth_by_plan": queue_depth_by_plan,
+                "oldest_wait_seconds": round(oldest_wait, 3),
+                "acquired": self._acquired,
+                "avg_wait_seconds": round(self._total_wait / self._acquired, 3) if self._acquired else 0.0,
+                "max_wait_seconds": round(self._max_wait, 3),
+                "last_wait_seconds": round(self._last_wait, 3)
+            }
+
+
+class LLMRateLimiter:
+    """进程级限流器注册表，按 (base_url, model) 共享，多个角色指向同一端点时共用额度"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._limiters: Dict[Tuple[str, str], EndpointRateLimiter] = {}
+
+    def get(self, base_url: str, model: str, rpm: Optional[int] = None,
+            tpm: Optional[int] = None) -> Optional[EndpointRateLimiter]:
+        """获取端点限流器；该端点未配置任何限制时返回 None"""
+        key = (base_url or "", model or "")
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                if not rpm and not tpm:
+                    return None
+                limiter = EndpointRateLimiter(key, rpm, tpm)
+                self._limiters[key] = limiter
+                logger.info(f"Created LLM rate limiter for {key}, rpm: {rpm}, tpm: {tpm}")
+                return limiter
+        limiter.update_limits(rpm, tpm)
+        return limiter
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各端点的排队深度、等待时间等指标"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {f"{limiter.key[0]}|{limiter.key[1]}": limiter.get_stats() for limiter in limiters}
+
+
+llm_rate_limiter = LLMRateLimiter()
@@ -0,0 +1,211 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.common.logger_util import logger
+from config.config import get_llm_cache_config
+
+# 每写入多少次检查一次磁盘缓存的过期与容量
+_PRUNE_EVERY_WRITES = 100
+
+
+def _json_default(obj):
+    """消息中的 tool_calls 等可能是 SDK 对象，转换为字典参与哈希"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+
+def build_cache_key(base_url: str, model: str, messages: List[Dict[str, Any]], tools: Optional[List[Dict]],
+                    temperature: float) -> str:
+    """按模型、消息、工具与温度的规范化JSON计算缓存键"""
+    payload = {
+        "base_url": base_url,
+        "model": model,
+        "messages": messages,
+        "tools": tools,
+        "temperature": temperature
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def get_cache_key(llm, messages: List[Dict[str, Any]], tools: Optional[List[Dict]] = None,
+                  cacheable: bool = True) -> Optional[str]:
+    """可缓存时返回缓存键；未启用缓存、temperature>0 或调用方标记为不可缓存时返回 None"""
+    if not llm_response_cache.enabled:
+        return None
+    if not cacheable or llm.temperature > 0:
+        llm_response_cache.record_bypass()
+        return None
+    return build_cache_key(llm.base_url, llm.model, messages, tools, llm.temperature)
+
+
+class LLMResponseCache:
+    """模型响应的两级缓存：内存LRU + SQLite磁盘（带TTL与容量淘汰），缓存值为可JSON序列化的对象"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self._config = config
+        self._lock = Lock()
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_failed = False
+        self._writes = 0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "writes": 0, "evictions": 0}
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        if self._config is None:
+            self._config = get_llm_cache_config()
+        return self._config
+
+    @property
+    def enabled(self) -> bool:
+        return self.config["enabled"]
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        """懒加载磁盘缓存，打开失败时退化为仅内存缓存；须在持有锁时调用"""
+        if self._conn is not None or self._disk_failed:
+            return self._conn
+        path = self.config["path"]
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS llm_response_cache (
+                                key TEXT PRIMARY KEY,
+                                value TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                created_at REAL NOT NULL,
+                                accessed_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_response_cache_accessed ON llm_response_cache(accessed_at)")
+            conn.commit()
+            self._conn = conn
+            logger.info(f"LLM response cache opened at {path}")
+        except Exception as e:
+            self._disk_failed = True
+            logger.warning(f"LLM response cache disk tier unavailable, using memory only: {e}")
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        ttl = self.config["ttl_seconds"]
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+
+            conn = self._get_conn()
+            if conn is not None:
+                try:
+                    row = conn.execute("SELECT value, created_at FROM llm_response_cache WHERE key = ?", (key,)).fetchone()
+                    if row is not None and now - row[1] <= ttl:
+                        conn.execute("UPDATE llm_response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                        conn.commit()
+                        value = json.loads(row[0])
+                        self._put_memory(key, row[1], value)
+                        self._stats["disk_hits"] += 1
+                        return value
+                except Exception as e:
+                    logger.warning(f"LLM response cache read failed: {e}")
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        try:
+            serialized = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"LLM response is not cacheable: {e}")
+            return
+        with self._lock:
+            self._put_memory(key, now, value)
+            self._stats["writes"] += 1
+            conn = self._get_conn()
+            if conn is None:
+                return
+            try:
+                conn.execute("INSERT OR REPLACE INTO llm_response_cache (key, value, size, created_at, accessed_at) "
+                             "VALUES (?, ?, ?, ?, ?)", (key, serialized, len(serialized.encode("utf-8")), now, now))
+                conn.commit()
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY_WRITES == 0:
+                    self._prune_disk(conn, now)
+            except Exception as e:
+                logger.warning(f"LLM response cache write failed: {e}")
+
+    def _put_memory(self, key: str, created_at: float, value: Any) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.config["memory_entries"]:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _prune_disk(self, conn: sqlite3.Connection, now: float) -> None:
+        """删除过期条目，超出容量时按最近访问时间从旧到新淘汰"""
+        deleted = conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?",
+                               (now - self.config["ttl_seconds"],)).rowcount
+        max_bytes = self.config["max_disk_mb"] * 1024 * 1024
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_response_cache").fetchone()[0]
+        if total > max_bytes:
+            rows = conn.execute("SELECT key, size FROM llm_response_cache ORDER BY accessed_at").fetchall()
+            evict_keys = []
+            for key, size in rows:
+                if total <= max_bytes:
+                    break
+                evict_keys.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM llm_response_cache WHERE key = ?", evict_keys)
+            deleted += len(evict_keys)
+        conn.commit()
+        self._stats["evictions"] += deleted
+        if deleted:
+            logger.info(f"LLM response cache pruned {deleted} entries from disk")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            conn = self._get_conn()
+            if conn is not None:
+                conn.execute("DELETE FROM llm_response_cache")
+                conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中/未命中等统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+llm_response_cache = LLMResponseCache()
@@ -0,0 +1,73 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from config.config import get_llm_http_config
+
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """从异常携带的HTTP响应头中解析 Retry-After（秒），不存在或无法解析时返回 None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            return float(retry_after_ms) / 1000
+        retry_after = headers.get("retry-after")
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            # HTTP-date 格式
+            return parsedate_to_datetime(retry_after).timestamp() - time.time()
+    except Exception:
+        return None
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """是否为限流类错误（429或错误信息中包含限流关键字）"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return "rate limit" in message or "tpm limit" in message or "rpm limit" in message
+
+
+def compute_retry_delay(attempt: int, error: Optional[BaseException] = None,
+                        base_delay: Optional[float] = None, max_delay: Optional[float] = None) -> float:
+    """计算第 attempt 次（从0开始）失败后的等待时间
+
+    服务端给出 Retry-After 时优先遵循；否则按指数退避并加入随机抖动，
+    限流错误的退避基数加倍，避免大量并发请求在同一时刻重试。
+    """
+    config = get_llm_http_config()
+    base_delay = config["retry_base_delay"] if base_delay is None else base_delay
+    max_delay = config["retry_max_delay"] if max_delay is None else max_delay
+
+    if error is not None:
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return min(max(retry_after, 0.0), max_delay)
+
+    if error is not None and is_rate_limited(error):
+        base_delay *= 2
+    backoff = min(max_delay, base_delay * (2 ** attempt))
+    return backoff / 2 + random.uniform(0, backoff / 2)
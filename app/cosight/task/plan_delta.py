@@ -0,0 +1,138 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from app.cosight.task.todolist import PlanSnapshot
+from config.config import get_plan_event_config
+
+# 按步骤记录的字段，增量中只携带发生变化的步骤
+_STEP_FIELDS = ("step_statuses", "step_notes", "step_details", "step_files")
+
+
+class PlanDeltaEncoder:
+    """为单个订阅者把计划快照编码为全量或增量补丁
+
+    增量补丁格式（类似 JSON merge-patch）：
+        {
+            "version": 12, "base_version": 11,
+            "title": "...",                        # 仅在变化时出现
+            "step_statuses": {step: status},       # 以下四项只包含变化的步骤
+            "step_notes": {...}, "step_details": {...}, "step_files": {...},
+            "step_tool_calls_append": {step: [新增的工具调用]},
+            "step_tool_calls": {step: [完整列表]},   # 无法追加时整体替换
+            "progress": {...}
+        }
+    步骤列表或依赖关系变化、计划产生最终结果、或距上次全量已满 N 次时发送全量。
+    """
+
+    def __init__(self, full_snapshot_interval: Optional[int] = None):
+        self.full_snapshot_interval = max(1, full_snapshot_interval or get_plan_event_config()["full_snapshot_interval"])
+        self._lock = Lock()
+        self._last: Optional[PlanSnapshot] = None
+        self._since_full = 0
+
+    @property
+    def lock(self) -> Lock:
+        """编码与后续入队须在同一把锁内完成，保证补丁按版本顺序送达"""
+        return self._lock
+
+    def reset(self) -> None:
+        """丢弃基准快照，下一次编码发送全量（如客户端重连）"""
+        self._last = None
+
+    def encode(self, snapshot: PlanSnapshot) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """编码快照
+
+        Returns:
+            ("replace", 全量计划字典) 或 ("patch", 补丁字典)；快照过期或无变化时补丁为 None
+        """
+        last = self._last
+        if last is not None and snapshot.version <= last.version:
+            return "patch", None
+
+        if (last is None
+                or self._since_full >= self.full_snapshot_interval
+                or snapshot.result
+                or snapshot.steps != last.steps
+                or snapshot.dependencies != last.dependencies):
+            self._last = snapshot
+            self._since_full = 0
+            plan_dict = snapshot.to_dict()
+            plan_dict["version"] = snapshot.version
+            return "replace", plan_dict
+
+        patch = self._diff(last, snapshot)
+        self._last = snapshot
+        if patch is None:
+            return "patch", None
+        self._since_full += 1
+        return "patch", patch
+
+    @staticmethod
+    def _diff(old: PlanSnapshot, new: PlanSnapshot) -> Optional[Dict[str, Any]]:
+        patch: Dict[str, Any] = {}
+        if new.title != old.title:
+            patch["title"] = new.title
+
+        for field_name in _STEP_FIELDS:
+            old_values = getattr(old, field_name)
+            new_values = getattr(new, field_name)
+            changed = {step: value for step, value in new_values.items() if old_values.get(step) != value}
+            if changed:
+                patch[field_name] = changed
+
+        appended, replaced = {}, {}
+        for step, calls in new.step_tool_calls.items():
+            old_calls = old.step_tool_calls.get(step, ())
+            if calls is old_calls or calls == old_calls:
+                continue
+            # 工具调用只追加不修改，旧列表是新列表的前缀时只发送新增部分
+            if len(calls) > len(old_calls) and (not old_calls or calls[len(old_calls) - 1] is old_calls[-1]):
+                appended[step] = list(calls[len(old_calls):])
+            else:
+                replaced[step] = list(calls)
+        if appended:
+            patch["step_tool_calls_append"] = appended
+        if replaced:
+            patch["step_tool_calls"] = replaced
+
+        if not patch and new.progress == old.progress:
+            return None
+        patch["version"] = new.version
+        patch["base_version"] = old.version
+        patch["progress"] = dict(new.progress)
+        return patch
+
+
+def apply_plan_patch(plan: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """把增量补丁合并到全量计划字典上，返回新字典（不修改入参）"""
+    merged = dict(plan)
+    for key, value in patch.items():
+        if key == "base_version":
+            continue
+        if key == "step_tool_calls_append":
+            tool_calls = dict(merged.get("step_tool_calls") or {})
+            for step, calls in value.items():
+                tool_calls[step] = list(tool_calls.get(step) or []) + list(calls)
+            merged["step_tool_calls"] = tool_calls
+        elif key in _STEP_FIELDS or key == "step_tool_calls":
+            step_values = dict(merged.get(key) or {})
+            step_values.update(value)
+            merged[key] = step_values
+        else:
+            merged[key] = value
+    return merged
@@ -13,21 +13,54 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-from threading import Lock
+import time
+from collections import deque
+from threading import Lock, Timer
 from typing import Callable, Dict, List, Any, Optional
 from concurrent.futures import ThreadPoolExecutor
 
+from app.cosight.llm.chat_stream import JsonStringFieldStreamer, StreamListener
 from app.cosight.task.task_manager import TaskManager
-from app.cosight.task.todolist import Plan
+from app.cosight.task.todolist import Plan, PlanSnapshot
 from app.common.logger_util import logger
+from config.config import get_plan_event_config, get_report_stream_config
 
 
-class EventManager:
+class _PlanChannel:
+    """单个计划的待投递事件队列，同一时刻只有一个消费者按入队顺序投递"""
+    __slots__ = ("items", "scheduled", "dropped")
+
     def __init__(self):
+        # 元素: (event_type, data, callbacks, prepare)
+        self.items: deque = deque()
+        self.scheduled = False
+        self.dropped = 0
+
+
+class EventManager:
+    # 只反映中间进度的事件，若已有更新版本的快照发布，旧版本可直接丢弃
+    DROPPABLE_EVENTS = ("plan_process",)
+    # 在合并窗口内多次发布只推送一次的事件
+    COALESCED_EVENTS = ("plan_process",)
+    # 以 plan_id 路由、携带事件数据的事件
+    ROUTED_EVENTS = ("tool_event", "plan_stream")
+    # 队列积压超过上限时可以丢弃的事件：进度快照会被后续快照覆盖，流式片段的完整内容以计划事件为准
+    LOW_VALUE_EVENTS = ("plan_process", "plan_stream")
+
+    def __init__(self, coalesce_ms: Optional[int] = None, queue_size: Optional[int] = None):
         # 结构: {event_type: {plan_id: [callbacks]}}
         self._subscribers: Dict[str, Dict[str, List[Callable]]] = {}
         self._lock = Lock()
-        self._executor = ThreadPoolExecutor()
+        self._executor = ThreadPoolExecutor(thread_name_prefix="plan-event")
+        # 结构: {plan_id: 已发布的最新快照版本}
+        self._latest_versions: Dict[str, int] = {}
+        config = get_plan_event_config()
+        self._coalesce_seconds = (coalesce_ms if coalesce_ms is not None else config["coalesce_ms"]) / 1000
+        self._queue_size = queue_size if queue_size is not None else config["queue_size"]
+        # 结构: {plan_id: (event_type, plan, timer)}，合并窗口内等待推送的进度事件
+        self._pending: Dict[str, tuple] = {}
+        # 结构: {plan_id: _PlanChannel}，有待投递事件的计划
+        self._channels: Dict[str, _PlanChannel] = {}
 
     def subscribe(self, event_type: str, plan_id: str, callback: Callable):
         """订阅事件，关联计划ID"""
@@ -37,23 +70,22 @@ class EventManager:
             self._subscribers[event_type].setdefault(plan_id, []).append(callback)
         logger.info(f"Subscribed to {event_type} for plan_id: {plan_id}, total callbacks: {len(self._subscribers[event_type][plan_id])}")
 
-    def publish(self, event_type: str, plan_or_plan_id=None, event_data=None):
-        """发布事件 - 支持Plan对象和工具事件数据"""
-        # 处理工具事件的特殊情况
-        if event_type == "tool_event" and isinstance(plan_or_plan_id, str) and event_data is not None:
-            plan_id = plan_or_plan_id
-            callbacks = []
-            with self._lock:
-                if event_type in self._subscribers and plan_id in self._subscribers[event_type]:
-                    callbacks = self._subscribers[event_type][plan_id].copy()
+    def publish(self, event_type: str, plan_or_plan_id=None, event_data=None,
+                prepare: Optional[Callable[[Any], Any]] = None):
+        """发布事件 - 支持Plan对象和工具事件数据
 
-            logger.info(f"Publishing tool_event for plan_id: {plan_id}, callbacks: {len(callbacks)}")
-            # 对于工具事件，使用同步调用确保顺序
-            for callback in callbacks:
-                try:
-                    callback(event_data)
-                except Exception as e:
-                    logger.error(f"工具事件回调执行失败: {e}", exc_info=True)
+        事件按 plan_id 进入各自的有序队列，由后台线程依次投递给订阅者，发布方不等待回调执行。
+        prepare 仅用于工具事件等携带数据的事件，在投递前于后台线程中执行，返回实际投递的数据，
+        用于把结果整理等耗时工作移出发布方线程。
+        """
+        # 处理工具事件、流式片段等携带数据的事件
+        if event_type in self.ROUTED_EVENTS and isinstance(plan_or_plan_id, str) and event_data is not None:
+            plan_id = plan_or_plan_id
+            callbacks = self._get_callbacks(event_type, plan_id)
+            if event_type == "tool_event":
+                logger.info(f"Publishing tool_event for plan_id: {plan_id}, callbacks: {len(callbacks)}")
+            if callbacks:
+                self._enqueue(plan_id, event_type, event_data, callbacks, prepare)
             return
         
         # 原有的Plan对象处理逻辑
@@ -67,14 +99,116 @@ class EventManager:
             logger.warning(f"无法找到plan对象的ID: {plan}")
             return
 
-        callbacks = []
+        if event_type in self.COALESCED_EVENTS and self._coalesce_seconds > 0:
+            with self._lock:
+                pending = self._pending.get(plan_id)
+                if pending is not None:
+                    # 窗口内已有待推送事件，到期时会读取最新快照，这里无需再推送
+                    self._pending[plan_id] = (event_type, plan, pending[2])
+                    return
+                timer = Timer(self._coalesce_seconds, self._flush_pending, args=(plan_id,))
+                timer.daemon = True
+                self._pending[plan_id] = (event_type, plan, timer)
+            timer.start()
+            return
+
+        # 其他事件发布前先推送窗口内积压的进度，保持事件顺序
+        self._flush_pending(plan_id)
+        self._dispatch(event_type, plan_id, plan)
+
+    def _get_callbacks(self, event_type: str, plan_id: str) -> List[Callable]:
         with self._lock:
             if event_type in self._subscribers and plan_id in self._subscribers[event_type]:
-                callbacks = self._subscribers[event_type][plan_id].copy()
+                return self._subscribers[event_type][plan_id].copy()
+        return []
+
+    def _enqueue(self, plan_id: str, event_type: str, data, callbacks: List[Callable],
+                 prepare: Optional[Callable[[Any], Any]] = None):
+        """事件进入计划的有序队列；队列空闲时安排一个消费者，保证同一计划的事件只由一个线程按序投递"""
+        with self._lock:
+            channel = self._channels.get(plan_id)
+            if channel is None:
+                channel = self._channels[plan_id] = _PlanChannel()
+            if event_type == "plan_stream" and self._merge_stream(channel, data, callbacks):
+                return
+            if event_type in self.LOW_VALUE_EVENTS and len(channel.items) >= self._queue_size:
+                channel.dropped += 1
+                if channel.dropped == 1 or channel.dropped % 100 == 0:
+                    logger.warning(f"Event queue of plan_id {plan_id} is full, dropped {channel.dropped} {event_type} events")
+                return
+            channel.items.append((event_type, data, callbacks, prepare))
+            if channel.scheduled:
+                return
+            channel.scheduled = True
+        self._executor.submit(self._drain, plan_id, channel)
+
+    @staticmethod
+    def _merge_stream(channel: _PlanChannel, data: Dict[str, Any], callbacks: List[Callable]) -> bool:
+        """尚未投递的同一目标的流式片段直接拼接到队尾，减少投递次数；须在持有锁时调用"""
+        if not channel.items or data.get("reset"):
+            return False
+        last_type, last_data, last_callbacks, _ = channel.items[-1]
+        if (last_type != "plan_stream" or last_data.get("reset") or last_callbacks != callbacks
+                or any(last_data.get(key) != data.get(key) for key in ("target", "step", "step_index"))):
+            return False
+        merged = dict(data, delta=last_data.get("delta", "") + data.get("delta", ""))
+        channel.items[-1] = (last_type, merged, last_callbacks, None)
+        return True
+
+    def _drain(self, plan_id: str, channel: _PlanChannel):
+        """依次投递计划队列中的事件，直到队列为空"""
+        while True:
+            with self._lock:
+                if not channel.items:
+                    channel.scheduled = False
+                    if self._channels.get(plan_id) is channel:
+                        del self._channels[plan_id]
+                    return
+                event_type, data, callbacks, prepare = channel.items.popleft()
+            if prepare is not None:
+                try:
+                    data = prepare(data)
+                except Exception as e:
+                    logger.error(f"Preparing {event_type} for plan_id {plan_id} failed: {e}", exc_info=True)
+            for callback in callbacks:
+                if event_type in self.DROPPABLE_EVENTS and isinstance(data, PlanSnapshot):
+                    self._versioned_callback(callback, plan_id, data)
+                else:
+                    self._safe_callback(callback, data)
+
+    def call_when_delivered(self, plan_id: str, func: Callable[[], Any]):
+        """在该计划此前发布的事件全部投递完成后执行 func（如关闭事件日志），调用方不等待"""
+        self._flush_pending(plan_id)
+        self._enqueue(plan_id, "delivered", None, [lambda _: func()])
+
+    def get_queue_stats(self) -> Dict[str, Dict[str, int]]:
+        """各计划待投递的事件数与因积压丢弃的事件数"""
+        with self._lock:
+            return {plan_id: {"queued": len(channel.items), "dropped": channel.dropped}
+                    for plan_id, channel in self._channels.items()}
+
+    def _flush_pending(self, plan_id: str):
+        """推送合并窗口内积压的进度事件（定时器到期或有其他事件发布时调用）"""
+        with self._lock:
+            pending = self._pending.pop(plan_id, None)
+        if pending is None:
+            return
+        event_type, plan, timer = pending
+        timer.cancel()
+        self._dispatch(event_type, plan_id, plan)
+
+    def _dispatch(self, event_type: str, plan_id: str, plan):
+        """以当前快照通知订阅者"""
+        # 订阅者拿到的是当前版本的不可变快照，而不是仍在被其他线程修改的Plan
+        data = plan.snapshot() if isinstance(plan, Plan) else plan
+        callbacks = self._get_callbacks(event_type, plan_id)
+        if isinstance(data, PlanSnapshot):
+            with self._lock:
+                self._latest_versions[plan_id] = max(self._latest_versions.get(plan_id, -1), data.version)
 
         logger.info(f"Publishing {event_type} for plan_id: {plan_id}, callbacks: {len(callbacks)}")
-        for callback in callbacks:
-            self._executor.submit(self._safe_callback, callback, plan)
+        if callbacks:
+            self._enqueue(plan_id, event_type, data, callbacks)
 
     def unsubscribe(self, event_type: str, plan_id: str, callback: Callable):
         """取消订阅特定计划ID的事件"""
@@ -85,6 +219,20 @@ class EventManager:
                     self._subscribers[event_type][plan_id].remove(callback)
                 except ValueError:
                     pass
+                if not self._subscribers[event_type][plan_id]:
+                    del self._subscribers[event_type][plan_id]
+            # 该计划已无任何订阅者时清理版本记录
+            if not any(plan_id in subscribers for subscribers in self._subscribers.values()):
+                self._latest_versions.pop(plan_id, None)
+
+    def _versioned_callback(self, callback: Callable, plan_id: str, snapshot: PlanSnapshot):
+        """执行前若已发布了更新的快照，则丢弃当前这次过期的进度通知"""
+        with self._lock:
+            latest_version = self._latest_versions.get(plan_id, snapshot.version)
+        if snapshot.version < latest_version:
+            logger.debug(f"Drop stale plan snapshot v{snapshot.version} for plan_id: {plan_id}, latest: v{latest_version}")
+            return
+        self._safe_callback(callback, snapshot)
 
     def _safe_callback(self, callback: Callable, data):
         try:
@@ -94,3 +242,84 @@ class EventManager:
 
 
 plan_report_event_manager = EventManager()
+
+
+class PlanStreamListener(StreamListener):
+    """把模型的流式输出转为 plan_stream 事件，增量推送最终总结（target=result）或步骤备注（target=step_notes）
+
+    步骤备注取自 mark_step 工具调用参数中的 step_notes 字段。片段攒够一定字符数或间隔一定时间才推送一次，
+    避免每个token都产生一条消息；完整内容仍以计划事件为准。
+    """
+
+    def __init__(self, plan_id: str, target: str, step: str = None, step_index: int = None):
+        config = get_report_stream_config()
+        self.plan_id = plan_id
+        self.target = target
+        self.step = step
+        self.step_index = step_index
+        self._flush_chars = config["flush_chars"]
+        self._flush_seconds = config["flush_ms"] / 1000
+        self._buffer: List[str] = []
+        self._buffer_size = 0
+        self._last_flush = time.monotonic()
+        self._sequence = 0
+        # 结构: {tool_call_index: JsonStringFieldStreamer}
+        self._notes_streamers: Dict[int, JsonStringFieldStreamer] = {}
+
+    @staticmethod
+    def create(plan_id: Optional[str], target: str, step: str = None,
+               step_index: int = None) -> Optional["PlanStreamListener"]:
+        """未启用流式推送或没有 plan_id 时返回 None，调用方据此退化为非流式调用"""
+        if not plan_id or not get_report_stream_config()["enabled"]:
+            return None
+        return PlanStreamListener(plan_id, target, step, step_index)
+
+    def on_content(self, delta: str):
+        if self.target == "result":
+            self._append(delta)
+
+    def on_tool_call(self, index: int, name: Optional[str], arguments_delta: str):
+        if self.target != "step_notes" or name != "mark_step":
+            return
+        streamer = self._notes_streamers.setdefault(index, JsonStringFieldStreamer("step_notes"))
+        self._append(streamer.feed(arguments_delta))
+
+    def on_reset(self):
+        self._buffer.clear()
+        self._buffer_size = 0
+        self._notes_streamers.clear()
+        self._publish("", reset=True)
+
+    def on_complete(self):
+        self._flush()
+        # 每轮模型调用的工具参数各自独立解析
+        self._notes_streamers.clear()
+
+    def _append(self, delta: str):
+        if not delta:
+            return
+        self._buffer.append(delta)
+        self._buffer_size += len(delta)
+        if self._buffer_size >= self._flush_chars or time.monotonic() - self._last_flush >= self._flush_seconds:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        delta = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffer_size = 0
+        self._publish(delta)
+
+    def _publish(self, delta: str, reset: bool = False):
+        self._last_flush = time.monotonic()
+        self._sequence += 1
+        plan_report_event_manager.publish("plan_stream", self.plan_id, {
+            "event_type": "plan_stream",
+            "target": self.target,
+            "step": self.step,
+            "step_index": self.step_index,
+            "delta": delta,
+            "reset": reset,
+            "sequence": self._sequence
+        })
@@ -0,0 +1,147 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import heapq
+import inspect
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Condition, Lock
+from typing import Callable, Dict, List, Optional
+
+from app.cosight.task.todolist import Plan
+from app.cosight.tool.async_runtime import async_runtime
+from app.common.logger_util import logger
+from config.config import get_step_scheduler_config
+
+
+class StepScheduler:
+    """事件驱动的DAG步骤调度器
+
+    - 所有计划共享一个进程级有界线程池，步骤不再各自创建线程
+    - 步骤函数为协程函数时提交到进程级后台事件循环执行，不占用工作线程
+    - 步骤执行结束即唤醒调度，依赖满足的步骤立即进入就绪队列，无需轮询
+    - 就绪队列按关键路径长度排序，优先执行下游链路最长的步骤
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_concurrency_per_plan: Optional[int] = None):
+        config = get_step_scheduler_config()
+        self.max_workers = max_workers or config["max_workers"]
+        self.max_concurrency_per_plan = max_concurrency_per_plan or config["max_concurrency_per_plan"]
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cosight-step")
+        self._lock = Lock()
+        # 结构: {plan_id: 正在执行（含排队等待线程）的步骤数}
+        self._running: Dict[str, int] = {}
+
+    def run(self, plan_id: str, plan: Plan, execute_step: Callable[[int], None],
+            max_concurrency: Optional[int] = None) -> None:
+        """执行计划中的所有步骤，直到DAG中不再有可执行或执行中的步骤后返回
+
+        Args:
+            plan_id: 计划ID，用于统计
+            plan: 待执行的计划
+            execute_step: 执行单个步骤的函数（或协程函数），参数为步骤索引
+            max_concurrency: 本计划的最大并发步骤数，缺省使用全局配置
+        """
+        limit = max(1, max_concurrency or self.max_concurrency_per_plan)
+        condition = Condition()
+        ready_queue = []  # 堆: (-关键路径长度, 步骤索引)
+        running = 0
+
+        def on_step_done(step_index, future):
+            nonlocal running
+            with condition:
+                running -= 1
+                self._update_running(plan_id, -1)
+                logger.info(f"Step {step_index} of plan {plan_id} finished, waking scheduler")
+                condition.notify()
+
+        with condition:
+            while True:
+                # 计划按索引记录已领取的步骤（步骤重排后随之映射），同一步骤不会重复取出
+                new_ready = []
+                while (step_index := plan.pop_ready_step()) is not None:
+                    new_ready.append(step_index)
+                if new_ready:
+                    priorities = self.critical_path_lengths(plan)
+                    for step_index in new_ready:
+                        heapq.heappush(ready_queue, (-priorities.get(step_index, 1), step_index))
+
+                while ready_queue and running < limit:
+                    _, step_index = heapq.heappop(ready_queue)
+                    logger.info(f"Starting new step {step_index} of plan {plan_id}")
+                    running += 1
+                    self._update_running(plan_id, 1)
+                    future = self._submit(execute_step, step_index)
+                    future.add_done_callback(lambda f, idx=step_index: on_step_done(idx, f))
+
+                if running == 0 and not ready_queue:
+                    logger.info(f"Plan {plan_id} drained: no more ready steps to execute and no running steps")
+                    break
+                condition.wait()
+
+        with self._lock:
+            self._running.pop(plan_id, None)
+
+    def _submit(self, execute_step: Callable, step_index: int) -> Future:
+        if inspect.iscoroutinefunction(execute_step):
+            return async_runtime.submit(execute_step(step_index))
+        return self._executor.submit(execute_step, step_index)
+
+    @staticmethod
+    def critical_path_lengths(plan: Plan) -> Dict[int, int]:
+        """计算每个步骤到DAG终点的最长路径长度（含自身），用作就绪步骤的优先级"""
+        step_count = len(plan.steps)
+        dependents: Dict[int, List[int]] = {i: [] for i in range(step_count)}
+        for step_index, deps in plan.dependencies.items():
+            for dep in deps:
+                if 0 <= int(dep) < step_count and 0 <= int(step_index) < step_count:
+                    dependents[int(dep)].append(int(step_index))
+
+        lengths: Dict[int, int] = {}
+        for root in range(step_count):
+            if root in lengths:
+                continue
+            # 迭代式后序遍历，visiting 用于容忍依赖成环的异常计划
+            stack = [(root, False)]
+            visiting = set()
+            while stack:
+                node, expanded = stack.pop()
+                if expanded:
+                    visiting.discard(node)
+                    lengths[node] = 1 + max((lengths.get(child, 1) for child in dependents[node]), default=0)
+                    continue
+                if node in lengths or node in visiting:
+                    continue
+                visiting.add(node)
+                stack.append((node, True))
+                stack.extend((child, False) for child in dependents[node] if child not in lengths)
+        return lengths
+
+    def _update_running(self, plan_id: str, delta: int):
+        with self._lock:
+            self._running[plan_id] = self._running.get(plan_id, 0) + delta
+
+    def get_stats(self) -> Dict[str, object]:
+        """获取调度器的并发配置与各计划当前执行中的步骤数"""
+        with self._lock:
+            running = dict(self._running)
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency_per_plan": self.max_concurrency_per_plan,
+            "running_steps": sum(running.values()),
+            "running_by_plan": running
+        }
+
+
+step_scheduler = StepScheduler()
@@ -14,7 +14,11 @@
 #    under the License.
 
 import re
-from typing import List, Optional, Dict, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+from threading import RLock
+from types import MappingProxyType
+from typing import Any, List, Mapping, Optional, Dict, Tuple, Union
 import os
 import platform
 from pathlib import PureWindowsPath, PurePosixPath
@@ -27,29 +31,177 @@ folder_files_map: Dict[str, List[str]] = {}
 subfolder_files_map: Dict[str, List[str]] = {}
 
 
+# 依赖视为已结束（不再阻塞下游）的状态判断：只要不是未开始或执行中
+def _is_finished(status: Optional[str]) -> bool:
+    return status not in ("not_started", "in_progress")
+
+
+@dataclass(slots=True)
+class StepRecord:
+    """单个步骤的执行记录，按索引存放在 Plan 中"""
+    text: str
+    status: str = "not_started"
+    notes: str = ""
+    details: str = ""
+    files: Union[str, List[Dict[str, str]]] = ""
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass(frozen=True, slots=True)
+class PlanSnapshot:
+    """Plan在某一版本下的不可变视图，供事件订阅者跨线程读取，避免读到正在修改的状态"""
+    version: int
+    title: str
+    steps: Tuple[str, ...]
+    step_statuses: Mapping[str, str]
+    step_notes: Mapping[str, str]
+    step_details: Mapping[str, str]
+    step_files: Mapping[str, Union[str, List[Dict[str, str]]]]
+    step_tool_calls: Mapping[str, Tuple[Dict[str, Any], ...]]
+    dependencies: Mapping[int, Tuple[int, ...]]
+    progress: Mapping[str, int]
+    ready_steps: Tuple[int, ...]
+    result: str
+
+    def get_progress(self) -> Dict[str, int]:
+        return dict(self.progress)
+
+    def get_plan_result(self):
+        return self.result
+
+    def get_ready_steps(self) -> List[int]:
+        return list(self.ready_steps)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典，字段与前端 manus-step 消息中的 plan 结构一致"""
+        return {
+            "title": self.title,
+            "steps": list(self.steps),
+            "step_files": dict(self.step_files),
+            "step_statuses": dict(self.step_statuses),
+            "step_notes": dict(self.step_notes),
+            "step_details": dict(self.step_details),
+            "step_tool_calls": {step: list(calls) for step, calls in self.step_tool_calls.items()},
+            "dependencies": {str(k): list(v) for k, v in self.dependencies.items()},
+            "progress": dict(self.progress),
+            "result": self.result
+        }
+
+
 class Plan:
-    """Represents a single plan with steps, statuses, and execution details as a DAG."""
+    """Represents a single plan with steps, statuses, and execution details as a DAG.
+
+    所有读写均在实例锁内完成；每次修改递增 version，snapshot() 按版本缓存不可变视图。
+    """
 
     def __init__(self, title: str = "", steps: List[str] = None, dependencies: Dict[int, List[int]] = None, work_space_path: str = ""):
+        self._lock = RLock()
+        self._version = 0
+        self._snapshot: Optional[PlanSnapshot] = None
         self.title = title
-        self.steps = steps if steps else []
-        # 使用步骤内容（中文）作为key存储状态、备注和详细信息
-        self.step_statuses = {step: "not_started" for step in self.steps}
-        self.step_notes = {step: "" for step in self.steps}
-        self.step_details = {step: "" for step in self.steps}
-        self.step_files = {step: "" for step in self.steps}
-        # 存储每个步骤的工具调用信息
-        self.step_tool_calls = {step: [] for step in self.steps}
+        # 步骤记录按索引存放，文本相同的步骤互不影响
+        self._records: List[StepRecord] = [StepRecord(step) for step in (steps or [])]
+        # MCP等全局工具（step_index = -1）的调用信息
+        self._global_tool_calls: List[Dict[str, Any]] = []
         # 使用邻接表表示依赖关系
         if dependencies:
             self.dependencies = self._normalize_dependencies(dependencies)
         else:
-            self.dependencies = {i: [i - 1] for i in range(1, len(self.steps))} if len(self.steps) > 1 else {}
+            self.dependencies = {i: [i - 1] for i in range(1, len(self._records))} if len(self._records) > 1 else {}
         self.result = ""
         self.work_space_path = work_space_path if work_space_path else os.environ.get("WORKSPACE_PATH") or os.getcwd()
+        # 增量维护的DAG索引，由 _rebuild_index 初始化，mark_step 时按出度增量更新
+        self._dependents: Dict[int, List[int]] = {}
+        self._unfinished_deps: List[int] = []
+        self._uncompleted_deps: List[int] = []
+        self._ready: Dict[int, None] = {}
+        self._unclaimed: Dict[int, None] = {}
+        self._claimed: set = set()
+        self._status_counts: Dict[str, int] = {}
+        self._rebuild_index()
+
+    # 以下为按步骤内容（中文）为key的只读视图，每次返回新字典，供序列化与展示使用
+    @property
+    def steps(self) -> List[str]:
+        with self._lock:
+            return [record.text for record in self._records]
+
+    @property
+    def step_statuses(self) -> Dict[str, str]:
+        with self._lock:
+            return {record.text: record.status for record in self._records}
+
+    @property
+    def step_notes(self) -> Dict[str, str]:
+        with self._lock:
+            return {record.text: record.notes for record in self._records}
+
+    @property
+    def step_details(self) -> Dict[str, str]:
+        with self._lock:
+            return {record.text: record.details for record in self._records}
+
+    @property
+    def step_files(self) -> Dict[str, Union[str, List[Dict[str, str]]]]:
+        with self._lock:
+            return {record.text: record.files for record in self._records}
+
+    @property
+    def step_tool_calls(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            tool_calls = {record.text: list(record.tool_calls) for record in self._records}
+            if self._global_tool_calls:
+                tool_calls["__global_tools__"] = list(self._global_tool_calls)
+            return tool_calls
+
+    @property
+    def version(self) -> int:
+        """单调递增的修改版本号"""
+        return self._version
+
+    def _touch(self) -> None:
+        """记录一次修改，须在持有锁时调用"""
+        self._version += 1
+        self._snapshot = None
+
+    def snapshot(self) -> PlanSnapshot:
+        """获取当前版本的不可变快照，同一版本只构建一次并在订阅者间共享"""
+        with self._lock:
+            if self._snapshot is None:
+                tool_calls = {record.text: tuple(record.tool_calls) for record in self._records}
+                if self._global_tool_calls:
+                    tool_calls["__global_tools__"] = tuple(self._global_tool_calls)
+                self._snapshot = PlanSnapshot(
+                    version=self._version,
+                    title=self.title,
+                    steps=tuple(record.text for record in self._records),
+                    step_statuses=MappingProxyType({record.text: record.status for record in self._records}),
+                    step_notes=MappingProxyType({record.text: record.notes for record in self._records}),
+                    step_details=MappingProxyType({record.text: record.details for record in self._records}),
+                    step_files=MappingProxyType({record.text: record.files for record in self._records}),
+                    step_tool_calls=MappingProxyType(tool_calls),
+                    dependencies=MappingProxyType({k: tuple(v) for k, v in self.dependencies.items()}),
+                    progress=MappingProxyType(self.get_progress()),
+                    ready_steps=tuple(sorted(self._ready)),
+                    result=self.result
+                )
+            return self._snapshot
+
+    def get_step_record(self, step_index: int) -> StepRecord:
+        """按索引获取步骤记录（返回内部对象，修改须通过 mark_step/add_tool_call）"""
+        if step_index < 0 or step_index >= len(self._records):
+            raise ValueError(f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(self._records) - 1}.")
+        return self._records[step_index]
+
+    def get_step_status(self, step_index: int) -> str:
+        """按索引获取步骤状态"""
+        with self._lock:
+            return self.get_step_record(step_index).status
 
     def set_plan_result(self, plan_result):
-        self.result = plan_result
+        with self._lock:
+            self.result = plan_result
+            self._touch()
 
     def get_plan_result(self):
         return self.result
@@ -60,73 +212,131 @@ class Plan:
         返回:
             List[int]: 可立即执行的步骤索引列表（返回所有符合条件的步骤）
         """
-        logger.debug(f"get_ready_steps dependencies: {self.dependencies}")
-        ready_steps = []
-        for step_index in range(len(self.steps)):
-            # 获取该步骤的所有依赖
-            dependencies = self.dependencies.get(step_index, [])
+        with self._lock:
+            return sorted(self._ready)
 
-            # 检查所有依赖是否都已完成
-            if all(self.step_statuses.get(self.steps[int(dep)]) not  in["not_started","in_progress"]  for dep in dependencies):
-                # 检查步骤本身是否未开始
-                if self.step_statuses.get(self.steps[step_index]) == "not_started":
-                    ready_steps.append(step_index)
+    def pop_ready_step(self) -> Optional[int]:
+        """取出一个尚未被领取的可执行步骤，O(1)
 
-        return ready_steps
+        被领取的步骤在状态变化前不会再次返回，但仍会出现在 get_ready_steps 中。
+
+        返回:
+            Optional[int]: 步骤索引，没有可领取的步骤时返回 None
+        """
+        with self._lock:
+            if not self._unclaimed:
+                return None
+            step_index = next(iter(self._unclaimed))
+            del self._unclaimed[step_index]
+            self._claimed.add(step_index)
+            return step_index
+
+    def _rebuild_index(self) -> None:
+        """根据当前步骤与依赖全量重建反向依赖表、入度计数、就绪集合与状态计数"""
+        step_count = len(self._records)
+        self._dependents = {i: [] for i in range(step_count)}
+        self._unfinished_deps = [0] * step_count
+        self._uncompleted_deps = [0] * step_count
+        self._status_counts = {}
+        for record in self._records:
+            self._status_counts[record.status] = self._status_counts.get(record.status, 0) + 1
+
+        for step_index, deps in self.dependencies.items():
+            step_index = int(step_index)
+            if not 0 <= step_index < step_count:
+                logger.warning(f"Ignore dependencies of unknown step {step_index}")
+                continue
+            for dep in deps:
+                dep = int(dep)
+                if not 0 <= dep < step_count:
+                    logger.warning(f"Ignore unknown dependency {dep} of step {step_index}")
+                    continue
+                self._dependents[dep].append(step_index)
+                dep_status = self._records[dep].status
+                if not _is_finished(dep_status):
+                    self._unfinished_deps[step_index] += 1
+                if dep_status != "completed":
+                    self._uncompleted_deps[step_index] += 1
+
+        self._claimed = {i for i in self._claimed if i < step_count}
+        self._ready = {}
+        self._unclaimed = {}
+        for step_index in range(step_count):
+            self._refresh_ready(step_index)
+
+    def _refresh_ready(self, step_index: int) -> None:
+        """根据步骤自身状态与未结束依赖数，更新其在就绪集合中的成员关系"""
+        status = self._records[step_index].status
+        if status == "not_started" and self._unfinished_deps[step_index] == 0:
+            if step_index not in self._ready:
+                self._ready[step_index] = None
+                if step_index not in self._claimed:
+                    self._unclaimed[step_index] = None
+        else:
+            self._ready.pop(step_index, None)
+            self._unclaimed.pop(step_index, None)
+            self._claimed.discard(step_index)
+
+    def _set_step_status(self, step_index: int, status: str) -> None:
+        """修改步骤状态，并以 O(出度) 增量更新下游步骤的入度计数与就绪集合"""
+        record = self._records[step_index]
+        old_status = record.status
+        if old_status == status:
+            return
+        record.status = status
+        self._status_counts[old_status] = self._status_counts.get(old_status, 0) - 1
+        self._status_counts[status] = self._status_counts.get(status, 0) + 1
+
+        finished_delta = int(_is_finished(old_status)) - int(_is_finished(status))
+        completed_delta = int(old_status == "completed") - int(status == "completed")
+        for dependent in self._dependents.get(step_index, []):
+            self._unfinished_deps[dependent] += finished_delta
+            self._uncompleted_deps[dependent] += completed_delta
+            if finished_delta:
+                self._refresh_ready(dependent)
+        self._refresh_ready(step_index)
 
     def update(self, title: Optional[str] = None, steps: Optional[List[str]] = None,
                dependencies: Optional[Dict[int, List[int]]] = None) -> None:
         """Update the plan with new title, steps, or dependencies while preserving completed steps."""
-        if title:
-            self.title = title
         if type(steps) == str:
             tmep_str = str(steps)
             steps = tmep_str.split("\n")
-        if steps:
-            # Preserve all existing steps and their statuses
-            new_steps = []
-            new_statuses = {}
-            new_notes = {}
-            new_details = {}
-            new_tool_calls = {}
-
-            # First, process all steps in the input order
-            for step in steps:
-                # If step exists in current steps and is started, preserve it
-                if step in self.steps and self.step_statuses.get(step) != "not_started":
-                    new_steps.append(step)
-                    new_statuses[step] = self.step_statuses.get(step)
-                    new_notes[step] = self.step_notes.get(step)
-                    new_details[step] = self.step_details.get(step)
-                    new_tool_calls[step] = self.step_tool_calls.get(step, [])
-                # If step exists in current steps and is not started, preserve as not_started
-                elif step in self.steps:
-                    new_steps.append(step)
-                    new_statuses[step] = "not_started"
-                    new_notes[step] = self.step_notes.get(step)
-                    new_details[step] = self.step_details.get(step)
-                    new_tool_calls[step] = self.step_tool_calls.get(step, [])
-                # If step is new, add as not_started
-                else:
-                    new_steps.append(step)
-                    new_statuses[step] = "not_started"
-                    new_notes[step] = ""
-                    new_details[step] = ""
-                    new_tool_calls[step] = []
-
-            self.steps = new_steps
-            self.step_statuses = new_statuses
-            self.step_notes = new_notes
-            self.step_details = new_details
-            self.step_tool_calls = new_tool_calls
-        logger.info(f"before update dependencies: {self.dependencies}")
-        if dependencies:
-            self.dependencies.clear()
-            dependencies = self._normalize_dependencies(dependencies)
-            self.dependencies.update(dependencies)
-        else:
-            self.dependencies = {i: [i - 1] for i in range(1, len(steps))} if len(steps) > 1 else {}
-        logger.info(f"after update dependencies: {self.dependencies}")
+        with self._lock:
+            if title:
+                self.title = title
+            if steps:
+                # 文本 -> 旧索引列表，仅用于新旧步骤对齐；文本相同的步骤按出现顺序依次复用
+                old_indices: Dict[str, deque] = {}
+                for i, record in enumerate(self._records):
+                    old_indices.setdefault(record.text, deque()).append(i)
+
+                new_records = []
+                new_claimed = set()
+                for step in steps:
+                    candidates = old_indices.get(step)
+                    if candidates:
+                        # 复用已有记录，保留状态、备注、详情与工具调用
+                        old_index = candidates.popleft()
+                        if old_index in self._claimed:
+                            new_claimed.add(len(new_records))
+                        new_records.append(self._records[old_index])
+                    else:
+                        # If step is new, add as not_started
+                        new_records.append(StepRecord(step))
+
+                self._records = new_records
+                self._claimed = new_claimed
+            logger.info(f"before update dependencies: {self.dependencies}")
+            if dependencies:
+                self.dependencies.clear()
+                dependencies = self._normalize_dependencies(dependencies)
+                self.dependencies.update(dependencies)
+            else:
+                self.dependencies = {i: [i - 1] for i in range(1, len(self._records))} if len(self._records) > 1 else {}
+            logger.info(f"after update dependencies: {self.dependencies}")
+            self._rebuild_index()
+            self._touch()
 
     def mark_step(self, step_index: int, step_status: Optional[str] = None, step_notes: Optional[str] = None) -> None:
         """Mark a single step with specific statuses, notes, and details.
@@ -137,27 +347,30 @@ class Plan:
             step_notes (Optional[str]): Notes for the step
         """
         # Validate step index
-        if step_index < 0 or step_index >= len(self.steps):
-            raise ValueError(f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(self.steps) - 1}.")
+        self.get_step_record(step_index)
         logger.info(f"step_index: {step_index}, step_status is {step_status},step_notes is {step_notes}")
-        step = self.steps[step_index]
-
-        # Update step status
-        if step_status is not None:
-            self.step_statuses[step] = step_status
 
-        # Update step notes
+        # 路径处理涉及遍历工作空间目录，放在锁外执行
         if step_notes is not None:
             step_notes, file_path_info = process_text_with_workspace(step_notes, self.work_space_path)
-            self.step_notes[step] = step_notes
-            self.step_files[step] = file_path_info
 
-        # Validate status if marking as completed
-        if step_status == "completed":
-            # Check if all dependencies are completed
-            if not all(self.step_statuses[self.steps[int(dep)]] == "completed" for dep in
-                       self.dependencies.get(step_index, [])):
-                raise ValueError(f"Cannot complete step {step_index} before its dependencies are completed")
+        with self._lock:
+            record = self.get_step_record(step_index)
+            # Update step status
+            if step_status is not None:
+                self._set_step_status(step_index, step_status)
+
+            # Update step notes
+            if step_notes is not None:
+                record.notes = step_notes
+                record.files = file_path_info
+            self._touch()
+
+            # Validate status if marking as completed
+            if step_status == "completed":
+                # Check if all dependencies are completed
+                if self._uncompleted_deps[step_index] > 0:
+                    raise ValueError(f"Cannot complete step {step_index} before its dependencies are completed")
 
     def add_tool_call(self, step_index: int, tool_name: str, tool_args: str, tool_result: str = None) -> None:
         """Add tool call information to a specific step.
@@ -168,38 +381,24 @@ class Plan:
             tool_args (str): Arguments passed to the tool
             tool_result (str): Result returned by the tool (deprecated, will be ignored)
         """
-        # Handle global tools (MCP tools) with step_index = -1
-        if step_index == -1:
-            # Store global tools under a special key
-            global_key = "__global_tools__"
-            if global_key not in self.step_tool_calls:
-                self.step_tool_calls[global_key] = []
-            
-            tool_call_info = {
-                "tool_name": tool_name,
-                "tool_args": tool_args,
-                "tool_result": tool_result,
-                "timestamp": self._get_current_timestamp()
-            }
-            self.step_tool_calls[global_key].append(tool_call_info)
-            logger.info(f"Added global tool call: {tool_name}")
-            return
-        
-        # Handle step-specific tools
-        if step_index < 0 or step_index >= len(self.steps):
-            raise ValueError(f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(self.steps) - 1}.")
-        
-        step = self.steps[step_index]
         tool_call_info = {
             "tool_name": tool_name,
             "tool_args": tool_args,
             "tool_result": tool_result,
             "timestamp": self._get_current_timestamp()
         }
-        
-        if step not in self.step_tool_calls:
-            self.step_tool_calls[step] = []
-        self.step_tool_calls[step].append(tool_call_info)
+
+        with self._lock:
+            # Handle global tools (MCP tools) with step_index = -1
+            if step_index == -1:
+                self._global_tool_calls.append(tool_call_info)
+                self._touch()
+                logger.info(f"Added global tool call: {tool_name}")
+                return
+
+            # Handle step-specific tools
+            self.get_step_record(step_index).tool_calls.append(tool_call_info)
+            self._touch()
         logger.info(f"Added tool call for step {step_index}: {tool_name}")
 
     def _get_current_timestamp(self) -> str:
@@ -236,16 +435,21 @@ class Plan:
 
     def get_progress(self) -> Dict[str, int]:
         """Get progress statistics of the plan."""
-        return {
-            "total": len(self.steps),
-            "completed": sum(1 for status in self.step_statuses.values() if status == "completed"),
-            "in_progress": sum(1 for status in self.step_statuses.values() if status == "in_progress"),
-            "blocked": sum(1 for status in self.step_statuses.values() if status == "blocked"),
-            "not_started": sum(1 for status in self.step_statuses.values() if status == "not_started")
-        }
+        with self._lock:
+            return {
+                "total": len(self._records),
+                "completed": self._status_counts.get("completed", 0),
+                "in_progress": self._status_counts.get("in_progress", 0),
+                "blocked": self._status_counts.get("blocked", 0),
+                "not_started": self._status_counts.get("not_started", 0)
+            }
 
     def format(self, with_detail: bool = False) -> str:
         """Format the plan for display."""
+        with self._lock:
+            return self._format(with_detail)
+
+    def _format(self, with_detail: bool) -> str:
         output = f"Plan: {self.title}\n"
         output += "=" * len(output) + "\n\n"
 
@@ -261,20 +465,20 @@ class Plan:
         output += f"{progress['blocked']} blocked, {progress['not_started']} not started\n\n"
         output += "Steps:\n"
 
-        for i, step in enumerate(self.steps):
+        for i, record in enumerate(self._records):
             status_symbol = {
                 "not_started": "[ ]",
                 "in_progress": "[→]",
                 "completed": "[✓]",
                 "blocked": "[!]",
-            }.get(self.step_statuses.get(step), "[ ]")
+            }.get(record.status, "[ ]")
 
             # 显示依赖关系
             deps = self.dependencies.get(i, [])
             dep_str = f" (depends on: {', '.join(map(str, deps))})" if deps else ""
-            output += f"Step{i} :{status_symbol} {step}{dep_str}\n"
-            if self.step_notes.get(step):
-                output += f"   Notes: {self.step_notes.get(step)}\nDetails: {self.step_details.get(step)}\n" if with_detail else f"   Notes: {self.step_notes.get(step)}\n"
+            output += f"Step{i} :{status_symbol} {record.text}{dep_str}\n"
+            if record.notes:
+                output += f"   Notes: {record.notes}\nDetails: {record.details}\n" if with_detail else f"   Notes: {record.notes}\n"
 
         return output
 
@@ -284,7 +488,8 @@ class Plan:
         Returns:
             bool: True if any step is blocked, False otherwise
         """
-        return any(status == "blocked" for status in self.step_statuses.values())
+        with self._lock:
+            return self._status_counts.get("blocked", 0) > 0
 
 
 def get_last_folder_name(workspace_path: str) -> str:
@@ -355,6 +560,9 @@ def extract_and_replace_paths(text: str, folder_name: str, workspace_path: str)
         try:
             # 遍历工作空间目录下的所有文件
             for filename in os.listdir(workspace_path):
+                # 隐藏文件与目录（如 .tool_results 中卸载的工具输出）为内部数据，不作为步骤产出
+                if filename.startswith("."):
+                    continue
                 # 如果文件名不在该文件夹的列表中，则添加
                 if filename not in folder_files_map[folder_name]:
                     folder_files_map[folder_name].append(filename)
@@ -365,6 +573,7 @@ def extract_and_replace_paths(text: str, folder_name: str, workspace_path: str)
 
             # 遍历工作空间目录下的所有子目录
             for root, dirs, files in os.walk(workspace_path):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
                 logger.info(f"root:{root}")
                 if root != workspace_path:  # 跳过根目录，因为已经在上面处理过了
                     # 获取相对路径
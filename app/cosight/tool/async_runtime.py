@@ -0,0 +1,112 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import atexit
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Coroutine, List, Optional, TypeVar
+
+from app.common.logger_util import logger
+
+_T = TypeVar("_T")
+
+
+class AsyncRuntime:
+    """进程级的后台事件循环，同步代码中的异步工具统一通过 run_coro 提交到这里执行
+
+    事件循环长期存在，异步工具可以在多次调用之间复用 HTTP 会话与连接池；调用超时时取消对应的
+    任务，由协程自身的清理逻辑释放资源，不会留下未关闭的事件循环。
+    注意：提交的协程中不能有阻塞调用，阻塞的部分需要用 asyncio.to_thread 放到线程中执行。
+    """
+
+    def __init__(self, name: str = "cosight-async-runtime"):
+        self._name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._shutdown_hooks: List[Callable[[], Awaitable[Any]]] = []
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """后台事件循环，首次访问时启动"""
+        if self._loop is not None and self._loop.is_running():
+            return self._loop
+        with self._lock:
+            if self._loop is None or not self._loop.is_running():
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(started.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name=self._name, daemon=True)
+                self._thread.start()
+                started.wait()
+                self._loop = loop
+                atexit.register(self.shutdown)
+                logger.info(f"Async runtime {self._name} started")
+            return self._loop
+
+    def in_runtime_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine[Any, Any, _T]) -> Future:
+        """提交协程并立即返回 concurrent.futures.Future，不等待结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_coro(self, coro: Coroutine[Any, Any, _T], timeout: Optional[float] = None) -> _T:
+        """在后台事件循环中执行协程并阻塞等待结果，超时则取消协程并抛出 TimeoutError"""
+        if self.in_runtime_thread():
+            coro.close()
+            raise RuntimeError("run_coro cannot be called from the async runtime thread, await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Coroutine did not complete within {timeout} seconds and was cancelled")
+
+    def add_shutdown_hook(self, hook: Callable[[], Awaitable[Any]]) -> None:
+        """注册进程退出时在后台事件循环中执行的清理协程（如关闭共享的 HTTP 会话）"""
+        self._shutdown_hooks.append(hook)
+
+    async def _run_shutdown_hooks(self) -> None:
+        for hook in self._shutdown_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.warning(f"Async runtime shutdown hook failed: {e}")
+
+    def shutdown(self, timeout: float = 10) -> None:
+        """执行清理协程并停止后台事件循环"""
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._run_shutdown_hooks(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"Error shutting down async runtime {self._name}: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+
+
+async_runtime = AsyncRuntime()
+
+
+def run_coro(coro: Coroutine[Any, Any, _T], timeout: Optional[float] = None) -> _T:
+    """同步工具入口调用异步实现的统一桥接，见 AsyncRuntime.run_coro"""
+    return async_runtime.run_coro(coro, timeout)
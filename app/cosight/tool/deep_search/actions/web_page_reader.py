@@ -13,14 +13,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import re
 import requests
 from typing import Tuple
-from bs4 import BeautifulSoup
-from cachetools import cached, TTLCache
 from markdownify import markdownify as md
 
 from app.common.logger_util import logger
+from app.cosight.tool.html_extract import extract_text
+from app.cosight.tool.web_page_cache import WebPage, fetch_page, page_text
+
+
+def _extract_page_text(page: WebPage) -> str:
+    return extract_text(page.text)
+
 
 class ContentFetcher:
     """基础网页内容获取器"""
@@ -33,7 +37,6 @@ class ContentFetcher:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
 
-    @cached(cache=TTLCache(maxsize=100, ttl=600))
     def fetch(self, url: str) -> Tuple[bool, str]:
         logger.debug(f"开始获取 URL: {url}")
         proxies = {
@@ -41,15 +44,15 @@ class ContentFetcher:
             "https": self.proxy
         }
         try:
-            response = requests.get(url, headers=self.headers, timeout=self.timeout, proxies=proxies)
-            response.raise_for_status()
-            html = response.content
-            logger.debug(f"收到响应: {html[:100]}...")
+            # 经共享网页缓存抓取，与其他抓取工具共用已下载的页面
+            page = fetch_page(url, headers=self.headers, timeout=self.timeout, proxies=proxies)
+            if page.status >= 400:
+                raise requests.HTTPError(f"{page.status} Error for url: {url}")
+            logger.debug(f"收到响应: {page.body[:100]}...")
         except requests.RequestException as e:
             logger.error(f"请求失败: {str(e)}", exc_info=True)
             return False, str(e)
 
-        text = BeautifulSoup(html, 'html.parser').get_text()
-        cleaned_text = re.sub(r'\n+', '\n', text)
+        cleaned_text = page_text(page, "full_text", _extract_page_text)
         logger.info(f"成功获取网页内容，URL: {url}")
-        return True, cleaned_text
\ No newline at end of file
+        return True, cleaned_text
@@ -13,7 +13,6 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import asyncio
 import json
 import httpx
 from typing import Optional, List
@@ -23,6 +22,7 @@ from lagent.actions.bing_browser import DuckDuckGoSearch
 from app.cosight.tool.deep_search.common.entity import SearchSource
 from config.config import get_tavily_config
 from app.common.logger_util import logger
+from app.cosight.tool.async_runtime import run_coro
 
 
 class TavilySearch(DuckDuckGoSearch):
@@ -47,14 +47,7 @@ class TavilySearch(DuckDuckGoSearch):
             self.include_domains = urls
 
     def _call_ddgs(self, query: str, **kwargs) -> dict:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            response = loop.run_until_complete(
-                self._async_call_ddgs(query, **kwargs))
-            return response
-        finally:
-            loop.close()
+        return run_coro(self._async_call_ddgs(query, **kwargs))
 
     async def _async_call_ddgs(self, query: str, **kwargs) -> dict:
         """实现Tavily搜索接口"""
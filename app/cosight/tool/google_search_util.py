@@ -16,12 +16,19 @@
 from typing import List, Dict, Any
 import os
 from googlesearch import search
-from bs4 import BeautifulSoup
 import random
 import asyncio
-import aiohttp
 from .scrape_website_toolkit import is_valid_url
 from app.common.logger_util import logger
+from app.cosight.tool.async_runtime import run_coro
+from app.cosight.tool.html_extract import BOILERPLATE_TAGS, DROP_TAGS, extract_text
+from app.cosight.tool.search_fanout import TIMED_OUT_CONTENT, fetch_all
+from app.cosight.tool.web_page_cache import WebPage, afetch_page, page_text
+
+
+def _extract_page_text(page: WebPage) -> str:
+    # 搜索结果只需要正文部分，去掉导航、页脚等页面框架
+    return extract_text(page.text, main_content=True, drop_tags=DROP_TAGS + BOILERPLATE_TAGS)
 
 
 async def fetch_url_content(url: str) -> str:
@@ -40,32 +47,13 @@ async def fetch_url_content(url: str) -> str:
         proxy = os.environ.get("PROXY")
         if not is_valid_url(url):
             return f'current url is valid {url}'
-        timeout = aiohttp.ClientTimeout(total=180)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url, headers=headers, proxy=proxy) as response:
-                if response.status == 200:
-                    # Check content type
-                    content_type = response.headers.get('Content-Type', '')
-                    if 'text/html' not in content_type:
-                        return f"Non-HTML content: {content_type}"
-
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-
-                    # Remove unwanted elements
-                    for element in soup(["script", "style", "nav", "footer", "iframe", "noscript"]):
-                        element.decompose()
-
-                    # Get clean text
-                    text = soup.get_text(separator='\n')
-                    # Clean up extra whitespace
-                    lines = (line.strip() for line in text.splitlines())
-                    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                    text = '\n'.join(chunk for chunk in chunks if chunk)
-
-                    return text
-                else:
-                    return f"HTTP Error: {response.status}"
+        # 经共享网页缓存抓取：新鲜的缓存直接返回，过期的以条件请求重新验证
+        page = await afetch_page(url, headers=headers, proxy=proxy, content_types=("text/html",))
+        if page.status != 200:
+            return f"HTTP Error: {page.status}"
+        if 'text/html' not in page.content_type:
+            return f"Non-HTML content: {page.content_type}"
+        return await asyncio.to_thread(page_text, page, "main_text", _extract_page_text)
 
     except asyncio.TimeoutError as e:
         logger.error(f"Request timed out: {str(e)}", exc_info=True)
@@ -91,38 +79,34 @@ def search_google(query: str, max_results: int = 5) -> List[Dict[str, Any]]:
 
     max_retries = 3
     proxy = os.environ.get("PROXY")
+    links = None
+    # 只重试搜索本身，页面抓取只做一次
     for attempt in range(max_retries):
         try:
-
             links = list(search(query, num_results=max_results, proxy=proxy, advanced=True))
-
-            # Create a new event loop for the current thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            # Format results and fetch content
-            async def process_links():
-                tasks = []
-                for i, link in enumerate(links, start=1):
-                    tasks.append((i, link, fetch_url_content(link.url)))
-                # Run all fetch operations concurrently
-                fetch_results = await asyncio.gather(*[task[2] for task in tasks])
-                for idx, (i, link, _) in enumerate(tasks):
-                    response = {
-                        "result_id": i,
-                        "title": link.title,
-                        "description": link.description,
-                        "url": link.url,
-                        "content": fetch_results[idx]  # Add scraped content
-                    }
-                    responses.append(response)
-
-            loop.run_until_complete(process_links())
-            loop.close()
-            break  # Success, exit retry loop
+            break
         except Exception as e:
             logger.error(f"Unhandled exception: {e}", exc_info=True)
             if attempt == max_retries - 1:  # Last attempt failed
                 responses.append({"error": f"Google search failed after {max_retries} attempts: {e}"})
+                return responses
+
+    try:
+        # 在共享的后台事件循环中限流并发抓取，达到完成数或期限即返回
+        contents = run_coro(fetch_all([link.url for link in links], fetch_url_content))
+    except Exception as e:
+        logger.error(f"fetch search results error: {e}", exc_info=True)
+        contents = [f"Error fetching content: {str(e)}"] * len(links)
+    for i, (link, content) in enumerate(zip(links, contents), start=1):
+        response = {
+            "result_id": i,
+            "title": link.title,
+            "description": link.description,
+            "url": link.url,
+            "content": content if content is not None else TIMED_OUT_CONTENT  # Add scraped content
+        }
+        if content is None:
+            response["timed_out"] = True
+        responses.append(response)
     logger.info(f"search google for {responses}")
     return responses
@@ -0,0 +1,304 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import importlib.util
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Any, Iterable, Optional, Sequence, Union
+
+from app.common.logger_util import logger
+from config.config import get_html_extract_config
+
+# 任何模式下都会去掉的标签
+DROP_TAGS = ("script", "style", "noscript", "iframe", "template", "svg")
+# 导航、页脚等页面框架标签，提取搜索结果摘要时一并去掉
+BOILERPLATE_TAGS = ("nav", "footer")
+
+_HAS_SELECTOLAX = importlib.util.find_spec("selectolax") is not None
+_HAS_LXML = importlib.util.find_spec("lxml") is not None
+
+_WHITESPACE = re.compile(r"\s+")
+_POSITIVE = re.compile(r"article|body|content|entry|main|page|post|text|blog|story|正文", re.I)
+_NEGATIVE = re.compile(r"comment|footer|footnote|header|menu|meta|nav|related|share|sidebar|social|sponsor|"
+                       r"advert|banner|breadcrumb|promo|recommend|copyright", re.I)
+_TAG_WEIGHTS = {"article": 10, "main": 10, "section": 5, "div": 5, "td": 3, "blockquote": 3,
+                "ul": -3, "ol": -3, "li": -3, "form": -3, "th": -5}
+# 参与正文打分的段落最少字符数
+_MIN_PARAGRAPH_CHARS = 25
+# 选出的正文少于该字符数时认为识别失败，退回全文
+_MIN_MAIN_CHARS = 200
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = Lock()
+
+
+class _SelectolaxTree:
+    name = "selectolax"
+
+    @staticmethod
+    def parse(html: Union[str, bytes], drop_tags: Sequence[str]) -> Any:
+        from selectolax.parser import HTMLParser
+        tree = HTMLParser(html)
+        tree.strip_tags(list(drop_tags))
+        return tree.body or tree.root
+
+    @staticmethod
+    def paragraphs(root: Any) -> Iterable[Any]:
+        return root.css("p, pre")
+
+    @staticmethod
+    def parent(node: Any) -> Any:
+        return node.parent
+
+    @staticmethod
+    def key(node: Any) -> Any:
+        return node.mem_id
+
+    @staticmethod
+    def tag(node: Any) -> str:
+        return node.tag or ""
+
+    @staticmethod
+    def class_and_id(node: Any) -> str:
+        attributes = node.attributes
+        return f"{attributes.get('class') or ''} {attributes.get('id') or ''}"
+
+    @staticmethod
+    def text(node: Any) -> str:
+        return node.text(deep=True)
+
+    @staticmethod
+    def lines(node: Any) -> str:
+        return node.text(deep=True, separator="\n")
+
+    @staticmethod
+    def links(node: Any) -> Iterable[Any]:
+        return node.css("a")
+
+
+class _LxmlTree:
+    name = "lxml"
+
+    @staticmethod
+    def parse(html: Union[str, bytes], drop_tags: Sequence[str]) -> Any:
+        from lxml import etree, html as lxml_html
+        if isinstance(html, str):
+            # lxml 不接受带编码声明的 str，统一按 UTF-8 字节解析
+            html = html.encode("utf-8", errors="replace")
+            parser = lxml_html.HTMLParser(encoding="utf-8", remove_comments=True, remove_pis=True)
+        else:
+            parser = lxml_html.HTMLParser(remove_comments=True, remove_pis=True)
+        root = etree.fromstring(html, parser)
+        if root is None:
+            return None
+        etree.strip_elements(root, *drop_tags, with_tail=False)
+        body = root.find("body")
+        return body if body is not None else root
+
+    @staticmethod
+    def paragraphs(root: Any) -> Iterable[Any]:
+        return root.iter("p", "pre")
+
+    @staticmethod
+    def parent(node: Any) -> Any:
+        return node.getparent()
+
+    @staticmethod
+    def key(node: Any) -> Any:
+        return node
+
+    @staticmethod
+    def tag(node: Any) -> str:
+        return node.tag if isinstance(node.tag, str) else ""
+
+    @staticmethod
+    def class_and_id(node: Any) -> str:
+        return f"{node.get('class') or ''} {node.get('id') or ''}"
+
+    @staticmethod
+    def text(node: Any) -> str:
+        return "".join(node.itertext())
+
+    @staticmethod
+    def lines(node: Any) -> str:
+        return "\n".join(node.itertext())
+
+    @staticmethod
+    def links(node: Any) -> Iterable[Any]:
+        return node.iter("a")
+
+
+class _SoupTree:
+    name = "bs4"
+
+    @staticmethod
+    def parse(html: Union[str, bytes], drop_tags: Sequence[str]) -> Any:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "lxml" if _HAS_LXML else "html.parser")
+        for element in soup(list(drop_tags)):
+            element.decompose()
+        return soup.body or soup
+
+    @staticmethod
+    def paragraphs(root: Any) -> Iterable[Any]:
+        return root.find_all(["p", "pre"])
+
+    @staticmethod
+    def parent(node: Any) -> Any:
+        return node.parent
+
+    @staticmethod
+    def key(node: Any) -> Any:
+        return id(node)
+
+    @staticmethod
+    def tag(node: Any) -> str:
+        return node.name or ""
+
+    @staticmethod
+    def class_and_id(node: Any) -> str:
+        classes = node.get("class") or []
+        return f"{' '.join(classes) if isinstance(classes, list) else classes} {node.get('id') or ''}"
+
+    @staticmethod
+    def text(node: Any) -> str:
+        return node.get_text()
+
+    @staticmethod
+    def lines(node: Any) -> str:
+        return node.get_text("\n")
+
+    @staticmethod
+    def links(node: Any) -> Iterable[Any]:
+        return node.find_all("a")
+
+
+_TREES = {tree.name: tree for tree in (_SelectolaxTree, _LxmlTree, _SoupTree)}
+
+
+def default_backend() -> str:
+    """当前环境下使用的解析后端：selectolax、lxml 或 bs4"""
+    return "selectolax" if _HAS_SELECTOLAX else "lxml" if _HAS_LXML else "bs4"
+
+
+def _normalize(text: str) -> str:
+    """每行内的连续空白合并为一个空格，去掉空行"""
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _node_weight(tree: Any, node: Any) -> float:
+    weight = _TAG_WEIGHTS.get(tree.tag(node), 0)
+    class_and_id = tree.class_and_id(node)
+    if class_and_id.strip():
+        if _NEGATIVE.search(class_and_id):
+            weight -= 25
+        if _POSITIVE.search(class_and_id):
+            weight += 25
+    return weight
+
+
+def _find_main(tree: Any, root: Any) -> Any:
+    """段落得分累加到父节点（祖父节点计一半），按链接密度折算后取得分最高的节点"""
+    candidates = {}
+    for paragraph in tree.paragraphs(root):
+        text = tree.text(paragraph).strip()
+        if len(text) < _MIN_PARAGRAPH_CHARS:
+            continue
+        score = 1 + text.count(",") + text.count("，") + min(len(text) // 100, 3)
+        node, share = tree.parent(paragraph), 1.0
+        for _ in range(2):
+            if node is None:
+                break
+            entry = candidates.get(tree.key(node))
+            if entry is None:
+                entry = candidates[tree.key(node)] = [node, _node_weight(tree, node)]
+            entry[1] += score * share
+            node, share = tree.parent(node), 0.5
+
+    best, best_score, best_length = None, 0.0, 0
+    for node, score in candidates.values():
+        length = len(tree.text(node))
+        if not length:
+            continue
+        link_length = sum(len(tree.text(link)) for link in tree.links(node))
+        score *= 1 - min(link_length / length, 1.0)
+        if score > best_score:
+            best, best_score, best_length = node, score, length
+    if best is None or best_length < _MIN_MAIN_CHARS:
+        return root
+    return best
+
+
+def _extract(html: Union[str, bytes], main_content: bool, drop_tags: Sequence[str], backend: str) -> str:
+    tree = _TREES[backend]
+    root = tree.parse(html, drop_tags)
+    if root is None:
+        return ""
+    node = _find_main(tree, root) if main_content else root
+    return _normalize(tree.lines(node))
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            # 调用方通常在线程中，使用 spawn 避免 fork 带锁的进程
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"Started HTML extraction process pool with {workers} workers")
+        return _process_pool
+
+
+def _reset_process_pool() -> None:
+    global _process_pool
+    with _pool_lock:
+        _process_pool = None
+
+
+def extract_text(html: Union[str, bytes], main_content: bool = False, drop_tags: Sequence[str] = DROP_TAGS,
+                 backend: Optional[str] = None) -> str:
+    """将 HTML 转为纯文本，每个文本块一行
+
+    按可用性依次使用 selectolax、lxml 解析，都未安装时退回 BeautifulSoup。main_content=True 时按段落
+    得分（文本长度、逗号数、链接密度、class/id 特征）选出正文所在的容器，只输出正文部分。
+
+    Args:
+        html: 页面 HTML，bytes 时由解析器按页面声明识别编码
+        main_content: 是否只提取正文区域，识别失败时返回全文
+        drop_tags: 连同内容一起去掉的标签
+        backend: 指定解析后端，默认按 default_backend() 选择
+
+    超过 HTML_EXTRACT_MAX_CHARS 的部分不解析；超过 HTML_EXTRACT_PROCESS_THRESHOLD 的文档交给进程池解析，
+    避免长时间占用 GIL。
+    """
+    if not html:
+        return ""
+    config = get_html_extract_config()
+    if len(html) > config["max_chars"]:
+        logger.debug(f"HTML truncated from {len(html)} to {config['max_chars']} before extraction")
+        html = html[:config["max_chars"]]
+    backend = backend or default_backend()
+    threshold = config["process_threshold"]
+    if threshold and len(html) >= threshold:
+        try:
+            return _get_process_pool(config["process_workers"]).submit(
+                _extract, html, main_content, tuple(drop_tags), backend).result()
+        except BrokenProcessPool as e:
+            _reset_process_pool()
+            logger.warning(f"HTML extraction process pool unavailable, extracting in-process: {e}")
+    return _extract(html, main_content, drop_tags, backend)
@@ -0,0 +1,143 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import importlib.util
+import weakref
+from http.cookiejar import DefaultCookiePolicy
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.common.logger_util import logger
+from app.cosight.tool.async_runtime import async_runtime
+from config.config import get_http_client_config
+
+# 安装了 brotli 时 aiohttp 与 urllib3 均可解码 br 压缩
+_BROTLI_AVAILABLE = importlib.util.find_spec("brotli") is not None or importlib.util.find_spec("brotlicffi") is not None
+ACCEPT_ENCODING = "gzip, deflate, br" if _BROTLI_AVAILABLE else "gzip, deflate"
+
+# 结构: {event_loop: aiohttp.ClientSession}
+# aiohttp 会话绑定创建它的事件循环，按事件循环分别维护，事件循环销毁后自动释放
+_aiohttp_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+_requests_session: Optional[requests.Session] = None
+_session_lock = Lock()
+
+
+def http_timeout() -> Tuple[float, float]:
+    """requests 使用的 (连接超时, 读取超时)"""
+    config = get_http_client_config()
+    return config["connect_timeout"], config["read_timeout"]
+
+
+def get_aiohttp_session() -> aiohttp.ClientSession:
+    """获取当前事件循环下共享的 aiohttp 会话（连接池、按主机限流、DNS缓存、长连接）
+
+    会话由本模块统一管理，调用方不要关闭它。
+    """
+    loop = asyncio.get_running_loop()
+    with _session_lock:
+        session = _aiohttp_sessions.get(loop)
+        if session is None or session.closed:
+            config = get_http_client_config()
+            connector = aiohttp.TCPConnector(
+                limit=config["pool_limit"],
+                limit_per_host=config["pool_limit_per_host"],
+                ttl_dns_cache=config["dns_cache_ttl"],
+                keepalive_timeout=config["keepalive_timeout"]
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=config["total_timeout"],
+                    connect=config["connect_timeout"],
+                    sock_read=config["read_timeout"]
+                ),
+                headers={"Accept-Encoding": ACCEPT_ENCODING},
+                # 不同工具、不同任务之间不共享 cookie
+                cookie_jar=aiohttp.DummyCookieJar()
+            )
+            _aiohttp_sessions[loop] = session
+            if async_runtime.in_runtime_thread():
+                async_runtime.add_shutdown_hook(session.close)
+            logger.info(f"Created pooled aiohttp session, brotli: {_BROTLI_AVAILABLE}")
+        return session
+
+
+def get_requests_session() -> requests.Session:
+    """获取进程共享的 requests 会话（线程安全地复用连接池），请求时需显式传入 timeout"""
+    global _requests_session
+    if _requests_session is not None:
+        return _requests_session
+    with _session_lock:
+        if _requests_session is None:
+            config = get_http_client_config()
+            session = requests.Session()
+            # pool_connections 为缓存的主机连接池个数，pool_maxsize 为每个主机保持的连接数
+            adapter = HTTPAdapter(pool_connections=config["pool_limit"], pool_maxsize=config["pool_limit_per_host"])
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            # 不同工具、不同任务之间不共享 cookie
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _requests_session = session
+            logger.info(f"Created pooled requests session, brotli: {_BROTLI_AVAILABLE}")
+        return _requests_session
+
+
+def _aiohttp_stats(session: aiohttp.ClientSession) -> Dict[str, Any]:
+    connector = session.connector
+    if connector is None:
+        return {"closed": True}
+    idle = sum(len(connections) for connections in getattr(connector, "_conns", {}).values())
+    return {
+        "closed": session.closed,
+        "limit": connector.limit,
+        "limit_per_host": connector.limit_per_host,
+        "in_use": len(getattr(connector, "_acquired", ())),
+        "idle": idle
+    }
+
+
+def _requests_stats(session: requests.Session) -> Dict[str, Any]:
+    hosts = {}
+    for prefix in ("https://", "http://"):
+        pool_manager = getattr(session.get_adapter(prefix), "poolmanager", None)
+        if pool_manager is None:
+            continue
+        for key in list(pool_manager.pools.keys()):
+            pool = pool_manager.pools.get(key)
+            if pool is None:
+                continue
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_created": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle": pool.pool.qsize() if pool.pool is not None else 0
+            }
+    return {"hosts": len(hosts), "pools": hosts}
+
+
+def get_http_pool_stats() -> Dict[str, Any]:
+    """连接池使用情况：aiohttp 各事件循环的在用/空闲连接数，requests 各主机的连接与请求数"""
+    with _session_lock:
+        aiohttp_sessions = list(_aiohttp_sessions.values())
+        requests_session = _requests_session
+    return {
+        "aiohttp": [_aiohttp_stats(session) for session in aiohttp_sessions],
+        "requests": _requests_stats(requests_session) if requests_session is not None else None
+    }
@@ -17,10 +17,13 @@ import asyncio
 import os
 import re
 from typing import Any, Optional, Type
-import requests
 from bs4 import BeautifulSoup
 
 from app.common.logger_util import logger
+from app.cosight.tool.async_runtime import run_coro
+from app.cosight.tool.html_extract import extract_text
+from app.cosight.tool.http_client import http_timeout
+from app.cosight.tool.web_page_cache import WebPage, fetch_page, page_text
 
 
 class ScrapeWebsiteTool:
@@ -59,22 +62,21 @@ class ScrapeWebsiteTool:
             self,
             website_url: str,
     ) -> Any:
-        page = requests.get(
+        # 抓取与解析都是阻塞调用，放到线程中执行，避免阻塞共享的事件循环
+        page = await asyncio.to_thread(
+            fetch_page,
             website_url,
-            timeout=15,
+            timeout=http_timeout(),
             verify=False,
             headers=self.headers,
-            cookies=self.cookies if self.cookies else {},
+            cookies=self.cookies,
             proxies=self.proxies
         )
+        return await asyncio.to_thread(page_text, page, "full_text", _extract_page_text)
 
-        page.encoding = page.apparent_encoding
-        parsed = BeautifulSoup(page.text, "html.parser")
 
-        text = parsed.get_text(" ")
-        text = re.sub("[ \t]+", " ", text)
-        text = re.sub("\\s+\n\\s+", "\n", text)
-        return text
+def _extract_page_text(page: WebPage) -> str:
+    return extract_text(page.text)
 
 
 def fetch_website_content(website_url):
@@ -83,16 +85,7 @@ def fetch_website_content(website_url):
             return f'current url is valid {website_url}'
         scrapeWebsiteTool = ScrapeWebsiteTool(website_url)
         logger.info(f'starting fetch {website_url} Content')
-        # 检查是否在事件循环中
-        try:
-            loop = asyncio.get_running_loop()
-            # 如果已经在事件循环中，创建新任务
-            task = loop.create_task(scrapeWebsiteTool._run(website_url))
-            return loop.run_until_complete(task)
-        except RuntimeError:
-            # 如果没有事件循环，创建新的
-            loop = asyncio.new_event_loop()
-            return loop.run_until_complete(scrapeWebsiteTool._run(website_url))
+        return run_coro(scrapeWebsiteTool._run(website_url))
     except Exception as e:
         logger.error(f"fetch_website_content error {str(e)}", exc_info=True)
         # 确保返回的是字符串而不是协程
@@ -100,7 +93,6 @@ def fetch_website_content(website_url):
 
 
 from urllib.parse import urlparse, urljoin
-import requests
 import json
 
 
@@ -154,22 +146,19 @@ def fetch_website_content_with_images(website_url):
         logger.info(f'Starting fetch {website_url} content with images')
         
         # 获取网页HTML内容
-        page = requests.get(
+        page = fetch_page(
             website_url,
-            timeout=15,
+            timeout=http_timeout(),
             verify=False,
             headers=scrapeWebsiteTool.headers,
-            cookies=scrapeWebsiteTool.cookies if scrapeWebsiteTool.cookies else {},
+            cookies=scrapeWebsiteTool.cookies,
             proxies=scrapeWebsiteTool.proxies
         )
         
-        page.encoding = page.apparent_encoding
         parsed = BeautifulSoup(page.text, "html.parser")
         
-        # 获取文本内容（保持原有功能）
-        text = parsed.get_text(" ")
-        text = re.sub("[ \t]+", " ", text)
-        text = re.sub("\\s+\n\\s+", "\n", text)
+        # 获取文本内容（与 fetch_website_content 共用提取结果）
+        text = page_text(page, "full_text", _extract_page_text)
         
         # 提取图片信息
         images = []
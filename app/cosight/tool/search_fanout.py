@@ -0,0 +1,83 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+from app.common.logger_util import logger
+from config.config import get_search_fetch_config
+
+# 未在期限内抓取完成的页面在搜索结果中的占位内容
+TIMED_OUT_CONTENT = "Content not fetched in time, refer to the description or fetch this url again later"
+
+# 提前返回后仍在后台抓取的任务，持有引用避免被回收；抓取结果会写入共享网页缓存
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _on_background_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.debug(f"Background page fetch finished with error: {task.exception()}")
+
+
+async def fetch_all(urls: Sequence[str], fetch: Callable[[str], Awaitable[str]],
+                    config: Optional[Dict[str, Any]] = None) -> List[Optional[str]]:
+    """并发抓取搜索结果页面，返回与 urls 一一对应的内容，未在期限内完成的为 None
+
+    - 同时抓取的页面数受信号量限制，单个页面超过 url_timeout 即放弃
+    - 完成数达到 quorum 后最多再等待 quorum_grace 秒，整体最多等待 deadline 秒
+    - 提前返回时未完成的页面继续在后台抓取（仍受 url_timeout 限制），结果进入网页缓存供后续使用
+    """
+    if not urls:
+        return []
+    config = config or get_search_fetch_config()
+    semaphore = asyncio.Semaphore(config["concurrency"])
+
+    async def fetch_one(url: str) -> str:
+        async with semaphore:
+            return await asyncio.wait_for(fetch(url), config["url_timeout"])
+
+    loop = asyncio.get_running_loop()
+    tasks = [asyncio.create_task(fetch_one(url)) for url in urls]
+    quorum = min(config["quorum"] or len(tasks), len(tasks))
+    deadline = loop.time() + config["deadline"]
+    quorum_reached = False
+    pending = set(tasks)
+    while pending:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        _, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if not quorum_reached and len(tasks) - len(pending) >= quorum:
+            quorum_reached = True
+            deadline = min(deadline, loop.time() + config["quorum_grace"])
+
+    contents: List[Optional[str]] = []
+    for task in tasks:
+        if not task.done():
+            _background_tasks.add(task)
+            task.add_done_callback(_on_background_done)
+            contents.append(None)
+        elif isinstance(task.exception(), asyncio.TimeoutError):
+            contents.append(None)
+        elif task.exception() is not None:
+            contents.append(f"Error fetching content: {task.exception()}")
+        else:
+            contents.append(task.result())
+    timed_out = [url for url, content in zip(urls, contents) if content is None]
+    if timed_out:
+        logger.info(f"Returned {len(urls) - len(timed_out)}/{len(urls)} pages, timed out: {timed_out}")
+    return contents
+
@@ -16,15 +16,17 @@
 from baidusearch.baidusearch import search
 from requests.exceptions import RequestException
 from typing import List, Dict, Any
-from bs4 import BeautifulSoup
 import random
 import asyncio
-import aiohttp
 import os
 import ssl
 import urllib3
 import requests
 from app.common.logger_util import logger
+from app.cosight.tool.async_runtime import run_coro
+from app.cosight.tool.html_extract import BOILERPLATE_TAGS, DROP_TAGS, extract_text
+from app.cosight.tool.search_fanout import TIMED_OUT_CONTENT, fetch_all
+from app.cosight.tool.web_page_cache import WebPage, afetch_page, page_text
 from .scrape_website_toolkit import is_valid_url
 
 # 禁用SSL警告
@@ -164,6 +166,11 @@ def search_baidu_with_ssl_fix(query: str, num_results: int = 10) -> List[Dict[st
         return []
 
 
+def _extract_page_text(page: WebPage) -> str:
+    # 搜索结果只需要正文部分，去掉导航、页脚等页面框架
+    return extract_text(page.text, main_content=True, drop_tags=DROP_TAGS + BOILERPLATE_TAGS)
+
+
 async def fetch_url_content(url: str) -> str:
     """Fetch and parse content from a given URL"""
     try:
@@ -180,32 +187,13 @@ async def fetch_url_content(url: str) -> str:
         proxy = os.environ.get("PROXY")
         if not is_valid_url(url):
             return f'current url is valid {url}'
-        timeout = aiohttp.ClientTimeout(total=180)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url, headers=headers, proxy=proxy) as response:
-                if response.status == 200:
-                    # Check content type
-                    content_type = response.headers.get('Content-Type', '')
-                    if 'text/html' not in content_type:
-                        return f"Non-HTML content: {content_type}"
-
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-
-                    # Remove unwanted elements
-                    for element in soup(["script", "style", "nav", "footer", "iframe", "noscript"]):
-                        element.decompose()
-
-                    # Get clean text
-                    text = soup.get_text(separator='\n')
-                    # Clean up extra whitespace
-                    lines = (line.strip() for line in text.splitlines())
-                    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                    text = '\n'.join(chunk for chunk in chunks if chunk)
-
-                    return text
-                else:
-                    return f"HTTP Error: {response.status}"
+        # 经共享网页缓存抓取：新鲜的缓存直接返回，过期的以条件请求重新验证
+        page = await afetch_page(url, headers=headers, proxy=proxy, content_types=("text/html",))
+        if page.status != 200:
+            return f"HTTP Error: {page.status}"
+        if 'text/html' not in page.content_type:
+            return f"Non-HTML content: {page.content_type}"
+        return await asyncio.to_thread(page_text, page, "main_text", _extract_page_text)
     except asyncio.TimeoutError as e:
         logger.error(f"Request timed out: {str(e)}", exc_info=True)
         return "Request timed out"
@@ -235,41 +223,36 @@ def search_baidu(
     responses: List[Dict[str, Any]] = []
     max_retries = 3
 
+    results = None
+    # 只重试搜索本身，页面抓取只做一次
     for attempt in range(max_retries):
         try:
             # 使用SSL修复版本的搜索函数
             results = search_baidu_with_ssl_fix(query, max_results)
-            # Limit results to max_results
-            results = results
-
-            # Create a new event loop for the current thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-            async def process_results():
-                tasks = []
-                for i, result in enumerate(results, start=1):
-                    url = result.get("url", "")
-                    tasks.append((i, result, fetch_url_content(url)))
-                # Run all fetch operations concurrently
-                fetch_results = await asyncio.gather(*[task[2] for task in tasks])
-                for idx, (i, result, _) in enumerate(tasks):
-                    response = {
-                        "result_id": i,
-                        "title": result.get("title", ""),
-                        "description": result.get("abstract", ""),
-                        "url": result.get("url", ""),
-                        "content": fetch_results[idx]  # Add scraped content
-                    }
-                    responses.append(response)
-
-            loop.run_until_complete(process_results())
-            loop.close()
-            break  # Success, exit retry loop
+            break
         except Exception as e:
             logger.error(f'raise error: {str(e)}', exc_info=True)
             if attempt == max_retries - 1:  # Last attempt failed
                 responses.append({"error": f"Baidu search failed after {max_retries} attempts: {e}"})
-            continue
+                return responses
+
+    urls = [result.get("url", "") for result in results]
+    try:
+        # 在共享的后台事件循环中限流并发抓取，达到完成数或期限即返回
+        contents = run_coro(fetch_all(urls, fetch_url_content))
+    except Exception as e:
+        logger.error(f'fetch search results error: {str(e)}', exc_info=True)
+        contents = [f"Error fetching content: {str(e)}"] * len(urls)
+    for i, (result, content) in enumerate(zip(results, contents), start=1):
+        response = {
+            "result_id": i,
+            "title": result.get("title", ""),
+            "description": result.get("abstract", ""),
+            "url": result.get("url", ""),
+            "content": content if content is not None else TIMED_OUT_CONTENT  # Add scraped content
+        }
+        if content is None:
+            response["timed_out"] = True
+        responses.append(response)
     logger.info(f"search baidu for response: {responses}")
     return responses
@@ -18,8 +18,14 @@ import json
 import time
 import os
 import requests
-from typing import Any, Dict, Optional, List
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, Optional, List, Tuple
+from urllib.parse import urlparse
 from app.common.logger_util import logger
+from app.cosight.tool.http_client import get_requests_session
+from config.config import get_iframe_check_config
 
 
 
@@ -30,6 +36,12 @@ class ToolResultProcessor:
     # 可配置的域名过滤列表（通过环境变量 IFRAME_BLOCKED_DOMAINS 设置，逗号分隔）
     # 例如: export IFRAME_BLOCKED_DOMAINS="ainvest.com,example.com"
     _cached_blocked_domains = None
+    # 按域名缓存的可嵌入性结论，结构: {域名: (是否可嵌入, 过期时间)}
+    _embeddable_cache: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+    _embeddable_lock = Lock()
+    _embeddable_executor: Optional[ThreadPoolExecutor] = None
+    # 每个搜索结果最多检查的URL数，其余默认认为可以嵌入
+    _MAX_EMBEDDABLE_CHECK = 10
     
     @staticmethod
     def _get_blocked_domains() -> list:
@@ -144,10 +156,43 @@ class ToolResultProcessor:
             # 如果检测失败，默认返回中文
             return chinese_summary
     
+    @staticmethod
+    def _embeddable_cache_key(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    @staticmethod
+    def get_cached_embeddable(url: str) -> Optional[bool]:
+        """
+        不发请求，只根据黑名单与域名缓存判断URL的可嵌入性
+        
+        Returns:
+            Optional[bool]: 已知时返回结论，未知返回None
+        """
+        if ToolResultProcessor._is_domain_blocked(url):
+            return False
+        key = ToolResultProcessor._embeddable_cache_key(url)
+        with ToolResultProcessor._embeddable_lock:
+            entry = ToolResultProcessor._embeddable_cache.get(key)
+            if entry is None:
+                return None
+            embeddable, expires_at = entry
+            if expires_at < time.monotonic():
+                del ToolResultProcessor._embeddable_cache[key]
+                return None
+            return embeddable
+
+    @staticmethod
+    def _get_embeddable_executor() -> ThreadPoolExecutor:
+        with ToolResultProcessor._embeddable_lock:
+            if ToolResultProcessor._embeddable_executor is None:
+                ToolResultProcessor._embeddable_executor = ThreadPoolExecutor(
+                    max_workers=get_iframe_check_config()["concurrency"], thread_name_prefix="iframe-check")
+            return ToolResultProcessor._embeddable_executor
+
     @staticmethod
     def batch_check_embeddable(urls: List[str], max_check: int = 10) -> Dict[str, bool]:
         """
-        批量检查多个URL的iframe可嵌入性
+        批量检查多个URL的iframe可嵌入性（并发执行，阻塞等待全部完成）
         
         Args:
             urls: 要检查的URL列表
@@ -156,41 +201,93 @@ class ToolResultProcessor:
         Returns:
             Dict[str, bool]: URL到可嵌入性的映射
         """
-        results = {}
-        urls_to_check = urls[:max_check]
-        
-        for url in urls_to_check:
-            results[url] = ToolResultProcessor.check_embeddable(url)
+        executor = ToolResultProcessor._get_embeddable_executor()
+        futures = {url: executor.submit(ToolResultProcessor.check_embeddable, url) for url in urls[:max_check]}
+        results = {url: future.result() for url, future in futures.items()}
         
         # 对于未检查的URL，默认认为可以嵌入
         for url in urls[max_check:]:
             results[url] = True
             
         return results
-    
+
+    @staticmethod
+    def check_embeddable_async(urls: List[str], callback: Callable[[Dict[str, bool]], None]) -> None:
+        """
+        在后台并发检查多个URL的可嵌入性，全部完成后以 {url: 是否可嵌入} 调用 callback（在检查线程中执行）
+        """
+        if not urls:
+            callback({})
+            return
+        executor = ToolResultProcessor._get_embeddable_executor()
+        results: Dict[str, bool] = {}
+        lock = Lock()
+
+        def on_done(url: str, future: Future):
+            try:
+                embeddable = future.result()
+            except Exception as e:
+                logger.warning(f"URL {url} 可嵌入性检查失败: {e}")
+                embeddable = True
+            with lock:
+                results[url] = embeddable
+                finished = len(results) == len(urls)
+            if finished:
+                try:
+                    callback(dict(results))
+                except Exception as e:
+                    logger.error(f"可嵌入性检查回调失败: {e}", exc_info=True)
+
+        for url in urls:
+            executor.submit(ToolResultProcessor.check_embeddable, url).add_done_callback(
+                lambda future, url=url: on_done(url, future))
+
     @staticmethod
     def check_embeddable(url: str) -> bool:
+        """
+        检查给定URL是否可以在电脑区正常打开和嵌入
+        先检查配置的黑名单（环境变量 IFRAME_BLOCKED_DOMAINS）与域名缓存，未命中时发送HTTP请求检测
+        
+        Args:
+            url: 要检查的URL
+            
+        Returns:
+            bool: 如果可以正常打开并嵌入返回True，否则返回False
+        """
+        cached = ToolResultProcessor.get_cached_embeddable(url)
+        if cached is not None:
+            return cached
+        embeddable, domain_wide = ToolResultProcessor._probe_embeddable(url)
+        if domain_wide:
+            config = get_iframe_check_config()
+            with ToolResultProcessor._embeddable_lock:
+                cache = ToolResultProcessor._embeddable_cache
+                cache[ToolResultProcessor._embeddable_cache_key(url)] = (embeddable, time.monotonic() + config["cache_ttl"])
+                while len(cache) > config["cache_size"]:
+                    cache.popitem(last=False)
+        return embeddable
+    
+    @staticmethod
+    def _probe_embeddable(url: str) -> Tuple[bool, bool]:
         """
         检查给定URL是否可以在电脑区正常打开和嵌入
         通过实际HTTP请求检测URL的可访问性和iframe嵌入能力
         
         检测策略：
-        1. 检查域名是否在配置的黑名单中（可选，通过环境变量配置）
-        2. 发送HTTP请求检查可访问性
-        3. 分析HTTP响应头（X-Frame-Options, CSP等）
-        4. 检测内容类型和大小
-        5. 对于HTML页面，尝试检测JavaScript反iframe模式
+        1. 发送HTTP请求检查可访问性
+        2. 分析HTTP响应头（X-Frame-Options, CSP等）
+        3. 检测内容类型和大小
+        4. 对于HTML页面，尝试检测JavaScript反iframe模式
         
         Args:
             url: 要检查的URL
             
         Returns:
-            bool: 如果可以正常打开并嵌入返回True，否则返回False
+            Tuple[bool, bool]: (是否可以正常打开并嵌入, 结论是否适用于整个域名)
+            X-Frame-Options、CSP 与反iframe脚本通常是站点级配置，这类结论按域名缓存；
+            状态码、内容类型与网络错误只针对当前URL，不缓存
         """
-        # 1. 检查域名是否在配置的黑名单中（可通过环境变量 IFRAME_BLOCKED_DOMAINS 配置）
-        if ToolResultProcessor._is_domain_blocked(url):
-            return False
-        
+        timeout = get_iframe_check_config()["timeout"]
         try:
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -213,29 +310,29 @@ class ToolResultProcessor:
             response = None
             # 先尝试HEAD请求，如果失败再尝试GET请求（只获取少量数据）
             try:
-                # 发送HEAD请求检查URL的可访问性和HTTP头，缩短超时时间到8秒
-                response = requests.head(url, headers=headers, timeout=8, allow_redirects=True, 
+                # 发送HEAD请求检查URL的可访问性和HTTP头，超时时间可配置
+                response = get_requests_session().head(url, headers=headers, timeout=timeout, allow_redirects=True, 
                                        verify=False, proxies=proxies)
             except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
                 logger.info(f"URL {url} HEAD请求失败 ({type(e).__name__})，尝试GET请求")
                 # HEAD请求失败，尝试GET请求（只获取前1KB数据）
                 try:
-                    response = requests.get(url, headers=headers, timeout=8, allow_redirects=True, 
+                    response = get_requests_session().get(url, headers=headers, timeout=timeout, allow_redirects=True, 
                                           verify=False, proxies=proxies, stream=True)
                     # 只读取少量数据
                     response.raw.read(1024, decode_content=True)
                 except Exception as get_error:
                     logger.warning(f"URL {url} GET请求也失败: {get_error}")
-                    return False
+                    return False, False
             
             if response is None:
                 logger.warning(f"URL {url} 无法获取响应")
-                return False
+                return False, False
             
             # 检查HTTP状态码
             if response.status_code >= 400:
                 logger.info(f"URL {url} 返回错误状态码 {response.status_code}，无法访问")
-                return False
+                return False, False
             
             # 头信息不区分大小写，所以将键转换为小写
             response_headers = {k.lower(): v for k, v in response.headers.items()}
@@ -245,33 +342,33 @@ class ToolResultProcessor:
             if content_type:
                 if 'application/pdf' in content_type:
                     logger.info(f"URL {url} 是PDF文件，不适合iframe嵌入")
-                    return False
+                    return False, False
                 if 'application/' in content_type and 'text/html' not in content_type:
                     logger.info(f"URL {url} 的Content-Type不是HTML: {content_type}，不适合iframe嵌入")
-                    return False
+                    return False, False
                 if 'image/' in content_type:
                     logger.info(f"URL {url} 是图片文件，不适合iframe嵌入")
-                    return False
+                    return False, False
             
             # 2. 检查 X-Frame-Options 头 - 明确禁止嵌入
             x_frame_options = response_headers.get('x-frame-options', '').lower()
             if x_frame_options in ('deny', 'sameorigin'):
                 logger.info(f"URL {url} 设置了 X-Frame-Options: {x_frame_options}，禁止iframe嵌入")
-                return False
+                return False, True
             
             # 3. 检查 Content-Security-Policy 头中的 frame-ancestors
             csp = response_headers.get('content-security-policy', '').lower()
             if 'frame-ancestors' in csp:
                 if "'none'" in csp:
                     logger.info(f"URL {url} 设置了 CSP frame-ancestors: none，禁止iframe嵌入")
-                    return False
+                    return False, True
                 if "'self'" in csp:
                     logger.info(f"URL {url} 设置了 CSP frame-ancestors: self，禁止iframe嵌入")
-                    return False
+                    return False, True
                 # 如果没有通配符，也认为不允许跨域嵌入
                 if '*' not in csp:
                     logger.info(f"URL {url} 的 CSP frame-ancestors 不包含通配符，禁止iframe嵌入")
-                    return False
+                    return False, True
             
             # 4. 检查响应大小 - 过大的内容不适合iframe
             content_length = response_headers.get('content-length')
@@ -280,7 +377,7 @@ class ToolResultProcessor:
                     size_mb = int(content_length) / (1024 * 1024)
                     if size_mb > 50:  # 超过50MB认为过大
                         logger.info(f"URL {url} 内容过大 ({size_mb:.1f}MB)，不适合iframe嵌入")
-                        return False
+                        return False, False
                 except (ValueError, TypeError):
                     pass
             
@@ -291,7 +388,7 @@ class ToolResultProcessor:
                 try:
                     # 如果之前是HEAD请求，需要重新发送GET请求获取内容
                     if response.request.method == 'HEAD':
-                        get_response = requests.get(url, headers=headers, timeout=8, allow_redirects=True,
+                        get_response = get_requests_session().get(url, headers=headers, timeout=timeout, allow_redirects=True,
                                                    verify=False, proxies=proxies, stream=True)
                         # 只读取前5KB内容用于检测
                         html_content = get_response.raw.read(5120, decode_content=True).decode('utf-8', errors='ignore')
@@ -333,7 +430,7 @@ class ToolResultProcessor:
                                 break
                         
                         if anti_iframe_detected:
-                            return False
+                            return False, True
                             
                 except Exception as e:
                     # 内容检测失败不影响结果，使用保守策略
@@ -341,29 +438,29 @@ class ToolResultProcessor:
                     pass
                 
                 logger.info(f"URL {url} 是可访问的HTML页面，允许iframe嵌入")
-                return True
+                return True, True
             else:
                 logger.info(f"URL {url} 不是HTML页面 (Content-Type: {content_type})，不适合iframe嵌入")
-                return False
+                return False, False
                 
         except requests.exceptions.Timeout:
             logger.warning(f"URL {url} 请求超时，无法访问")
-            return False
+            return False, False
         except requests.exceptions.ConnectionError as e:
             logger.warning(f"URL {url} 连接失败，无法访问: {e}")
-            return False
+            return False, False
         except requests.exceptions.TooManyRedirects:
             logger.warning(f"URL {url} 重定向次数过多，无法访问")
-            return False
+            return False, False
         except requests.exceptions.SSLError as e:
             logger.warning(f"URL {url} SSL错误，无法访问: {e}")
-            return False
+            return False, False
         except requests.exceptions.RequestException as e:
             logger.warning(f"URL {url} 请求失败: {e}")
-            return False
+            return False, False
         except Exception as e:
             logger.error(f"检查URL '{url}' 嵌入状态时发生意外错误: {e}")
-            return False
+            return False, False
     
     @staticmethod
     def _generate_search_results_page_url(tool_name: str, tool_args: str, search_results: list = None) -> str:
@@ -488,7 +585,8 @@ class ToolResultProcessor:
             return path_value
 
     @staticmethod
-    def process_tool_result(tool_name: str, tool_args: str, tool_result: str, task_title: str = "") -> Dict[str, Any]:
+    def process_tool_result(tool_name: str, tool_args: str, tool_result: str, task_title: str = "",
+                            defer_embeddable_check: bool = False) -> Dict[str, Any]:
         """
         根据工具类型处理结果
         
@@ -497,6 +595,8 @@ class ToolResultProcessor:
             tool_args: 工具参数
             tool_result: 工具原始结果
             task_title: 任务标题，用于语言检测
+            defer_embeddable_check: 搜索结果中可嵌入性未知的URL是否暂不检查，先按可嵌入处理并记录在
+                embeddable_pending 中，之后由 resolve_pending_embeddable 在后台检查
             
         Returns:
             处理后的结果字典
@@ -504,7 +604,8 @@ class ToolResultProcessor:
         try:
             # 根据工具名称精确匹配选择处理方式
             if tool_name in ['search_baidu', 'search_google', 'search_wiki', 'tavily_search', 'image_search']:
-                return ToolResultProcessor._process_search_result(tool_name, tool_args, tool_result, task_title)
+                return ToolResultProcessor._process_search_result(tool_name, tool_args, tool_result, task_title,
+                                                                  defer_embeddable_check)
             elif tool_name == 'execute_code':
                 return ToolResultProcessor._process_code_result(tool_name, tool_args, tool_result, task_title)
             elif tool_name in ['file_saver', 'file_read', 'file_str_replace', 'file_find_in_content','create_html_report']:
@@ -522,7 +623,8 @@ class ToolResultProcessor:
             return ToolResultProcessor._process_default_result(tool_name, tool_args, tool_result)
     
     @staticmethod
-    def _process_search_result(tool_name: str, tool_args: str, tool_result: str, task_title: str = "") -> Dict[str, Any]:
+    def _process_search_result(tool_name: str, tool_args: str, tool_result: str, task_title: str = "",
+                               defer_embeddable_check: bool = False) -> Dict[str, Any]:
         """处理搜索结果"""
         try:
             # 首先尝试解析为JSON（适用于tavily等结构化结果）
@@ -593,53 +695,38 @@ class ToolResultProcessor:
             # 限制URL数量，避免过多
             unique_urls = unique_urls[:20]
             
-            # 批量检查URL的iframe可嵌入性（限制检查数量以提高性能）
-            try:
-                embeddable_results = ToolResultProcessor.batch_check_embeddable(unique_urls, max_check=10)
-                
-                embeddable_urls = []
-                non_embeddable_urls = []
-                
-                for url, is_embeddable in embeddable_results.items():
-                    if is_embeddable:
-                        embeddable_urls.append(url)
-                    else:
-                        non_embeddable_urls.append(url)
-                        
-            except Exception as e:
-                logger.error(f"批量检查URL iframe可嵌入性时出错: {e}")
-                # 如果批量检查失败，所有URL默认认为可以嵌入
-                embeddable_urls = unique_urls.copy()
-                non_embeddable_urls = []
-            
             # 如果之前没有找到result_id，使用去重后的URL数量
             if result_count == 0:
                 result_count = len(unique_urls)
             
-            # 确定first_url
-            first_url = None
-            if embeddable_urls:
-                first_url = embeddable_urls[0]
-            else:
-                # 如果embeddable_urls为空，生成可嵌入的搜索结果展示页面URL
-                first_url = ToolResultProcessor._generate_search_results_page_url(tool_name, tool_args, unique_urls)
-            
-            return {
+            result = {
                 "tool_type": "search",
-                "summary": ToolResultProcessor._get_localized_summary(
-                    f"搜索完成，找到 {result_count} 个结果，其中 {len(embeddable_urls)} 个可在电脑区浏览",
-                    f"Search completed, found {result_count} results, {len(embeddable_urls)} can be browsed in desktop area",
-                    task_title
-                ),
-                "first_url": first_url,
                 "urls": unique_urls,  # 所有URL列表
-                "embeddable_urls": embeddable_urls,  # 可嵌入iframe的URL列表
-                "non_embeddable_urls": non_embeddable_urls,  # 不可嵌入iframe的URL列表
                 "result_count": result_count,
-                "embeddable_count": len(embeddable_urls),
-                "non_embeddable_count": len(non_embeddable_urls),
                 "has_content": "Error fetching content" not in str(tool_result)
             }
+            
+            # 检查URL的iframe可嵌入性（限制检查数量以提高性能）
+            urls_to_check = unique_urls[:ToolResultProcessor._MAX_EMBEDDABLE_CHECK]
+            try:
+                if defer_embeddable_check:
+                    # 先使用黑名单与域名缓存中的结论，未知的URL暂按可嵌入处理
+                    embeddable_results = {url: ToolResultProcessor.get_cached_embeddable(url) for url in unique_urls}
+                    pending = [url for url in urls_to_check if embeddable_results[url] is None]
+                    embeddable_results = {url: is_embeddable is not False
+                                          for url, is_embeddable in embeddable_results.items()}
+                    if pending:
+                        result["embeddable_pending"] = pending
+                else:
+                    embeddable_results = ToolResultProcessor.batch_check_embeddable(
+                        unique_urls, max_check=ToolResultProcessor._MAX_EMBEDDABLE_CHECK)
+            except Exception as e:
+                logger.error(f"批量检查URL iframe可嵌入性时出错: {e}")
+                # 如果批量检查失败，所有URL默认认为可以嵌入
+                embeddable_results = {url: True for url in unique_urls}
+            
+            ToolResultProcessor._apply_embeddable(result, tool_name, tool_args, embeddable_results, task_title)
+            return result
         except Exception as e:
             logger.error(f"Error processing search result: {e}")
             return {
@@ -652,6 +739,57 @@ class ToolResultProcessor:
                 "error": str(e)
             }
     
+    @staticmethod
+    def _apply_embeddable(result: Dict[str, Any], tool_name: str, tool_args: str,
+                          embeddable_results: Dict[str, bool], task_title: str = "") -> None:
+        """根据可嵌入性结论填充搜索结果中的 embeddable_urls、first_url 与摘要"""
+        embeddable_urls = [url for url in result["urls"] if embeddable_results.get(url, True)]
+        non_embeddable_urls = [url for url in result["urls"] if not embeddable_results.get(url, True)]
+        
+        # 确定first_url
+        if embeddable_urls:
+            first_url = embeddable_urls[0]
+        else:
+            # 如果embeddable_urls为空，生成可嵌入的搜索结果展示页面URL
+            first_url = ToolResultProcessor._generate_search_results_page_url(tool_name, tool_args, result["urls"])
+        
+        result.update({
+            "summary": ToolResultProcessor._get_localized_summary(
+                f"搜索完成，找到 {result['result_count']} 个结果，其中 {len(embeddable_urls)} 个可在电脑区浏览",
+                f"Search completed, found {result['result_count']} results, {len(embeddable_urls)} can be browsed in desktop area",
+                task_title
+            ),
+            "first_url": first_url,
+            "embeddable_urls": embeddable_urls,  # 可嵌入iframe的URL列表
+            "non_embeddable_urls": non_embeddable_urls,  # 不可嵌入iframe的URL列表
+            "embeddable_count": len(embeddable_urls),
+            "non_embeddable_count": len(non_embeddable_urls)
+        })
+
+    @staticmethod
+    def resolve_pending_embeddable(tool_name: str, tool_args: str, processed_result: Dict[str, Any],
+                                   callback: Callable[[Dict[str, Any]], None], task_title: str = "") -> bool:
+        """
+        在后台检查 process_tool_result(defer_embeddable_check=True) 留下的未知URL，
+        完成后以更新后的处理结果（新的字典）调用 callback
+        
+        Returns:
+            bool: 是否有需要检查的URL
+        """
+        pending = processed_result.get("embeddable_pending") if isinstance(processed_result, dict) else None
+        if not pending:
+            return False
+        known = dict.fromkeys(processed_result.get("embeddable_urls", []), True)
+        known.update(dict.fromkeys(processed_result.get("non_embeddable_urls", []), False))
+
+        def on_checked(checked: Dict[str, bool]):
+            updated = {key: value for key, value in processed_result.items() if key != "embeddable_pending"}
+            ToolResultProcessor._apply_embeddable(updated, tool_name, tool_args, {**known, **checked}, task_title)
+            callback(updated)
+
+        ToolResultProcessor.check_embeddable_async(pending, on_checked)
+        return True
+    
     @staticmethod
     def _process_code_result(tool_name: str, tool_args: str, tool_result: str, task_title: str = "") -> Dict[str, Any]:
         """处理代码执行结果"""
@@ -0,0 +1,379 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from charset_normalizer import from_bytes
+
+from app.common.logger_util import logger
+from app.cosight.tool.http_client import get_aiohttp_session, get_requests_session, http_timeout
+from config.config import get_web_cache_config
+
+# 每写入多少次检查一次缓存容量
+_PRUNE_EVERY_WRITES = 50
+# 单个页面超过该大小时不缓存
+_MAX_PAGE_BYTES = 10 * 1024 * 1024
+# 归一化URL时去掉的跟踪参数（utm_ 前缀的参数与各广告平台的点击ID）；from、spm 等通用名称可能影响页面内容，予以保留
+_TRACKING_PARAM_PREFIX = "utm_"
+_TRACKING_PARAMS = ("fbclid", "gclid", "dclid", "msclkid", "yclid", "mc_cid", "mc_eid")
+
+
+def _is_tracking_param(key: str) -> bool:
+    key = key.lower()
+    return key.startswith(_TRACKING_PARAM_PREFIX) or key in _TRACKING_PARAMS
+
+
+def normalize_url(url: str) -> str:
+    """归一化URL：协议与主机小写、去掉默认端口、片段与跟踪参数，查询参数排序"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    netloc = host if port is None or (scheme, port) in (("http", 80), ("https", 443)) else f"{host}:{port}"
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                             if not _is_tracking_param(key)))
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+def _charset(content_type: str) -> Optional[str]:
+    for part in content_type.split(";")[1:]:
+        key, _, value = part.strip().partition("=")
+        if key.lower() == "charset" and value:
+            return value.strip('"\' ')
+    return None
+
+
+@dataclass(slots=True)
+class WebPage:
+    """一次抓取（或缓存命中）得到的页面原始内容"""
+    url: str
+    status: int
+    content_type: str
+    body: bytes
+    body_hash: str = ""
+    from_cache: bool = False
+
+    @property
+    def text(self) -> str:
+        """按响应声明的字符集解码，未声明时自动探测编码"""
+        charset = _charset(self.content_type)
+        if charset:
+            try:
+                return self.body.decode(charset, errors="replace")
+            except LookupError:
+                pass
+        best = from_bytes(self.body).best()
+        return str(best) if best is not None else self.body.decode("utf-8", errors="replace")
+
+
+class WebPageCache:
+    """所有抓取类工具共享的持久化网页缓存（SQLite）
+
+    - 按归一化URL索引，页面正文按内容哈希存储，相同内容只存一份
+    - 同时缓存各工具从正文中提取的文本，命中时无需重新解析HTML
+    - 过期后携带 ETag/Last-Modified 条件请求重新验证，304 时直接续期
+    - 可按域名配置有效期，总大小超限时按最近访问时间淘汰
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self._config = config
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_failed = False
+        self._writes = 0
+        self._stats = {"hits": 0, "revalidated": 0, "misses": 0, "stale_served": 0, "writes": 0,
+                       "text_hits": 0, "evictions": 0}
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        if self._config is None:
+            self._config = get_web_cache_config()
+        return self._config
+
+    @property
+    def enabled(self) -> bool:
+        return self.config["enabled"]
+
+    def ttl_for(self, url: str) -> int:
+        """按域名（后缀匹配，最长优先）获取有效期，0 表示该域名不缓存"""
+        host = (urlsplit(url).hostname or "").lower()
+        for domain, ttl in self.config["domain_ttls"]:
+            if host == domain or host.endswith("." + domain):
+                return ttl
+        return self.config["ttl_seconds"]
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        """懒加载磁盘缓存，打开失败时不再缓存；须在持有锁时调用"""
+        if self._conn is not None or self._disk_failed:
+            return self._conn
+        path = self.config["path"]
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+                                url_key TEXT PRIMARY KEY,
+                                url TEXT NOT NULL,
+                                body_hash TEXT NOT NULL,
+                                status INTEGER NOT NULL,
+                                content_type TEXT NOT NULL,
+                                etag TEXT,
+                                last_modified TEXT,
+                                fetched_at REAL NOT NULL,
+                                accessed_at REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_accessed ON pages(accessed_at)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS bodies (
+                                body_hash TEXT PRIMARY KEY,
+                                body BLOB NOT NULL,
+                                size INTEGER NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS texts (
+                                body_hash TEXT NOT NULL,
+                                extractor TEXT NOT NULL,
+                                text TEXT NOT NULL,
+                                PRIMARY KEY (body_hash, extractor))""")
+            conn.commit()
+            self._conn = conn
+            logger.info(f"Web page cache opened at {path}")
+        except Exception as e:
+            self._disk_failed = True
+            logger.warning(f"Web page cache unavailable: {e}")
+        return self._conn
+
+    def lookup(self, url: str) -> Tuple[Optional[WebPage], bool, Dict[str, str]]:
+        """查询缓存，返回 (页面, 是否仍在有效期内, 条件请求头)"""
+        if not self.enabled:
+            return None, False, {}
+        ttl = self.ttl_for(url)
+        if ttl <= 0:
+            return None, False, {}
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return None, False, {}
+            try:
+                row = conn.execute("SELECT p.status, p.content_type, p.etag, p.last_modified, p.fetched_at, "
+                                   "p.body_hash, b.body FROM pages p JOIN bodies b ON p.body_hash = b.body_hash "
+                                   "WHERE p.url_key = ?", (key,)).fetchone()
+                if row is None:
+                    self._stats["misses"] += 1
+                    return None, False, {}
+                conn.execute("UPDATE pages SET accessed_at = ? WHERE url_key = ?", (now, key))
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"Web page cache read failed: {e}")
+                return None, False, {}
+        status, content_type, etag, last_modified, fetched_at, body_hash, body = row
+        page = WebPage(url, status, content_type, body, body_hash, from_cache=True)
+        validators = {}
+        if etag:
+            validators["If-None-Match"] = etag
+        if last_modified:
+            validators["If-Modified-Since"] = last_modified
+        return page, now - fetched_at <= ttl, validators
+
+    def store(self, url: str, status: int, headers: Any, body: bytes) -> WebPage:
+        """保存一次成功的抓取结果，返回对应的页面对象"""
+        content_type = headers.get("Content-Type", "") if headers is not None else ""
+        body_hash = hashlib.sha256(body).hexdigest()
+        page = WebPage(url, status, content_type, body, body_hash)
+        if not self.enabled or status != 200 or len(body) > _MAX_PAGE_BYTES or self.ttl_for(url) <= 0:
+            return page
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return page
+            try:
+                conn.execute("INSERT OR IGNORE INTO bodies (body_hash, body, size) VALUES (?, ?, ?)",
+                             (body_hash, body, len(body)))
+                conn.execute("INSERT OR REPLACE INTO pages (url_key, url, body_hash, status, content_type, etag, "
+                             "last_modified, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (normalize_url(url), url, body_hash, status, content_type, headers.get("ETag"),
+                              headers.get("Last-Modified"), now, now))
+                conn.commit()
+                self._stats["writes"] += 1
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY_WRITES == 0:
+                    self._prune(conn)
+            except Exception as e:
+                logger.warning(f"Web page cache write failed: {e}")
+        return page
+
+    def mark_revalidated(self, url: str) -> None:
+        """条件请求返回 304，缓存内容仍然有效，重新计算有效期"""
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+            try:
+                conn.execute("UPDATE pages SET fetched_at = ? WHERE url_key = ?", (time.time(), normalize_url(url)))
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"Web page cache update failed: {e}")
+
+    def get_text(self, body_hash: str, extractor: str) -> Optional[str]:
+        if not self.enabled or not body_hash:
+            return None
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute("SELECT text FROM texts WHERE body_hash = ? AND extractor = ?",
+                                   (body_hash, extractor)).fetchone()
+            except Exception as e:
+                logger.warning(f"Web page cache read failed: {e}")
+                return None
+            if row is not None:
+                self._stats["text_hits"] += 1
+            return row[0] if row is not None else None
+
+    def put_text(self, body_hash: str, extractor: str, text: str) -> None:
+        if not self.enabled or not body_hash:
+            return
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+            try:
+                # 只为已缓存的正文保存提取结果
+                conn.execute("INSERT OR REPLACE INTO texts (body_hash, extractor, text) "
+                             "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM bodies WHERE body_hash = ?)",
+                             (body_hash, extractor, text, body_hash))
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"Web page cache write failed: {e}")
+
+    def record(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        """总大小超过上限时按最近访问时间淘汰页面，并清理不再被引用的正文与提取文本"""
+        max_bytes = self.config["max_disk_mb"] * 1024 * 1024
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+        if total <= max_bytes:
+            return
+        evicted = 0
+        rows = conn.execute("SELECT p.url_key, b.size FROM pages p JOIN bodies b ON p.body_hash = b.body_hash "
+                            "ORDER BY p.accessed_at").fetchall()
+        for url_key, size in rows:
+            if total <= max_bytes:
+                break
+            conn.execute("DELETE FROM pages WHERE url_key = ?", (url_key,))
+            total -= size
+            evicted += 1
+        conn.execute("DELETE FROM bodies WHERE body_hash NOT IN (SELECT body_hash FROM pages)")
+        conn.execute("DELETE FROM texts WHERE body_hash NOT IN (SELECT body_hash FROM bodies)")
+        conn.commit()
+        self._stats["evictions"] += evicted
+        logger.info(f"Web page cache evicted {evicted} pages")
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._get_conn()
+            if conn is not None:
+                conn.execute("DELETE FROM pages")
+                conn.execute("DELETE FROM bodies")
+                conn.execute("DELETE FROM texts")
+                conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中、重新验证与淘汰等统计"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["revalidated"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["revalidated"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+web_page_cache = WebPageCache()
+
+
+def fetch_page(url: str, headers: Optional[Dict[str, str]] = None, proxies: Optional[Dict[str, str]] = None,
+               timeout=None, verify: bool = True, cookies: Optional[Dict[str, str]] = None) -> WebPage:
+    """经缓存抓取页面（同步），携带 cookie 的请求不使用缓存；网络失败时若有过期缓存则返回过期内容"""
+    cached, fresh, validators = web_page_cache.lookup(url) if not cookies else (None, False, {})
+    if cached is not None and fresh:
+        web_page_cache.record("hits")
+        return cached
+    request_headers = dict(headers or {})
+    request_headers.update(validators)
+    try:
+        response = get_requests_session().get(url, headers=request_headers, proxies=proxies,
+                                              timeout=timeout or http_timeout(), verify=verify, cookies=cookies)
+    except Exception:
+        if cached is None:
+            raise
+        logger.warning(f"Revalidating {url} failed, serving stale cached page", exc_info=True)
+        web_page_cache.record("stale_served")
+        return cached
+    if cached is not None and response.status_code == 304:
+        web_page_cache.mark_revalidated(url)
+        web_page_cache.record("revalidated")
+        return cached
+    if cookies:
+        return WebPage(url, response.status_code, response.headers.get("Content-Type", ""), response.content)
+    return web_page_cache.store(url, response.status_code, response.headers, response.content)
+
+
+async def afetch_page(url: str, headers: Optional[Dict[str, str]] = None, proxy: Optional[str] = None,
+                      content_types: Optional[Tuple[str, ...]] = None) -> WebPage:
+    """经缓存抓取页面（异步，使用共享的 aiohttp 会话）
+
+    指定 content_types 时，不匹配的响应不读取正文，返回的页面 body 为空。
+    """
+    cached, fresh, validators = await asyncio.to_thread(web_page_cache.lookup, url)
+    if cached is not None and fresh:
+        web_page_cache.record("hits")
+        return cached
+    request_headers = dict(headers or {})
+    request_headers.update(validators)
+    try:
+        async with get_aiohttp_session().get(url, headers=request_headers, proxy=proxy) as response:
+            if cached is not None and response.status == 304:
+                await asyncio.to_thread(web_page_cache.mark_revalidated, url)
+                web_page_cache.record("revalidated")
+                return cached
+            content_type = response.headers.get("Content-Type", "")
+            if response.status != 200 or (content_types and not any(t in content_type for t in content_types)):
+                return WebPage(url, response.status, content_type, b"")
+            body = await response.read()
+    except Exception:
+        if cached is None:
+            raise
+        logger.warning(f"Revalidating {url} failed, serving stale cached page", exc_info=True)
+        web_page_cache.record("stale_served")
+        return cached
+    return await asyncio.to_thread(web_page_cache.store, url, response.status, response.headers, body)
+
+
+def page_text(page: WebPage, extractor: str, extract: Callable[[WebPage], str]) -> str:
+    """获取页面的提取文本：同一正文、同一提取方式只解析一次"""
+    text = web_page_cache.get_text(page.body_hash, extractor)
+    if text is None:
+        text = extract(page)
+        web_page_cache.put_text(page.body_hash, extractor, text)
+    return text
@@ -26,6 +26,8 @@ def get_model_config() -> dict[str, Optional[str | int | float]]:
     """获取API配置"""
     max_tokens = os.environ.get("MAX_TOKENS")
     temperature = os.environ.get("TEMPERATURE")
+    rpm = os.environ.get("RPM")
+    tpm = os.environ.get("TPM")
     os.environ['OPENAI_API_KEY'] = os.environ.get("API_KEY")
     return {
         "api_key": os.environ.get("API_KEY"),
@@ -33,7 +35,9 @@ def get_model_config() -> dict[str, Optional[str | int | float]]:
         "model": os.environ.get("MODEL_NAME"),
         "max_tokens": int(max_tokens) if max_tokens and max_tokens.strip() else None,
         "temperature": float(temperature) if temperature and temperature.strip() else None,
-        "proxy": os.environ.get("PROXY")
+        "proxy": os.environ.get("PROXY"),
+        "rpm": int(rpm) if rpm and rpm.strip() else None,
+        "tpm": int(tpm) if tpm and tpm.strip() else None
     }
 
 
@@ -50,6 +54,8 @@ def get_plan_model_config() -> dict[str, Optional[str | int | float]]:
 
     max_tokens = os.environ.get("PLAN_MAX_TOKENS")
     temperature = os.environ.get("PLAN_TEMPERATURE")
+    rpm = os.environ.get("PLAN_RPM")
+    tpm = os.environ.get("PLAN_TPM")
 
     return {
         "api_key": plan_api_key,
@@ -57,7 +63,9 @@ def get_plan_model_config() -> dict[str, Optional[str | int | float]]:
         "model": model_name,
         "max_tokens": int(max_tokens) if max_tokens and max_tokens.strip() else None,
         "temperature": float(temperature) if temperature and temperature.strip() else None,
-        "proxy": os.environ.get("PLAN_PROXY")
+        "proxy": os.environ.get("PLAN_PROXY"),
+        "rpm": int(rpm) if rpm and rpm.strip() else None,
+        "tpm": int(tpm) if tpm and tpm.strip() else None
     }
 
 
@@ -74,6 +82,8 @@ def get_act_model_config() -> dict[str, Optional[str | int | float]]:
 
     max_tokens = os.environ.get("ACT_MAX_TOKENS")
     temperature = os.environ.get("ACT_TEMPERATURE")
+    rpm = os.environ.get("ACT_RPM")
+    tpm = os.environ.get("ACT_TPM")
 
     return {
         "api_key": act_api_key,
@@ -81,7 +91,9 @@ def get_act_model_config() -> dict[str, Optional[str | int | float]]:
         "model": model_name,
         "max_tokens": int(max_tokens) if max_tokens and max_tokens.strip() else None,
         "temperature": float(temperature) if temperature and temperature.strip() else None,
-        "proxy": os.environ.get("ACT_PROXY")
+        "proxy": os.environ.get("ACT_PROXY"),
+        "rpm": int(rpm) if rpm and rpm.strip() else None,
+        "tpm": int(tpm) if tpm and tpm.strip() else None
     }
 
 
@@ -98,6 +110,8 @@ def get_tool_model_config() -> dict[str, Optional[str | int | float]]:
 
     max_tokens = os.environ.get("TOOL_MAX_TOKENS")
     temperature = os.environ.get("TOOL_TEMPERATURE")
+    rpm = os.environ.get("TOOL_RPM")
+    tpm = os.environ.get("TOOL_TPM")
 
     return {
         "api_key": tool_api_key,
@@ -105,7 +119,9 @@ def get_tool_model_config() -> dict[str, Optional[str | int | float]]:
         "model": model_name,
         "max_tokens": int(max_tokens) if max_tokens and max_tokens.strip() else None,
         "temperature": float(temperature) if temperature and temperature.strip() else None,
-        "proxy": os.environ.get("TOOL_PROXY")
+        "proxy": os.environ.get("TOOL_PROXY"),
+        "rpm": int(rpm) if rpm and rpm.strip() else None,
+        "tpm": int(tpm) if tpm and tpm.strip() else None
     }
 
 
@@ -122,6 +138,8 @@ def get_vision_model_config() -> dict[str, Optional[str | int | float]]:
 
     max_tokens = os.environ.get("VISION_MAX_TOKENS")
     temperature = os.environ.get("VISION_TEMPERATURE")
+    rpm = os.environ.get("VISION_RPM")
+    tpm = os.environ.get("VISION_TPM")
 
     return {
         "api_key": vision_api_key,
@@ -129,7 +147,9 @@ def get_vision_model_config() -> dict[str, Optional[str | int | float]]:
         "model": model_name,
         "max_tokens": int(max_tokens) if max_tokens and max_tokens.strip() else None,
         "temperature": float(temperature) if temperature and temperature.strip() else None,
-        "proxy": os.environ.get("VISION_PROXY")
+        "proxy": os.environ.get("VISION_PROXY"),
+        "rpm": int(rpm) if rpm and rpm.strip() else None,
+        "tpm": int(tpm) if tpm and tpm.strip() else None
     }
 
 
@@ -146,6 +166,8 @@ def get_credibility_model_config() -> dict[str, Optional[str | int | float]]:
 
     max_tokens = os.environ.get("CREDIBILITY_MAX_TOKENS")
     temperature = os.environ.get("CREDIBILITY_TEMPERATURE")
+    rpm = os.environ.get("CREDIBILITY_RPM")
+    tpm = os.environ.get("CREDIBILITY_TPM")
 
     return {
         "api_key": credibility_api_key,
@@ -153,7 +175,9 @@ def get_credibility_model_config() -> dict[str, Optional[str | int | float]]:
         "model": model_name,
         "max_tokens": int(max_tokens) if max_tokens and max_tokens.strip() else None,
         "temperature": float(temperature) if temperature and temperature.strip() else None,
-        "proxy": os.environ.get("CREDIBILITY_PROXY")
+        "proxy": os.environ.get("CREDIBILITY_PROXY"),
+        "rpm": int(rpm) if rpm and rpm.strip() else None,
+        "tpm": int(tpm) if tpm and tpm.strip() else None
     }
 
 
@@ -170,6 +194,8 @@ def get_browser_model_config() -> dict[str, Optional[str | int | float]]:
 
     max_tokens = os.environ.get("BROWSER_MAX_TOKENS")
     temperature = os.environ.get("BROWSER_TEMPERATURE")
+    rpm = os.environ.get("BROWSER_RPM")
+    tpm = os.environ.get("BROWSER_TPM")
 
     return {
         "api_key": browser_api_key,
@@ -177,7 +203,9 @@ def get_browser_model_config() -> dict[str, Optional[str | int | float]]:
         "model": model_name,
         "max_tokens": int(max_tokens) if max_tokens and max_tokens.strip() else None,
         "temperature": float(temperature) if temperature and temperature.strip() else None,
-        "proxy": os.environ.get("BROWSER_PROXY")
+        "proxy": os.environ.get("BROWSER_PROXY"),
+        "rpm": int(rpm) if rpm and rpm.strip() else None,
+        "tpm": int(tpm) if tpm and tpm.strip() else None
     }
 
 
@@ -187,6 +215,273 @@ def get_tavily_config() -> Optional[str]:
     return os.environ.get("TAVILY_API_KEY")
 
 
+# ========== 步骤调度配置 ==========
+def get_step_scheduler_config() -> dict[str, int | bool]:
+    """获取步骤调度器配置：进程级工作线程数、单个计划的最大并发步骤数，以及步骤是否以协程方式执行"""
+    max_workers = os.environ.get("STEP_MAX_WORKERS")
+    max_concurrency_per_plan = os.environ.get("STEP_MAX_CONCURRENCY_PER_PLAN")
+    async_agent = os.environ.get("STEP_ASYNC_AGENT")
+    return {
+        "max_workers": int(max_workers) if max_workers and max_workers.strip() else 16,
+        "max_concurrency_per_plan": int(max_concurrency_per_plan) if max_concurrency_per_plan and max_concurrency_per_plan.strip() else 5,
+        "async_agent": async_agent.strip().lower() != "false" if async_agent and async_agent.strip() else True
+    }
+
+
+# ========== 计划事件推送配置 ==========
+def get_plan_event_config() -> dict[str, int]:
+    """获取计划进度推送配置：进度事件合并窗口（毫秒，0表示不合并）、增量推送间隔多少次发送一次全量，
+    以及每个计划待投递事件队列的上限（超出后丢弃可合并的低价值事件）"""
+    coalesce_ms = os.environ.get("PLAN_EVENT_COALESCE_MS")
+    full_snapshot_interval = os.environ.get("PLAN_EVENT_FULL_SNAPSHOT_INTERVAL")
+    queue_size = os.environ.get("PLAN_EVENT_QUEUE_SIZE")
+    return {
+        "coalesce_ms": int(coalesce_ms) if coalesce_ms and coalesce_ms.strip() else 200,
+        "full_snapshot_interval": int(full_snapshot_interval) if full_snapshot_interval and full_snapshot_interval.strip() else 20,
+        "queue_size": int(queue_size) if queue_size and queue_size.strip() else 1000
+    }
+
+
+# ========== 大模型连接池与重试配置 ==========
+def get_llm_http_config() -> dict[str, int | float]:
+    """获取大模型HTTP连接池与重试配置，连接池按 base_url 共享"""
+    max_connections = os.environ.get("LLM_HTTP_MAX_CONNECTIONS")
+    max_keepalive_connections = os.environ.get("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS")
+    keepalive_expiry = os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY")
+    timeout = os.environ.get("LLM_HTTP_TIMEOUT")
+    max_retries = os.environ.get("LLM_MAX_RETRIES")
+    retry_base_delay = os.environ.get("LLM_RETRY_BASE_DELAY")
+    retry_max_delay = os.environ.get("LLM_RETRY_MAX_DELAY")
+    return {
+        "max_connections": int(max_connections) if max_connections and max_connections.strip() else 200,
+        "max_keepalive_connections": int(max_keepalive_connections) if max_keepalive_connections and max_keepalive_connections.strip() else 50,
+        "keepalive_expiry": float(keepalive_expiry) if keepalive_expiry and keepalive_expiry.strip() else 60.0,
+        "timeout": float(timeout) if timeout and timeout.strip() else 600.0,
+        "max_retries": int(max_retries) if max_retries and max_retries.strip() else 5,
+        "retry_base_delay": float(retry_base_delay) if retry_base_delay and retry_base_delay.strip() else 2.0,
+        "retry_max_delay": float(retry_max_delay) if retry_max_delay and retry_max_delay.strip() else 60.0
+    }
+
+
+# ========== 大模型响应缓存配置 ==========
+def get_llm_cache_config() -> dict[str, int | bool | str]:
+    """获取大模型响应缓存配置（默认关闭）：仅缓存 temperature=0 的调用，内存LRU加SQLite磁盘两级"""
+    enabled = os.environ.get("LLM_CACHE_ENABLED")
+    path = os.environ.get("LLM_CACHE_PATH")
+    memory_entries = os.environ.get("LLM_CACHE_MEMORY_ENTRIES")
+    ttl_seconds = os.environ.get("LLM_CACHE_TTL_SECONDS")
+    max_disk_mb = os.environ.get("LLM_CACHE_MAX_DISK_MB")
+    return {
+        "enabled": enabled.strip().lower() in ("true", "1", "yes") if enabled and enabled.strip() else False,
+        "path": path.strip() if path and path.strip() else os.path.join(os.getcwd(), "llm_cache", "llm_response_cache.db"),
+        "memory_entries": int(memory_entries) if memory_entries and memory_entries.strip() else 1000,
+        "ttl_seconds": int(ttl_seconds) if ttl_seconds and ttl_seconds.strip() else 86400,
+        "max_disk_mb": int(max_disk_mb) if max_disk_mb and max_disk_mb.strip() else 512
+    }
+
+
+# ========== MCP会话池配置 ==========
+def get_mcp_pool_config() -> dict[str, int | float]:
+    """获取MCP会话池配置：空闲断开时间、单个服务的最大并发调用数、连接超时、调用超时与健康检查间隔（秒）"""
+    idle_timeout = os.environ.get("MCP_POOL_IDLE_TIMEOUT")
+    max_concurrent_calls = os.environ.get("MCP_POOL_MAX_CONCURRENT_CALLS")
+    connect_timeout = os.environ.get("MCP_POOL_CONNECT_TIMEOUT")
+    call_timeout = os.environ.get("MCP_POOL_CALL_TIMEOUT")
+    health_check_interval = os.environ.get("MCP_POOL_HEALTH_CHECK_INTERVAL")
+    return {
+        "idle_timeout": float(idle_timeout) if idle_timeout and idle_timeout.strip() else 300.0,
+        "max_concurrent_calls": int(max_concurrent_calls) if max_concurrent_calls and max_concurrent_calls.strip() else 4,
+        "connect_timeout": float(connect_timeout) if connect_timeout and connect_timeout.strip() else 60.0,
+        "call_timeout": float(call_timeout) if call_timeout and call_timeout.strip() else 300.0,
+        "health_check_interval": float(health_check_interval) if health_check_interval and health_check_interval.strip() else 60.0
+    }
+
+
+# ========== MCP工具列表缓存配置 ==========
+def get_mcp_tool_cache_config() -> dict[str, int | float]:
+    """获取MCP工具列表缓存配置：缓存有效期（秒）、后台刷新的最大线程数与首次发现的最长等待时间（秒）"""
+    ttl = os.environ.get("MCP_TOOL_CACHE_TTL")
+    max_workers = os.environ.get("MCP_TOOL_CACHE_MAX_WORKERS")
+    load_timeout = os.environ.get("MCP_TOOL_CACHE_LOAD_TIMEOUT")
+    return {
+        "ttl": float(ttl) if ttl and ttl.strip() else 600.0,
+        "max_workers": int(max_workers) if max_workers and max_workers.strip() else 4,
+        "load_timeout": float(load_timeout) if load_timeout and load_timeout.strip() else 90.0
+    }
+
+
+# ========== 网页抓取HTTP连接池配置 ==========
+def get_http_client_config() -> dict[str, int | float]:
+    """获取网页抓取类工具共享HTTP连接池配置：连接数上限、单主机连接数、DNS缓存与长连接时间、各项超时（秒）"""
+    pool_limit = os.environ.get("HTTP_POOL_LIMIT")
+    pool_limit_per_host = os.environ.get("HTTP_POOL_LIMIT_PER_HOST")
+    dns_cache_ttl = os.environ.get("HTTP_DNS_CACHE_TTL")
+    keepalive_timeout = os.environ.get("HTTP_KEEPALIVE_TIMEOUT")
+    connect_timeout = os.environ.get("HTTP_CONNECT_TIMEOUT")
+    read_timeout = os.environ.get("HTTP_READ_TIMEOUT")
+    total_timeout = os.environ.get("HTTP_TOTAL_TIMEOUT")
+    return {
+        "pool_limit": int(pool_limit) if pool_limit and pool_limit.strip() else 100,
+        "pool_limit_per_host": int(pool_limit_per_host) if pool_limit_per_host and pool_limit_per_host.strip() else 8,
+        "dns_cache_ttl": int(dns_cache_ttl) if dns_cache_ttl and dns_cache_ttl.strip() else 300,
+        "keepalive_timeout": float(keepalive_timeout) if keepalive_timeout and keepalive_timeout.strip() else 30.0,
+        "connect_timeout": float(connect_timeout) if connect_timeout and connect_timeout.strip() else 10.0,
+        "read_timeout": float(read_timeout) if read_timeout and read_timeout.strip() else 30.0,
+        "total_timeout": float(total_timeout) if total_timeout and total_timeout.strip() else 60.0
+    }
+
+
+# ========== 异步工具运行时配置 ==========
+def get_async_runtime_config() -> dict[str, float | None]:
+    """获取异步工具运行时配置：单次异步工具调用的超时时间（秒），0 表示不限制"""
+    tool_timeout = os.environ.get("TOOL_ASYNC_TIMEOUT")
+    tool_timeout = float(tool_timeout) if tool_timeout and tool_timeout.strip() else 600.0
+    return {
+        "tool_timeout": tool_timeout if tool_timeout > 0 else None
+    }
+
+
+# ========== 网页缓存配置 ==========
+def get_web_cache_config() -> dict:
+    """获取抓取类工具共享的持久化网页缓存配置：是否启用、缓存路径、默认与按域名的有效期（秒）、磁盘上限"""
+    enabled = os.environ.get("WEB_CACHE_ENABLED")
+    path = os.environ.get("WEB_CACHE_PATH")
+    ttl_seconds = os.environ.get("WEB_CACHE_TTL_SECONDS")
+    domain_ttls = os.environ.get("WEB_CACHE_DOMAIN_TTLS")
+    max_disk_mb = os.environ.get("WEB_CACHE_MAX_DISK_MB")
+    # 格式: "example.com=60,news.example.org=0"，按域名后缀匹配，较长的域名优先
+    parsed_domain_ttls = []
+    for item in (domain_ttls or "").split(","):
+        domain, _, ttl = item.partition("=")
+        if domain.strip() and ttl.strip():
+            parsed_domain_ttls.append((domain.strip().lower().lstrip("."), int(ttl)))
+    parsed_domain_ttls.sort(key=lambda item: len(item[0]), reverse=True)
+    return {
+        "enabled": enabled.strip().lower() in ("true", "1", "yes") if enabled and enabled.strip() else True,
+        "path": path.strip() if path and path.strip() else os.path.join(os.getcwd(), "web_cache", "web_page_cache.db"),
+        "ttl_seconds": int(ttl_seconds) if ttl_seconds and ttl_seconds.strip() else 3600,
+        "domain_ttls": parsed_domain_ttls,
+        "max_disk_mb": int(max_disk_mb) if max_disk_mb and max_disk_mb.strip() else 512
+    }
+
+
+# ========== 搜索结果抓取配置 ==========
+def get_search_fetch_config() -> dict[str, int | float]:
+    """获取搜索结果页面的并发抓取配置：并发数、单页超时、整体期限、提前返回所需的完成数及其后的等待时间（秒）"""
+    concurrency = os.environ.get("SEARCH_FETCH_CONCURRENCY")
+    url_timeout = os.environ.get("SEARCH_FETCH_URL_TIMEOUT")
+    deadline = os.environ.get("SEARCH_FETCH_DEADLINE")
+    quorum = os.environ.get("SEARCH_FETCH_QUORUM")
+    quorum_grace = os.environ.get("SEARCH_FETCH_QUORUM_GRACE")
+    return {
+        "concurrency": int(concurrency) if concurrency and concurrency.strip() else 4,
+        "url_timeout": float(url_timeout) if url_timeout and url_timeout.strip() else 15.0,
+        "deadline": float(deadline) if deadline and deadline.strip() else 25.0,
+        # 0 表示等待全部页面（仍受整体期限限制）
+        "quorum": int(quorum) if quorum and quorum.strip() else 3,
+        "quorum_grace": float(quorum_grace) if quorum_grace and quorum_grace.strip() else 1.0
+    }
+
+
+# ========== 网页正文提取配置 ==========
+def get_html_extract_config() -> dict[str, int]:
+    """获取网页正文提取配置：最大解析字符数、交给进程池解析的文档大小阈值（0 表示不使用进程池）与进程数"""
+    max_chars = os.environ.get("HTML_EXTRACT_MAX_CHARS")
+    process_threshold = os.environ.get("HTML_EXTRACT_PROCESS_THRESHOLD")
+    process_workers = os.environ.get("HTML_EXTRACT_PROCESS_WORKERS")
+    return {
+        "max_chars": int(max_chars) if max_chars and max_chars.strip() else 2000000,
+        "process_threshold": int(process_threshold) if process_threshold and process_threshold.strip() else 0,
+        "process_workers": int(process_workers) if process_workers and process_workers.strip() else 2
+    }
+
+
+# ========== iframe可嵌入性检查配置 ==========
+def get_iframe_check_config() -> dict[str, int]:
+    """获取搜索结果iframe可嵌入性检查配置：单次请求超时（秒）、并发数、按域名缓存的有效期（秒）与条目上限"""
+    timeout = os.environ.get("IFRAME_CHECK_TIMEOUT")
+    concurrency = os.environ.get("IFRAME_CHECK_CONCURRENCY")
+    cache_ttl = os.environ.get("IFRAME_CHECK_CACHE_TTL")
+    cache_size = os.environ.get("IFRAME_CHECK_CACHE_SIZE")
+    return {
+        "timeout": int(timeout) if timeout and timeout.strip() else 8,
+        "concurrency": int(concurrency) if concurrency and concurrency.strip() else 8,
+        "cache_ttl": int(cache_ttl) if cache_ttl and cache_ttl.strip() else 3600,
+        "cache_size": int(cache_size) if cache_size and cache_size.strip() else 1024
+    }
+
+
+# ========== 计划事件日志配置 ==========
+def get_plan_log_config() -> dict[str, int | str]:
+    """获取计划事件日志（NDJSON）配置：压缩方式（none/gzip/zstd）、fsync策略（none/batch/close），
+    以及后台线程攒批写入的最长等待时间（毫秒）与批大小（KB）"""
+    compression = os.environ.get("PLAN_LOG_COMPRESSION")
+    fsync = os.environ.get("PLAN_LOG_FSYNC")
+    flush_ms = os.environ.get("PLAN_LOG_FLUSH_MS")
+    block_kb = os.environ.get("PLAN_LOG_BLOCK_KB")
+    return {
+        "compression": compression.strip().lower() if compression and compression.strip() else "none",
+        "fsync": fsync.strip().lower() if fsync and fsync.strip() else "close",
+        "flush_ms": int(flush_ms) if flush_ms and flush_ms.strip() else 500,
+        "block_kb": int(block_kb) if block_kb and block_kb.strip() else 64
+    }
+
+
+# ========== 回放录制配置 ==========
+def get_replay_record_config() -> dict[str, int]:
+    """获取回放文件录制配置：后台写线程待写入消息数上限（超出后写入方等待）与刷盘间隔（毫秒）"""
+    queue_size = os.environ.get("REPLAY_WRITE_QUEUE_SIZE")
+    flush_ms = os.environ.get("REPLAY_FLUSH_MS")
+    return {
+        "queue_size": int(queue_size) if queue_size and queue_size.strip() else 10000,
+        "flush_ms": int(flush_ms) if flush_ms and flush_ms.strip() else 1000
+    }
+
+
+# ========== 消息广播配置 ==========
+def get_broadcast_config() -> dict[str, int]:
+    """获取按主题广播消息的配置：单个订阅者最多积压的消息数、每个主题保留的历史消息条数与大小（MB），
+    以及没有订阅者后主题（及其后台推送任务）保留的时间（秒）"""
+    max_lag = os.environ.get("BROADCAST_MAX_LAG")
+    history_size = os.environ.get("BROADCAST_HISTORY_SIZE")
+    history_mb = os.environ.get("BROADCAST_HISTORY_MB")
+    idle_seconds = os.environ.get("BROADCAST_IDLE_SECONDS")
+    return {
+        "max_lag": int(max_lag) if max_lag and max_lag.strip() else 1000,
+        "history_size": int(history_size) if history_size and history_size.strip() else 5000,
+        "history_mb": int(history_mb) if history_mb and history_mb.strip() else 64,
+        "idle_seconds": int(idle_seconds) if idle_seconds and idle_seconds.strip() else 60
+    }
+
+
+# ========== 报告流式推送配置 ==========
+def get_report_stream_config() -> dict[str, int | bool]:
+    """获取最终总结与步骤备注的流式推送配置：是否启用，以及片段攒够多少字符或间隔多少毫秒推送一次"""
+    enabled = os.environ.get("REPORT_STREAM_ENABLED")
+    flush_chars = os.environ.get("REPORT_STREAM_FLUSH_CHARS")
+    flush_ms = os.environ.get("REPORT_STREAM_FLUSH_MS")
+    return {
+        "enabled": enabled.strip().lower() not in ("false", "0", "no") if enabled and enabled.strip() else True,
+        "flush_chars": int(flush_chars) if flush_chars and flush_chars.strip() else 64,
+        "flush_ms": int(flush_ms) if flush_ms and flush_ms.strip() else 100
+    }
+
+
+# ========== 对话上下文压缩配置 ==========
+def get_context_compaction_config() -> dict[str, int]:
+    """获取智能体对话上下文压缩配置：token预算、保留原文的最近工具结果数、落盘阈值与截断后保留的字符数"""
+    token_budget = os.environ.get("CONTEXT_TOKEN_BUDGET")
+    keep_recent_tool_results = os.environ.get("CONTEXT_KEEP_RECENT_TOOL_RESULTS")
+    offload_chars = os.environ.get("CONTEXT_OFFLOAD_CHARS")
+    truncate_chars = os.environ.get("CONTEXT_TRUNCATE_CHARS")
+    return {
+        "token_budget": int(token_budget) if token_budget and token_budget.strip() else 32000,
+        "keep_recent_tool_results": int(keep_recent_tool_results) if keep_recent_tool_results and keep_recent_tool_results.strip() else 3,
+        "offload_chars": int(offload_chars) if offload_chars and offload_chars.strip() else 8000,
+        "truncate_chars": int(truncate_chars) if truncate_chars and truncate_chars.strip() else 800
+    }
+
+
 def validate_config(config: dict) -> bool:
     """验证必要配置是否存在"""
     if not config.get("api_key"):
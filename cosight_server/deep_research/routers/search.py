@@ -18,7 +18,7 @@ import asyncio
 import os
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncIterator, Callable
 from fastapi import APIRouter, Body
 from starlette.requests import Request
 from fastapi.responses import StreamingResponse
@@ -27,15 +27,24 @@ from app.cosight.task.task_manager import TaskManager
 from llm import llm_for_plan, llm_for_act, llm_for_tool, llm_for_vision
 from cosight_server.deep_research.services.i18n_service import i18n
 from cosight_server.deep_research.services.credibility_analyzer import credibility_analyzer
+from cosight_server.deep_research.services.plan_event_log import PlanEventLog, find_plan_event_log, iter_plan_events
+from cosight_server.deep_research.services.replay_store import ReplayIndex, ReplayRecorder, aiter_replay, replay_delay
+from cosight_server.deep_research.services.broadcast_hub import BroadcastHub, Subscription
 from app.common.logger_util import logger
 
 # 引入CoSight所需的依赖
 from app.cosight.task.plan_report_manager import plan_report_event_manager
-from app.cosight.task.todolist import Plan
+from app.cosight.task.todolist import Plan, PlanSnapshot
+from app.cosight.task.plan_delta import PlanDeltaEncoder, apply_plan_patch
 from CoSight import CoSight
 
 searchRouter = APIRouter()
 
+# 直接透传给前端的工具事件类型，tool_update 为已推送事件的后续更新（如iframe可嵌入性检查结论）
+TOOL_EVENT_TYPES = ("tool_start", "tool_complete", "tool_error", "tool_update")
+# 推送给前端的计划事件类型
+PLAN_EVENT_TYPES = ("plan_created", "plan_updated", "plan_process", "plan_result", "tool_event", "plan_stream")
+
 # 使用从环境变量获取的WORKSPACE_PATH
 work_space_path = os.environ.get('WORKSPACE_PATH')
 work_space_path = os.path.join(work_space_path, "work_space") if work_space_path else os.path.join(os.getcwd(), "work_space")
@@ -48,6 +57,14 @@ LOGS_PATH = os.path.join(work_space_path, 'plans')
 if not os.path.exists(LOGS_PATH):
     os.makedirs(LOGS_PATH)
 
+# 各工作区 replay.json 的索引（标题、消息数、每条消息的偏移与录制时间）
+replay_index = ReplayIndex(work_space_path)
+
+# 运行中任务的响应消息按 plan_id 广播，同一任务的多个请求共享一份消息流
+plan_stream_hub = BroadcastHub()
+# 向广播推送消息的后台任务，持有引用避免被回收
+_plan_pump_tasks = set()
+
 
 # 将本地文件路径转换为可被前端访问的URL
 def _file_path_to_url(path_value: str) -> str:
@@ -100,18 +117,23 @@ def _rewrite_paths_in_payload(payload):
         elif isinstance(payload, list):
             return [_rewrite_paths_in_payload(item) for item in payload]
         elif isinstance(payload, str):
-            # 尝试把 JSON 字符串解出来再处理
-            try:
-                obj = json.loads(payload)
-                return json.dumps(_rewrite_paths_in_payload(obj), ensure_ascii=False)
-            except Exception:
-                return _file_path_to_url(payload)
+            # 不含 work_space 的字符串无需处理，避免对大段工具结果反复尝试 JSON 解析
+            if "work_space" not in payload:
+                return payload
+            # 形如 JSON 的字符串解出来再处理
+            if payload.lstrip()[:1] in ("{", "["):
+                try:
+                    obj = json.loads(payload)
+                    return json.dumps(_rewrite_paths_in_payload(obj), ensure_ascii=False)
+                except Exception:
+                    pass
+            return _file_path_to_url(payload)
         else:
             return payload
     except Exception:
         return payload
 
-async def _trigger_credibility_analysis(plan_queue, plan_data: Plan, completed_step: str):
+async def _trigger_credibility_analysis(plan_queue, plan_data: Plan | PlanSnapshot, completed_step: str):
     """触发可信分析 - 异步执行，不阻塞主流程"""
     
     # 立即检查并继续执行下一步骤，不等待可信分析
@@ -125,7 +147,7 @@ async def _trigger_credibility_analysis(plan_queue, plan_data: Plan, completed_s
     except Exception as e:
         logger.error(f"创建可信分析任务失败: {e}", exc_info=True)
 
-async def _async_credibility_analysis(plan_queue, plan_data: Plan, completed_step: str):
+async def _async_credibility_analysis(plan_queue, plan_data: Plan | PlanSnapshot, completed_step: str):
     """异步执行可信分析"""
     try:
         logger.info(f"开始异步可信分析: {completed_step}")
@@ -190,7 +212,7 @@ async def _async_credibility_analysis(plan_queue, plan_data: Plan, completed_ste
     except Exception as e:
         logger.error(f"异步可信分析失败: {e}", exc_info=True)
 
-async def _check_and_continue_next_step(plan_queue, plan_data: Plan):
+async def _check_and_continue_next_step(plan_queue, plan_data: Plan | PlanSnapshot):
     """检查并继续执行下一个步骤"""
     try:
         logger.info(f"检查下一步骤，当前计划状态: {plan_data.step_statuses}")
@@ -222,27 +244,15 @@ async def append_create_plan(data: Any):
 
         # 处理Plan对象转换为可序列化的dict
         if isinstance(data, Plan):
-            plan_dict = {
-                "title": data.title if hasattr(data, 'title') else "",
-                "steps": data.steps if hasattr(data, 'steps') else [],
-                "step_files": data.step_files if hasattr(data, 'step_files') else {},
-                "step_statuses": data.step_statuses if hasattr(data, 'step_statuses') else {},
-                "step_notes": data.step_notes if hasattr(data, 'step_notes') else {},
-                "step_details": data.step_details if hasattr(data, 'step_details') else {},
-                "step_tool_calls": data.step_tool_calls if hasattr(data, 'step_tool_calls') else {},
-                "dependencies": {str(k): v for k, v in data.dependencies.items()} if hasattr(data,
-                                                                                             'dependencies') else {},
-                "progress": data.get_progress() if hasattr(data, 'get_progress') and callable(
-                    data.get_progress) else {},
-                "result": data.get_plan_result() if hasattr(data, 'get_plan_result') and callable(
-                    data.get_plan_result) else ""
-            }
-            logger.info(f"step_files:{data.step_files}")
+            data = data.snapshot()
+        if isinstance(data, PlanSnapshot):
+            plan_dict = data.to_dict()
+            logger.info(f"step_files:{plan_dict['step_files']}")
 
             # logger.info(f"Plan对象已转换为字典: {plan_dict}")
             data = plan_dict
         # 处理工具事件数据
-        elif isinstance(data, dict) and data.get("event_type") in ["tool_start", "tool_complete", "tool_error"]:
+        elif isinstance(data, dict) and data.get("event_type") in TOOL_EVENT_TYPES:
             # 在推送前，将事件中的文件系统路径改写为可访问的 URL
             data = _rewrite_paths_in_payload(data)
             logger.info(f"Tool event: {data.get('event_type')} for {data.get('tool_name')}")
@@ -275,13 +285,13 @@ async def append_create_plan(data: Any):
         global plan_queue, main_loop, analyzed_steps
         if plan_queue is not None and main_loop is not None:
             # 确保队列中的数据是可JSON序列化的
-            if isinstance(data, Plan):
+            if isinstance(data, PlanSnapshot):
                 # 已经在上面转换过了
                 asyncio.run_coroutine_threadsafe(plan_queue.put(plan_dict), main_loop)
                 
                 # 检查是否有新完成的步骤，触发可信分析
                 if hasattr(data, 'step_statuses'):
-                    logger.info(f"Plan步骤状态: {data.step_statuses}")
+                    logger.info(f"Plan步骤状态: {dict(data.step_statuses)}")
                     for step, status in data.step_statuses.items():
                         logger.info(f"检查步骤: {step}, 状态: {status}, 已分析: {step in analyzed_steps}")
                         if status == 'completed' and step not in analyzed_steps:
@@ -322,6 +332,31 @@ def validate_search_input(params: dict) -> dict | None:
     return None
 
 
+class StreamMessage:
+    """流式响应中的一条消息
+
+    HTTP 响应与回放文件使用序列化后的一行 JSON，进程内的订阅方（WebSocket）直接使用对象；
+    两种形式都按需转换且只转换一次。
+    """
+    __slots__ = ("_data", "_line")
+
+    def __init__(self, data: Any = None, line: bytes = None):
+        self._data = data
+        self._line = line
+
+    @property
+    def data(self) -> Any:
+        if self._data is None and self._line is not None:
+            self._data = json.loads(self._line)
+        return self._data
+
+    @property
+    def line(self) -> bytes:
+        if self._line is None:
+            self._line = json.dumps(self._data, ensure_ascii=False).encode('utf-8') + b'\n'
+        return self._line
+
+
 @searchRouter.post("/deep-research/search")
 async def search(request: Request, params: Any = Body(None)):
     logger.info(f"=====params:{params}")
@@ -332,12 +367,47 @@ async def search(request: Request, params: Any = Body(None)):
     if result := validate_search_input(params):
         return result
 
+    async def encode_lines():
+        stream = search_stream(params)
+        try:
+            async for message in stream:
+                yield message.line
+        finally:
+            # 客户端断开时及时关闭消息流，结束回放文件录制
+            await stream.aclose()
+
+    return StreamingResponse(encode_lines(), media_type="application/json")
+
+
+def _subscribe_plan_events(plan_id: str, listener: Callable[[Any], None]):
+    for event_type in PLAN_EVENT_TYPES:
+        plan_report_event_manager.subscribe(event_type, plan_id, listener)
+
+
+def _unsubscribe_plan_events(plan_id: str, listener: Callable[[Any], None]):
+    for event_type in PLAN_EVENT_TYPES:
+        plan_report_event_manager.unsubscribe(event_type, plan_id, listener)
+
+
+def search_stream(params: dict) -> AsyncIterator[StreamMessage]:
+    """启动（或复用、回放）一次深度研究任务，返回其响应消息流
+
+    HTTP 接口与 WebSocket 路由共用该入口，WebSocket 在进程内直接消费消息对象，无需再经过本机 HTTP 请求。
+    调用方需先通过 validate_search_input 校验参数。
+    """
     session_info = params.get("sessionInfo", {})
     plan_id = session_info.get("messageSerialNumber", "")
     if not plan_id:
         # 退化方案：使用时间戳，建议前端传稳定ID
         plan_id = f"plan_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
 
+    live_mode = not (isinstance(params, dict) and params.get("replay"))
+    if live_mode and plan_stream_hub.has_topic(plan_id):
+        # 任务正在推送中（如同一任务在新的标签页打开）：直接加入广播，从头补齐已推送的消息
+        logger.info(f"Join running plan stream for plan_id: {plan_id}, "
+                    f"subscribers: {plan_stream_hub.subscriber_count(plan_id)}")
+        return plan_stream_hub.subscribe(plan_id, cursor=0)
+
     # 获取查询内容
     content_array = params.get('content', [])
     query_content = content_array[0]['value'] if content_array and isinstance(
@@ -366,40 +436,46 @@ async def search(request: Request, params: Any = Body(None)):
         latest_plan = None
         # 本次会话内已触发可信分析的步骤集合，避免重复分析
         analyzed_steps_local = set()
+        # 本次会话的计划增量编码器：首次与每隔N次发送全量，其余只发送变化部分
+        plan_encoder = PlanDeltaEncoder()
+        # 计划事件日志，仅由启动执行的请求创建；复用已有执行的请求只推送不写日志，保证每个计划只有一个写入者
+        event_log = None
 
         def append_create_plan_local(data: Any):
+            """计划事件的编码、落盘与入队在同一把锁内完成，保证增量补丁按版本顺序送达"""
+            if isinstance(data, (Plan, PlanSnapshot)):
+                with plan_encoder.lock:
+                    _append_plan_event(data)
+            else:
+                _append_plan_event(data)
+
+        def _append_plan_event(data: Any):
             """
-            将数据追加写入LOGS_PATH下按 plan_id 的文件，并将数据放入队列以发送给客户端
+            将数据追加写入LOGS_PATH下按 plan_id 的事件日志，并将数据放入队列以发送给客户端
 
             Args:
                 data: 要写入的数据（支持字典、列表等可JSON序列化的类型）
             """
             try:
-                # 针对当前 plan 的日志文件
-                file_path = Path(plan_log_path)
+                # 流式片段只推送给前端，不写入计划日志（完整内容随后以计划事件落盘）
+                if isinstance(data, dict) and data.get("event_type") == "plan_stream":
+                    if plan_queue is not None and main_loop is not None:
+                        asyncio.run_coroutine_threadsafe(plan_queue.put(data), main_loop)
+                    return
 
-                # 处理Plan对象转换为可序列化的dict
+                # 处理Plan快照转换为可序列化的dict（事件管理器推送的是不可变快照）
                 if isinstance(data, Plan):
+                    data = data.snapshot()
+                if isinstance(data, PlanSnapshot):
                     plan_obj = data
-                    plan_dict = {
-                        "title": plan_obj.title if hasattr(plan_obj, 'title') else "",
-                        "steps": plan_obj.steps if hasattr(plan_obj, 'steps') else [],
-                        "step_files": plan_obj.step_files if hasattr(plan_obj, 'step_files') else {},
-                        "step_statuses": plan_obj.step_statuses if hasattr(plan_obj, 'step_statuses') else {},
-                        "step_notes": plan_obj.step_notes if hasattr(plan_obj, 'step_notes') else {},
-                        "step_details": plan_obj.step_details if hasattr(plan_obj, 'step_details') else {},
-                        "step_tool_calls": plan_obj.step_tool_calls if hasattr(plan_obj, 'step_tool_calls') else {},
-                        "dependencies": {str(k): v for k, v in plan_obj.dependencies.items()} if hasattr(plan_obj,
-                                                                                                     'dependencies') else {},
-                        "progress": plan_obj.get_progress() if hasattr(plan_obj, 'get_progress') and callable(
-                            data.get_progress) else {},
-                        "result": plan_obj.get_plan_result() if hasattr(plan_obj, 'get_plan_result') and callable(
-                            data.get_plan_result) else ""
-                    }
-                    logger.info(f"step_files:{plan_obj.step_files}")
+                    change_type, plan_payload = plan_encoder.encode(plan_obj)
+                    if plan_payload is None:
+                        logger.info(f"Plan v{plan_obj.version} unchanged or stale, skip pushing for plan_id: {plan_id}")
+                        return
+                    logger.info(f"Encoded plan v{plan_obj.version} as {change_type} for plan_id: {plan_id}")
 
-                    # logger.info(f"Plan对象已转换为字典: {plan_dict}")
-                    data = plan_dict
+                    # 全量计划保持原有结构，增量补丁包裹在 plan_patch 中
+                    data = plan_payload if change_type == "replace" else {"plan_patch": plan_payload}
 
                     # 检查是否有新完成的步骤，触发可信分析（仅对当前会话内未分析的步骤触发一次）
                     try:
@@ -417,7 +493,7 @@ async def search(request: Request, params: Any = Body(None)):
                     except Exception as _e:
                         logger.error(f"触发可信分析失败: {_e}", exc_info=True)
                 # 处理工具事件数据
-                elif isinstance(data, dict) and data.get("event_type") in ["tool_start", "tool_complete", "tool_error"]:
+                elif isinstance(data, dict) and data.get("event_type") in TOOL_EVENT_TYPES:
                     # 对工具事件进行路径改写（包括嵌套 plan.processed_result.file_path 等）
                     try:
                         data = _rewrite_paths_in_payload(data)
@@ -425,44 +501,18 @@ async def search(request: Request, params: Any = Body(None)):
                         pass
                     logger.info(f"Tool event received: {data.get('event_type')} for {data.get('tool_name')} at step {data.get('step_index')}")
 
-                # 准备写入内容（自动处理不同类型）
-                if isinstance(data, (dict, list)):
-                    try:
-                        content = json.dumps(data, ensure_ascii=False, indent=2) + "\n"
-                    except TypeError as e:
-                        logger.error(f"JSON序列化失败，尝试转换对象: {e}", exc_info=True)
-                        # 尝试将复杂对象转换为字符串
-                        if isinstance(data, dict):
-                            serializable_data = {k: str(v) for k, v in data.items()}
-                        elif isinstance(data, list):
-                            serializable_data = [str(item) if not isinstance(item, (
-                            dict, list, str, int, float, bool, type(None))) else item for item in data]
-                        content = json.dumps(serializable_data, ensure_ascii=False, indent=2) + "\n"
-                else:
-                    content = str(data) + "\n"
-
-                # 追加写入当前 plan 的日志
-                with open(file_path, mode='a', encoding='utf-8') as f:
-                    f.write(content)
-
-                # 如果包含最终结果，单独落盘 final 文件
-                try:
+                # 追加到当前 plan 的事件日志（后台线程批量写入），包含最终结果时另存 final 文件
+                if event_log is not None:
+                    event_log.append(data)
                     if isinstance(data, dict) and data.get("result"):
-                        with open(plan_final_path, mode='w', encoding='utf-8') as ff:
-                            ff.write(json.dumps(data, ensure_ascii=False, indent=2))
-                except Exception as _:
-                    pass
+                        event_log.write_final(data)
 
                 # 将数据放入队列以便流式发送
                 if plan_queue is not None and main_loop is not None:
-                    if isinstance(data, Plan):
-                        logger.info(f"Pushing Plan data to queue for plan_id: {plan_id}")
-                        asyncio.run_coroutine_threadsafe(plan_queue.put(plan_dict), main_loop)
-                    else:
-                        # 非Plan（包括工具事件）在入队前再做一次路径改写兜底
-                        safe_data = _rewrite_paths_in_payload(data)
-                        logger.info(f"Pushing non-Plan data to queue: {type(data).__name__} for plan_id: {plan_id}")
-                        asyncio.run_coroutine_threadsafe(plan_queue.put(safe_data), main_loop)
+                    # 计划已在上面编码为字典；其他数据（包括工具事件）在入队前再做一次路径改写兜底
+                    safe_data = _rewrite_paths_in_payload(data)
+                    logger.info(f"Pushing {type(data).__name__} data to queue for plan_id: {plan_id}")
+                    asyncio.run_coroutine_threadsafe(plan_queue.put(safe_data), main_loop)
                 else:
                     logger.warning(f"Queue or main_loop is None, cannot push data for plan_id: {plan_id}")
 
@@ -483,21 +533,17 @@ async def search(request: Request, params: Any = Body(None)):
                 yield {"plan": final_obj}
                 return
             # 若存在历史日志且不在运行，回放日志后结束
-            if not TaskManager.is_running(plan_id) and os.path.exists(plan_log_path):
-                with open(plan_log_path, 'r', encoding='utf-8') as lf:
-                    for line in lf:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        try:
-                            obj = json.loads(line)
-                        except Exception:
-                            continue
-                        # 工具事件透传
-                        if isinstance(obj, dict) and obj.get("event_type") in ["tool_start", "tool_complete", "tool_error"]:
-                            yield {"plan": obj}
-                        else:
-                            yield {"plan": obj}
+            replay_log_path = find_plan_event_log(plan_log_path)
+            if not TaskManager.is_running(plan_id) and replay_log_path:
+                for obj in iter_plan_events(replay_log_path):
+                    # 工具事件透传
+                    if isinstance(obj, dict) and obj.get("event_type") in TOOL_EVENT_TYPES:
+                        yield {"plan": obj}
+                    # 增量补丁按原样回放
+                    elif isinstance(obj, dict) and "plan_patch" in obj:
+                        yield obj
+                    else:
+                        yield {"plan": obj}
                 return
         except Exception as _:
             # 回放失败时忽略，继续后续逻辑
@@ -511,11 +557,7 @@ async def search(request: Request, params: Any = Body(None)):
                 
                 # 先订阅事件，关联plan_id - 确保在CoSight初始化之前完成订阅
                 logger.info(f"Subscribing to events for plan_id: {plan_id}")
-                plan_report_event_manager.subscribe("plan_created", plan_id, append_create_plan_local)
-                plan_report_event_manager.subscribe("plan_updated", plan_id, append_create_plan_local)
-                plan_report_event_manager.subscribe("plan_process", plan_id, append_create_plan_local)
-                plan_report_event_manager.subscribe("plan_result", plan_id, append_create_plan_local)
-                plan_report_event_manager.subscribe("tool_event", plan_id, append_create_plan_local)
+                _subscribe_plan_events(plan_id, append_create_plan_local)
                 logger.info(f"Event subscription completed for plan_id: {plan_id}")
 
                 # 初始化CoSight并传入plan_id
@@ -535,27 +577,24 @@ async def search(request: Request, params: Any = Body(None)):
                 logger.error(f"CoSight执行错误: {e}", exc_info=True)
             finally:
                 # 执行完成后取消订阅
-                plan_report_event_manager.unsubscribe("plan_created", plan_id, append_create_plan_local)
-                plan_report_event_manager.unsubscribe("plan_updated", plan_id, append_create_plan_local)
-                plan_report_event_manager.unsubscribe("plan_process", plan_id, append_create_plan_local)
-                plan_report_event_manager.unsubscribe("plan_result", plan_id, append_create_plan_local)
-                plan_report_event_manager.unsubscribe("tool_event", plan_id, append_create_plan_local)
+                _unsubscribe_plan_events(plan_id, append_create_plan_local)
+                # 已发布的事件投递完后再关闭事件日志，避免丢失最后几条记录
+                if event_log is not None:
+                    plan_report_event_manager.call_when_delivered(plan_id, event_log.close)
                 # 清理TaskManager中的映射与运行态
                 TaskManager.mark_completed(plan_id)
                 TaskManager.remove_plan(plan_id)
 
-        # 幂等：若已在运行，仅订阅并复用已有执行；否则启动新执行
-        if TaskManager.is_running(plan_id):
-            # 仅订阅，将当前请求的队列作为新的监听者
-            logger.info(f"Task already running for plan_id: {plan_id}, subscribing to events")
-            plan_report_event_manager.subscribe("plan_created", plan_id, append_create_plan_local)
-            plan_report_event_manager.subscribe("plan_updated", plan_id, append_create_plan_local)
-            plan_report_event_manager.subscribe("plan_process", plan_id, append_create_plan_local)
-            plan_report_event_manager.subscribe("plan_result", plan_id, append_create_plan_local)
-            plan_report_event_manager.subscribe("tool_event", plan_id, append_create_plan_local)
+        # 幂等：正在运行的任务由 search_stream 加入其广播；这里仍在运行说明广播刚结束、任务正在收尾，
+        # 此时只临时监听事件，生成器结束时取消监听
+        listening = TaskManager.is_running(plan_id)
+        if listening:
+            logger.info(f"Task already running for plan_id: {plan_id}, listening until it finishes")
+            _subscribe_plan_events(plan_id, append_create_plan_local)
         else:
             TaskManager.mark_running(plan_id)
             logger.info(f"Starting new task for plan_id: {plan_id}")
+            event_log = PlanEventLog(plan_log_path, plan_final_path)
             import threading
             thread = threading.Thread(target=run_manus)
             thread.daemon = True
@@ -564,97 +603,119 @@ async def search(request: Request, params: Any = Body(None)):
         # 持续从队列获取数据并产生响应
         last_plan_fingerprint = None  # 避免相同计划重复发送
         emitted_credibility_keys = set()  # 避免同一步骤的可信分析重复发送
-        while True:
-            try:
-                # 等待队列中的数据，设置超时防止无限等待
-                data = await asyncio.wait_for(plan_queue.get(), timeout=60.0)
-                # logger.info(f"queue_data:{data}")
+        try:
+            while True:
+                try:
+                    # 等待队列中的数据，设置超时防止无限等待
+                    data = await asyncio.wait_for(plan_queue.get(), timeout=60.0)
+                    # logger.info(f"queue_data:{data}")
 
-                # 若为可信分析事件，直接透传，避免被包装为 plan
-                if isinstance(data, dict) and data.get("type") in ("credibility-analysis", "lui-message-credibility-analysis"):
-                    try:
-                        cred_key = f"{data.get('type')}|{data.get('stepTitle')}|{data.get('stepIndex')}"
-                    except Exception:
-                        cred_key = None
-                    if cred_key is None or cred_key not in emitted_credibility_keys:
-                        if cred_key is not None:
-                            emitted_credibility_keys.add(cred_key)
+                    # 若为可信分析事件，直接透传，避免被包装为 plan
+                    if isinstance(data, dict) and data.get("type") in ("credibility-analysis", "lui-message-credibility-analysis"):
+                        try:
+                            cred_key = f"{data.get('type')}|{data.get('stepTitle')}|{data.get('stepIndex')}"
+                        except Exception:
+                            cred_key = None
+                        if cred_key is None or cred_key not in emitted_credibility_keys:
+                            if cred_key is not None:
+                                emitted_credibility_keys.add(cred_key)
+                            yield data
+                        continue
+
+                    # 兼容：可信分析被包裹在 plan 中
+                    if (
+                        isinstance(data, dict)
+                        and isinstance(data.get("plan"), dict)
+                        and data["plan"].get("type") in ("credibility-analysis", "lui-message-credibility-analysis")
+                    ):
+                        yield data["plan"]
+                        continue
+
+                    # 工具事件（裸 dict），直接透传且不更新latest_plan（避免保活重复发送工具事件）
+                    if isinstance(data, dict) and data.get("event_type") in TOOL_EVENT_TYPES:
+                        # 工具事件直接透传，不包装在plan中
                         yield data
-                    continue
-
-                # 兼容：可信分析被包裹在 plan 中
-                if (
-                    isinstance(data, dict)
-                    and isinstance(data.get("plan"), dict)
-                    and data["plan"].get("type") in ("credibility-analysis", "lui-message-credibility-analysis")
-                ):
-                    yield data["plan"]
-                    continue
+                        continue
 
-                # 工具事件（裸 dict），直接透传且不更新latest_plan（避免保活重复发送工具事件）
-                if isinstance(data, dict) and data.get("event_type") in ["tool_start", "tool_complete", "tool_error"]:
-                    # 工具事件直接透传，不包装在plan中
-                    yield data
-                    continue
-
-                # 计划结果完成
-                if isinstance(data, dict) and "result" in data and data['result']:
+                    # 最终总结/步骤备注的流式片段，直接透传且不更新latest_plan
+                    if isinstance(data, dict) and data.get("event_type") == "plan_stream":
+                        yield data
+                        continue
+
+                    # 计划增量补丁：合并到最新计划上（供保活与出错时使用），并原样下发
+                    if isinstance(data, dict) and isinstance(data.get("plan_patch"), dict):
+                        if isinstance(latest_plan, dict):
+                            latest_plan = apply_plan_patch(latest_plan, data["plan_patch"])
+                        running_patch = dict(data["plan_patch"])
+                        running_patch["statusText"] = "正在执行中"
+                        yield {"plan_patch": running_patch}
+                        continue
+
+                    # 计划结果完成
+                    if isinstance(data, dict) and "result" in data and data['result']:
+                        latest_plan = data
+                        completed_plan = dict(latest_plan)
+                        completed_plan["statusText"] = "执行完成"
+                        yield {"plan": completed_plan}
+                        break
+
+                    # 更新最新plan数据（非工具事件）
                     latest_plan = data
-                    completed_plan = dict(latest_plan)
-                    completed_plan["statusText"] = "执行完成"
-                    yield {"plan": completed_plan}
-                    break
-
-                # 更新最新plan数据（非工具事件）
-                latest_plan = data
-                running_plan = dict(latest_plan) if isinstance(latest_plan, dict) else latest_plan
-                if isinstance(running_plan, dict):
-                    running_plan["statusText"] = "正在执行中"
-                # 发送完整的plan（去重）
-                try:
-                    import hashlib as _hashlib
-                    plan_fp = _hashlib.md5(json.dumps(running_plan, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest() if isinstance(running_plan, dict) else None
-                except Exception:
-                    plan_fp = None
-                if plan_fp is None or plan_fp != last_plan_fingerprint:
-                    last_plan_fingerprint = plan_fp
-                    yield {"plan": running_plan}
-
-            except asyncio.TimeoutError:
-                # 超时，仅发送保活状态。若有最新非工具计划，则基于其发送；否则发送默认等待计划
-                if latest_plan and isinstance(latest_plan, dict):
-                    waiting_plan = dict(latest_plan)
-                    waiting_plan["statusText"] = "等待计划更新..."
+                    running_plan = dict(latest_plan) if isinstance(latest_plan, dict) else latest_plan
+                    if isinstance(running_plan, dict):
+                        running_plan["statusText"] = "正在执行中"
+                    # 发送完整的plan（去重）
                     try:
                         import hashlib as _hashlib
-                        plan_fp = _hashlib.md5(json.dumps(waiting_plan, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+                        plan_fp = _hashlib.md5(json.dumps(running_plan, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest() if isinstance(running_plan, dict) else None
                     except Exception:
                         plan_fp = None
                     if plan_fp is None or plan_fp != last_plan_fingerprint:
                         last_plan_fingerprint = plan_fp
-                        yield {"plan": waiting_plan}
-                else:
-                    contains_chinese = any('\u4e00' <= c <= '\u9fff' for c in query_content)
-                    title = "等待任务执行" if contains_chinese else "Waiting for task execution"
-                    default_plan = {"title": title, "statusText": "等待计划更新...", "steps": []}
-                    try:
-                        import hashlib as _hashlib
-                        plan_fp = _hashlib.md5(json.dumps(default_plan, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
-                    except Exception:
-                        plan_fp = None
-                    if plan_fp is None or plan_fp != last_plan_fingerprint:
-                        last_plan_fingerprint = plan_fp
-                        yield {"plan": default_plan}
-            except Exception as e:
-                logger.error(f"生成响应错误: {e}", exc_info=True)
-                # 发送错误状态，但保留最新plan
-                if latest_plan and isinstance(latest_plan, dict):
-                    error_plan = dict(latest_plan)
-                    error_plan["statusText"] = f"生成响应出错: {str(e)}"
-                    yield {"plan": error_plan}
-                else:
-                    yield {"plan": {"title": "任务出错", "statusText": f"生成响应出错: {str(e)}", "steps": []}}
-                break
+                        yield {"plan": running_plan}
+
+                except asyncio.TimeoutError:
+                    if listening and not TaskManager.is_running(plan_id):
+                        # 收尾中的任务已结束，结果在开始监听前已送出
+                        break
+                    # 超时，仅发送保活状态。若有最新非工具计划，则基于其发送；否则发送默认等待计划
+                    if latest_plan and isinstance(latest_plan, dict):
+                        waiting_plan = dict(latest_plan)
+                        waiting_plan["statusText"] = "等待计划更新..."
+                        try:
+                            import hashlib as _hashlib
+                            plan_fp = _hashlib.md5(json.dumps(waiting_plan, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+                        except Exception:
+                            plan_fp = None
+                        if plan_fp is None or plan_fp != last_plan_fingerprint:
+                            last_plan_fingerprint = plan_fp
+                            yield {"plan": waiting_plan}
+                    else:
+                        contains_chinese = any('\u4e00' <= c <= '\u9fff' for c in query_content)
+                        title = "等待任务执行" if contains_chinese else "Waiting for task execution"
+                        default_plan = {"title": title, "statusText": "等待计划更新...", "steps": []}
+                        try:
+                            import hashlib as _hashlib
+                            plan_fp = _hashlib.md5(json.dumps(default_plan, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+                        except Exception:
+                            plan_fp = None
+                        if plan_fp is None or plan_fp != last_plan_fingerprint:
+                            last_plan_fingerprint = plan_fp
+                            yield {"plan": default_plan}
+                except Exception as e:
+                    logger.error(f"生成响应错误: {e}", exc_info=True)
+                    # 发送错误状态，但保留最新plan
+                    if latest_plan and isinstance(latest_plan, dict):
+                        error_plan = dict(latest_plan)
+                        error_plan["statusText"] = f"生成响应出错: {str(e)}"
+                        yield {"plan": error_plan}
+                    else:
+                        yield {"plan": {"title": "任务出错", "statusText": f"生成响应出错: {str(e)}", "steps": []}}
+                    break
+        finally:
+            if listening:
+                _unsubscribe_plan_events(plan_id, append_create_plan_local)
+
 
     async def generate_stream_response(generator_func, params):
         try:
@@ -677,7 +738,7 @@ async def search(request: Request, params: Any = Body(None)):
                 # 工具事件（直接透传），注意空值判断
                 elif (
                     isinstance(response_data, dict)
-                    and response_data.get("event_type") in ["tool_start", "tool_complete", "tool_error"]
+                    and response_data.get("event_type") in TOOL_EVENT_TYPES
                 ):
                     try:
                         logger.info("发送工具事件到前端")
@@ -711,6 +772,28 @@ async def search(request: Request, params: Any = Body(None)):
                         "changeType": "append",
                         "content": response_data["plan"]
                     }
+                elif isinstance(response_data, dict) and response_data.get("event_type") == "plan_stream":
+                    # 最终总结或步骤备注的流式片段，前端追加到对应字段上
+                    response_json = {
+                        "contentType": "lui-message-manus-step",
+                        "sessionInfo": params.get("sessionInfo", {}),
+                        "code": 0,
+                        "message": "ok",
+                        "task": "chat",
+                        "changeType": "append",
+                        "content": response_data
+                    }
+                elif isinstance(response_data, dict) and "plan_patch" in response_data:
+                    # 计划增量，前端按 version/base_version 合并到已有计划上
+                    response_json = {
+                        "contentType": "lui-message-manus-step",
+                        "sessionInfo": params.get("sessionInfo", {}),
+                        "code": 0,
+                        "message": "ok",
+                        "task": "chat",
+                        "changeType": "patch",
+                        "content": response_data["plan_patch"]
+                    }
                 elif isinstance(response_data, dict) and "plan" in response_data:
                     # 计划事件使用原有的contentType
                     try:
@@ -742,13 +825,13 @@ async def search(request: Request, params: Any = Body(None)):
                         "content": response_data  # 直接使用数据作为content
                     }
 
-                yield json.dumps(response_json, ensure_ascii=False).encode('utf-8') + b'\n'
+                yield StreamMessage(response_json)
                 await asyncio.sleep(0)
 
         except Exception as exc:
             error_msg = "生成回复时发生错误。"
             logger.exception(error_msg)
-            error_response = json.dumps({
+            yield StreamMessage({
                 "contentType": "lui-message-manus-step",
                 "content": {"intro": error_msg, "steps": []},
                 "sessionInfo": params.get("sessionInfo", {}),
@@ -756,15 +839,17 @@ async def search(request: Request, params: Any = Body(None)):
                 "message": "error",
                 "task": "chat",
                 "changeType": "replace"
-            }, ensure_ascii=False).encode('utf-8') + b'\n'
-            yield error_response
+            })
 
     async def RecordGenerator(workspace_path=None):
         """两种模式的生成器：
         - 记录模式（默认）：将 generate_stream_response 产生的每一行写入当前 WORKSPACE_PATH 下的 replay.json，同时正常向前端 yield
-        - 回放模式：从 replay.json 读取历史数据，按行每 2 秒 yield 一次
+        - 回放模式：从 replay.json 读取历史数据逐条 yield，借助回放索引可从任意消息开始
         
-        回放模式触发条件：params 中存在键 'replay' 且为真值
+        回放模式触发条件：params 中存在键 'replay' 且为真值。回放参数（均可选）：
+        - replayStart: 从第几条消息开始（从 0 计）
+        - replayPacing: original 按录制时的间隔，fixed 固定每条 0.3 秒（默认），instant 不等待
+        - replaySpeed: 播放倍速，默认 1
         """
         try:
             replay_mode = bool(params.get("replay", False)) if isinstance(params, dict) else False
@@ -837,18 +922,19 @@ async def search(request: Request, params: Any = Body(None)):
                 logger.info(f"文件是否存在: {os.path.exists(replay_file_path) if replay_file_path else False}")
                 
                 if replay_file_path and os.path.exists(replay_file_path):
-                    with open(replay_file_path, 'r', encoding='utf-8') as rf:
-                        for line in rf:
-                            line = line.rstrip('\n')
-                            if not line:
-                                await asyncio.sleep(0.3)
-                                continue
-                            try:
-                                yield line.encode('utf-8') + b'\n'
-                            except Exception:
-                                # 如果编码失败，忽略该行
-                                pass
-                            await asyncio.sleep(0.3)
+                    replay_start = int(params.get("replayStart") or 0)
+                    pacing = params.get("replayPacing") or "fixed"
+                    speed = float(params.get("replaySpeed") or 1.0)
+                    logger.info(f"回放参数: start={replay_start}, pacing={pacing}, speed={speed}")
+                    previous_ts, first = None, True
+                    # 索引查询与文件读取在线程中进行，回放大文件时不阻塞其他连接
+                    async for ts, line in aiter_replay(replay_index, os.path.dirname(replay_file_path), replay_start):
+                        if not first:
+                            delay = replay_delay(pacing, speed, 0.3, previous_ts, ts)
+                            if delay > 0:
+                                await asyncio.sleep(delay)
+                        previous_ts, first = ts, False
+                        yield StreamMessage(line=line + b'\n')
                     return
                 else:
                     # 没有历史回放文件，输出一条提示信息
@@ -861,41 +947,69 @@ async def search(request: Request, params: Any = Body(None)):
                         "changeType": "replace",
                         "content": {"title": "回放文件不存在", "steps": [], "statusText": "无可回放内容"}
                     }
-                    yield json.dumps(fallback, ensure_ascii=False).encode('utf-8') + b'\n'
+                    yield StreamMessage(fallback)
                     return
             except Exception as e:
                 logger.error(f"回放模式失败: {e}", exc_info=True)
                 # 回退到记录模式
                 replay_mode = False
 
-        # 记录模式：包裹现有流并写入文件
-        async for chunk in generate_stream_response(generator_func, params):
-            try:
-                if replay_file_path:
-                    try:
-                        # chunk 为 bytes，直接解码并按行写入
-                        text = chunk.decode('utf-8')
-                    except Exception:
-                        try:
-                            text = str(chunk)
-                        except Exception:
-                            text = ''
-                    if text:
-                        with open(replay_file_path, 'a', encoding='utf-8') as wf:
-                            # 统一确保每条记录以换行结束
-                            if text.endswith('\n'):
-                                wf.write(text)
-                            else:
-                                wf.write(text + '\n')
-            except Exception as _e:
-                logger.error(f"写入回放文件失败: {_e}", exc_info=True)
+        # 记录模式：包裹现有流并写入文件，同时更新回放索引；流结束或被取消时关闭文件
+        recorder = ReplayRecorder(replay_index, os.path.dirname(replay_file_path)) if replay_file_path else None
+        try:
+            async for message in generate_stream_response(generator_func, params):
+                try:
+                    if recorder is not None:
+                        # 序列化后的行交给后台写线程写入，HTTP 响应复用同一份序列化结果
+                        await recorder.write(message.line)
+                except Exception as _e:
+                    logger.error(f"写入回放文件失败: {_e}", exc_info=True)
+
+                yield message
+        finally:
+            if recorder is not None:
+                recorder.close()
 
-            yield chunk
+    if not live_mode:
+        return RecordGenerator(work_space_path_time)
+    return _broadcast_plan_stream(plan_id, RecordGenerator(work_space_path_time))
 
-    return StreamingResponse(
-        RecordGenerator(work_space_path_time),
-        media_type="application/json"
-    )
+
+def _is_plan_snapshot(message: StreamMessage) -> bool:
+    """完整计划消息，积压过多的订阅者可以从这里续上"""
+    data = message.data
+    return (isinstance(data, dict) and data.get("contentType") == "lui-message-manus-step"
+            and data.get("changeType") == "replace")
+
+
+def _broadcast_plan_stream(plan_id: str, source) -> Subscription:
+    """在后台消费任务的消息流并按 plan_id 广播，返回发起请求的订阅
+
+    消息只序列化一次（同时用于回放录制与各订阅者）。任务运行期间主题一直保留，之后打开的页面可以从头加入；
+    任务不在运行且所有订阅者断开超过 BROADCAST_IDLE_SECONDS 后停止推送。
+    """
+    subscription = plan_stream_hub.subscribe(plan_id)
+    plan_stream_hub.pin(plan_id)
+
+    async def pump():
+        try:
+            async for message in source:
+                if (not plan_stream_hub.has_topic(plan_id)
+                        or (not TaskManager.is_running(plan_id)
+                            and plan_stream_hub.idle_for(plan_id) > plan_stream_hub.idle_seconds)):
+                    logger.info(f"No subscribers for plan_id: {plan_id}, stop streaming")
+                    break
+                plan_stream_hub.publish(plan_id, message, len(message.line), _is_plan_snapshot(message))
+        except Exception as e:
+            logger.error(f"Plan stream of plan_id {plan_id} failed: {e}", exc_info=True)
+        finally:
+            await source.aclose()
+            plan_stream_hub.close(plan_id)
+
+    task = asyncio.get_running_loop().create_task(pump())
+    _plan_pump_tasks.add(task)
+    task.add_done_callback(_plan_pump_tasks.discard)
+    return subscription
 
 
 @searchRouter.get("/search-results")
@@ -1065,56 +1179,27 @@ async def show_search_results(request: Request, query: str = "", tool: str = "",
 
 
 @searchRouter.get("/replay/workspaces")
-async def get_replay_workspaces():
-    """获取所有包含replay.json的工作区列表"""
-    workspaces = []
-    
-    # 使用环境变量中的work_space_path
-    work_space_base = work_space_path
-    
-    if os.path.exists(work_space_base):
-        for folder_name in sorted(os.listdir(work_space_base), reverse=True):
-            folder_path = os.path.join(work_space_base, folder_name)
-            replay_file_path = os.path.join(folder_path, "replay.json")
-            
-            if os.path.isdir(folder_path) and os.path.exists(replay_file_path):
-                title = "未命名任务"
-                message_count = 0
-                
-                try:
-                    with open(replay_file_path, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                        message_count = len(lines)
-                        
-                        if lines:
-                            first_line_data = json.loads(lines[0])
-                            content = first_line_data.get('content', {})
-                            if isinstance(content, dict):
-                                title = content.get('title', '未命名任务')
-                            elif isinstance(content, str):
-                                try:
-                                    content_obj = json.loads(content)
-                                    title = content_obj.get('title', '未命名任务')
-                                except:
-                                    pass
-                except Exception as e:
-                    logger.warning(f"读取replay文件失败: {replay_file_path}, 错误: {e}")
-                    continue
-                
-                # 获取文件修改时间
-                mtime = os.path.getmtime(replay_file_path)
-                
-                workspaces.append({
-                    "workspace_name": folder_name,
-                    "workspace_path": f"work_space/{folder_name}",
-                    "title": title,
-                    "created_time": datetime.fromtimestamp(mtime).isoformat(),
-                    "message_count": message_count,
-                    "replay_file": f"work_space/{folder_name}/replay.json"
-                })
+async def get_replay_workspaces(offset: int = 0, limit: int = 0):
+    """获取所有包含replay.json的工作区列表，按创建时间倒序
+
+    Args:
+        offset: 分页起始位置
+        limit: 每页数量，0 表示返回全部
+    """
+    # 标题与消息数取自回放索引，不再逐个读取回放文件；首次调用时会为历史工作区补建索引，之后只查询索引
+    total, rows = await asyncio.to_thread(replay_index.list_workspaces, offset, limit)
+    workspaces = [{
+        "workspace_name": row["name"],
+        "workspace_path": f"work_space/{row['name']}",
+        "title": row["title"],
+        "created_time": datetime.fromtimestamp(row["updated_at"]).isoformat(),
+        "message_count": row["message_count"],
+        "replay_file": f"work_space/{row['name']}/replay.json"
+    } for row in rows]
     
     return {
         "code": 0,
         "message": "success",
-        "data": workspaces
+        "data": workspaces,
+        "total": total
     }
@@ -13,15 +13,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import asyncio
 import json
+import time
 import uuid
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-import aiohttp
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from fastapi.websockets import WebSocketState
 
+from cosight_server.deep_research.routers.search import search_stream, validate_search_input
+from cosight_server.deep_research.services.broadcast_hub import BroadcastHub, Subscription
 from cosight_server.deep_research.services.i18n_service import i18n
-from cosight_server.sdk.common.config import custom_config
 from app.common.logger_util import get_logger
 from cosight_server.sdk.common.utils import get_timestamp
 
@@ -34,6 +37,10 @@ class WebsocketManager:
         self.active_clients: List[WebSocket] = []
         # 维护 topic 到最新 WebSocket 的映射（用于断线重连后路由消息）
         self.topic_to_ws: dict[str, WebSocket] = {}
+        # 按 topic 广播的消息：每条消息只序列化一次，绑定该 topic 的每个连接各自按游标发送
+        self.hub = BroadcastHub()
+        # 结构: {id(ws): {topic: 发送任务}}
+        self._senders: Dict[int, Dict[str, asyncio.Task]] = {}
 
     async def connect(self, ws: WebSocket):
         # 等待连接
@@ -49,6 +56,8 @@ class WebsocketManager:
         topics_to_remove = [topic for topic, mapped_ws in self.topic_to_ws.items() if mapped_ws is ws]
         for topic in topics_to_remove:
             self.topic_to_ws.pop(topic, None)
+        for task in self._senders.pop(id(ws), {}).values():
+            task.cancel()
 
     @staticmethod
     async def send_message(message: str, ws: WebSocket):
@@ -60,23 +69,69 @@ class WebsocketManager:
         # 发送个人消息
         await ws.send_json(data)
 
-    def bind_topic(self, topic: str, ws: WebSocket):
-        if topic:
-            self.topic_to_ws[topic] = ws
+    def bind_topic(self, topic: str, ws: WebSocket, cursor: Optional[int] = None):
+        """让该连接接收 topic 的消息；cursor 为消息序号（seq），给出时先补发该序号之后的历史消息"""
+        if not topic:
+            return
+        self.topic_to_ws[topic] = ws
+        senders = self._senders.setdefault(id(ws), {})
+        sender = senders.get(topic)
+        if sender is not None and not sender.done():
+            if cursor is None:
+                return
+            sender.cancel()
+        subscription = self.hub.subscribe(topic, cursor)
+        senders[topic] = asyncio.get_running_loop().create_task(self._send_loop(ws, subscription))
+
+    async def _send_loop(self, ws: WebSocket, subscription: Subscription):
+        """按序把订阅到的消息发给一个连接，发送慢只影响该连接自身"""
+        try:
+            async for frame in subscription:
+                await ws.send_text(frame)
+            if subscription.evicted:
+                logger.warning(f"websocket too slow, stop sending topic: {subscription.topic}")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"stop sending topic {subscription.topic} to websocket: {e}")
+        finally:
+            subscription.close()
+            senders = self._senders.get(id(ws))
+            if senders is not None and senders.get(subscription.topic) is asyncio.current_task():
+                del senders[subscription.topic]
 
     def get_ws_for_topic(self, topic: str) -> Optional[WebSocket]:
         return self.topic_to_ws.get(topic)
 
+    def has_listeners(self, topic: str, default_ws: Optional[WebSocket] = None) -> bool:
+        """topic 是否仍有连接在接收；default_ws 为直接发送的连接（如发起任务的连接），仍打开时也计入"""
+        if self.hub.subscriber_count(topic) > 0:
+            return True
+        return (default_ws is not None and default_ws.client_state == WebSocketState.CONNECTED
+                and default_ws.application_state == WebSocketState.CONNECTED)
+
     async def send_json_to_topic(self, topic: str, data: dict, default_ws: Optional[WebSocket] = None):
-        ws = self.get_ws_for_topic(topic) or default_ws
-        if ws is not None:
-            logger.info(f"send_json_to_topic >>>>>>>>>>>>>> topic: {topic}, data: {data}")
-            await ws.send_json(data)
+        # 带上序号，前端可据此在重新订阅时指定 cursor 补齐
+        frame = json.dumps(dict(data, seq=self.hub.next_seq(topic)), ensure_ascii=False)
+        listening = self.has_listeners(topic)
+        self.hub.publish(topic, frame, len(frame), _is_snapshot_frame(data))
+        logger.debug(f"send_json_to_topic >>>>>>>>>>>>>> topic: {topic}, bytes: {len(frame)}")
+        if not listening and default_ws is not None:
+            await default_ws.send_text(frame)
 
     async def broadcast(self, message: str):
-        # 广播消息
-        for client in self.active_clients:
-            await client.send_text(message)
+        # 广播消息，并发发送，单个连接发送慢不影响其他连接
+        results = await asyncio.gather(*(client.send_text(message) for client in list(self.active_clients)),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.info(f"broadcast to websocket failed: {result}")
+
+
+def _is_snapshot_frame(data: dict) -> bool:
+    """完整计划消息，积压过多的连接可以从这里续上"""
+    message = data.get("data") or {}
+    return message.get("type") == "lui-message-manus-step" and message.get("changeType") == "replace"
 
 
 manager = WebsocketManager()
@@ -112,8 +167,9 @@ async def websocket_handler(
             # 处理订阅动作，允许前端仅通过 topic 绑定路由（刷新后无需立即发起新任务即可接收后续消息）
             if data.get("action") == "subscribe":
                 topic = data.get("topic")
-                manager.bind_topic(topic, websocket)
-                logger.info(f"bind topic >>> {topic} to current websocket")
+                cursor = data.get("cursor")
+                manager.bind_topic(topic, websocket, cursor if isinstance(cursor, int) else None)
+                logger.info(f"bind topic >>> {topic} to current websocket, cursor: {cursor}")
                 continue
             if data.get("action") == "message":
                 message = json.loads(data.get("data"))
@@ -136,7 +192,7 @@ async def websocket_handler(
                     }
                 }, websocket)
 
-                await _send_resp(websocket, cookie, data.get("topic"), message, lang)
+                await _send_resp(websocket, data.get("topic"), message, lang)
 
 
         # Ended by AICoder, pid:cd2a2pa21827c9b148ae08eff0221b0be93612b0
@@ -147,8 +203,7 @@ async def websocket_handler(
 
 
 # Started by AICoder, pid:wb967gf743u19051414d0be1f088122a49b62acf
-async def _send_resp(websocket, cookie, topic, message, lang):
-    cookie_str = "; ".join([f"{key}={value}" for key, value in cookie.items()])
+async def _send_resp(websocket, topic, message, lang):
     assistants = [mention['name'] for mention in message['mentions']]
     params = {
         "content": message.get("initData"),
@@ -189,16 +244,12 @@ async def _send_resp(websocket, cookie, topic, message, lang):
             params.setdefault("sessionInfo", {})["messageSerialNumber"] = replay_plan_id
     except Exception:
         pass
-    url = f'http://127.0.0.1:{custom_config.get("search_port")}{custom_config.get("base_api_url")}/deep-research/search'
-    headers = {
-        "content-type": "application/json;charset=utf-8",
-        "Cookie": cookie_str,
-    }
     try:
-        if params.get("stream", False):
-            await _stream_handler(params, url, headers, topic, websocket)
+        # 参数不合法时直接返回提示，否则在进程内订阅任务的消息流
+        if resp := validate_search_input(params):
+            await _no_stream_handler(resp, topic, websocket)
         else:
-            await _no_stream_handler(params, url, headers, topic, websocket)
+            await _stream_handler(params, topic, websocket)
     except Exception as e:
         logger.error(f"response websocket error: {e}", exc_info=True)
 
@@ -206,161 +257,96 @@ async def _send_resp(websocket, cookie, topic, message, lang):
 # Ended by AICoder, pid:wb967gf743u19051414d0be1f088122a49b62acf
 
 
-async def _stream_handler(params, url, headers, topic, websocket):
+async def _stream_handler(params, topic, websocket):
     msg_uuid = str(uuid.uuid4())
-    
-    # 设置更大的读取限制，避免大消息块被截断
-    # 通过修改 aiohttp 的内部限制
-    import aiohttp
-    import aiohttp.streams
-    
-    # 设置读取超时为无限，避免长时间无数据导致 TimeoutError
-    timeout = aiohttp.ClientTimeout(sock_read=None, total=None)
     sessionInfo = params.get('sessionInfo', {})
     # 若未显式指定回放的 planId，则为本次新流生成 messageSerialNumber
     if not sessionInfo.get('messageSerialNumber'):
         sessionInfo['messageSerialNumber'] = msg_uuid
     params['sessionInfo'] = sessionInfo
-    # 设置连接器，提高连接池限制
-    connector = aiohttp.TCPConnector(limit=100, limit_per_host=30)
-    
-    # 保存原始限制并将默认限制调大，避免单行/单块过大错误
-    original_limit = getattr(aiohttp.streams, '_DEFAULT_LIMIT', 2**16)  # 64KB
-    aiohttp.streams._DEFAULT_LIMIT = 2 * 1024 * 1024 * 1024  # 2GB
-    
+
+    control_sent = False
+    idle_since = None
+    stream = search_stream(params)
     try:
-        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
-            async with session.post(url=url, json=params, headers=headers) as response:
-                # 尝试将实例级读取限制也放大，避免readline触发Chunk too big
-                try:
-                    reader = getattr(response, 'content', None)
-                    big_limit = 2 * 1024 * 1024 * 1024  # 2GB
-                    if reader is not None and hasattr(reader, '_limit'):
-                        reader._limit = big_limit
-                        logger.info(f"aiohttp StreamReader instance limit set to {big_limit}")
-                except Exception:
-                    pass
-                control_sent = False
-                # 为规避 aiohttp 对单行的内置限制，这里改为按块读取并按换行还原行，不会拆分业务消息
-                buffer = b''
-                try:
-                    async for chunk in response.content.iter_chunked(64 * 1024):
-                        if not chunk:
-                            continue
-                        buffer += chunk
-                        while True:
-                            nl_pos = buffer.find(b'\n')
-                            if nl_pos == -1:
-                                break
-                            line = buffer[:nl_pos + 1]
-                            buffer = buffer[nl_pos + 1:]
-                            decoded_line = line.decode('utf-8', errors='ignore')
-                            try:
-                                line_json = json.loads(decoded_line)
-                            except json.JSONDecodeError:
-                                # 非完整JSON行，跳过
-                                continue
-
-                            msg_type = line_json.get("contentType") if line_json.get("contentType") is not None else "multi-modal"
-                            init_data = line_json.get("content") if line_json.get("content") is not None else [
-                                {"type": "text", "value": i18n.t('unknown_message')}]
-                            change_type = line_json.get("changeType") if line_json.get("changeType") is not None else "append"
-
-                            await manager.send_json_to_topic(topic, {
-                                "topic": topic,
-                                "data": {
-                                    "type": msg_type,
-                                    "uuid": msg_uuid,
-                                    "timestamp": get_timestamp(),
-                                    "from": "ai",
-                                    "changeType": change_type,
-                                    "initData": init_data,
-                                    "headFoldConfig": line_json.get("headFoldConfig"),
-                                    "roleInfo": line_json.get("roleInfo"),
-                                    "status": line_json.get("status"),
-                                    "extra": line_json.get("extra"),
-                                    "styles": {"width": "100%"}
-                                }
-                            }, websocket)
-
-                            # 如果这是plan更新数据，且progress显示已全部完成，则发送结束控制
-                            try:
-                                if (not control_sent) and msg_type == "lui-message-manus-step" and isinstance(init_data, dict):
-                                    progress = init_data.get("progress") or {}
-                                    total = int(progress.get("total") or 0)
-                                    completed = int(progress.get("completed") or 0)
-                                    if total > 0 and completed >= total:
-                                        # 先让出事件循环，确保上面的最终PLAN更新已被前端渲染
-                                        import asyncio as _asyncio
-                                        await _asyncio.sleep(0)
-                                        await manager.send_json_to_topic(topic, {
-                                            "topic": topic,
-                                            "data": {
-                                                "type": "control-status-message",
-                                                "initData": {
-                                                    "status": "finished_successfully"
-                                                }
-                                            }
-                                        }, websocket)
-                                        control_sent = True
-                                        # 计划已完成，后续如仍有流数据，继续透传；不强制关闭连接
-                            except Exception:
-                                # 解析或字段缺失不阻断主流程
-                                pass
-                except Exception:
-                    # 发生读取异常（包含超时），尝试把缓冲区中已到达的完整行消费掉
-                    while True:
-                        nl_pos = buffer.find(b'\n')
-                        if nl_pos == -1:
-                            break
-                        line = buffer[:nl_pos + 1]
-                        buffer = buffer[nl_pos + 1:]
-                        decoded_line = line.decode('utf-8', errors='ignore')
-                        try:
-                            line_json = json.loads(decoded_line)
-                        except json.JSONDecodeError:
-                            continue
-                        msg_type = line_json.get("contentType") if line_json.get("contentType") is not None else "multi-modal"
-                        init_data = line_json.get("content") if line_json.get("content") is not None else [
-                            {"type": "text", "value": i18n.t('unknown_message')}]
-                        change_type = line_json.get("changeType") if line_json.get("changeType") is not None else "append"
-                        await manager.send_json_to_topic(topic, {
-                            "topic": topic,
-                            "data": {
-                                "type": msg_type,
-                                "uuid": msg_uuid,
-                                "timestamp": get_timestamp(),
-                                "from": "ai",
-                                "changeType": change_type,
-                                "initData": init_data,
-                                "headFoldConfig": line_json.get("headFoldConfig"),
-                                "roleInfo": line_json.get("roleInfo"),
-                                "status": line_json.get("status"),
-                                "extra": line_json.get("extra"),
-                                "styles": {"width": "100%"}
-                            }
-                        }, websocket)
-                    return
-    finally:
-        # 恢复原始限制
-        aiohttp.streams._DEFAULT_LIMIT = original_limit
+        async for message in stream:
+            # 该 topic 已没有任何连接（页面关闭且未重连）一段时间后停止推送
+            if manager.has_listeners(topic, websocket):
+                idle_since = None
+            elif idle_since is None:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since > manager.hub.idle_seconds:
+                logger.info(f"no websocket for topic {topic}, stop streaming")
+                break
+
+            try:
+                line_json = message.data
+            except json.JSONDecodeError:
+                # 回放文件中不完整的行，跳过
+                continue
 
+            msg_type = line_json.get("contentType") if line_json.get("contentType") is not None else "multi-modal"
+            init_data = line_json.get("content") if line_json.get("content") is not None else [
+                {"type": "text", "value": i18n.t('unknown_message')}]
+            change_type = line_json.get("changeType") if line_json.get("changeType") is not None else "append"
 
-async def _no_stream_handler(params, url, headers, topic, websocket):
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url=url, json=params, headers=headers) as response:
-            resp = await response.json()
-            logger.info(f"/deep-research/search >>>>>>>>>>> resp: {resp}")
-            await manager.send_json({
+            await manager.send_json_to_topic(topic, {
                 "topic": topic,
                 "data": {
-                    "type": resp.get("contentType") or "multi-modal",
-                    "uuid": str(uuid.uuid4()),
+                    "type": msg_type,
+                    "uuid": msg_uuid,
                     "timestamp": get_timestamp(),
                     "from": "ai",
-                    "initData": resp.get("content"),
-                    "promptSentences": resp.get("promptSentences") or [],
-                    "roleInfo": resp.get("roleInfo"),
-                    "extra": resp.get("extra")
+                    "changeType": change_type,
+                    "initData": init_data,
+                    "headFoldConfig": line_json.get("headFoldConfig"),
+                    "roleInfo": line_json.get("roleInfo"),
+                    "status": line_json.get("status"),
+                    "extra": line_json.get("extra"),
+                    "styles": {"width": "100%"}
                 }
             }, websocket)
+
+            # 如果这是plan更新数据，且progress显示已全部完成，则发送结束控制
+            try:
+                if (not control_sent) and msg_type == "lui-message-manus-step" and isinstance(init_data, dict):
+                    progress = init_data.get("progress") or {}
+                    total = int(progress.get("total") or 0)
+                    completed = int(progress.get("completed") or 0)
+                    if total > 0 and completed >= total:
+                        # 先让出事件循环，确保上面的最终PLAN更新已被前端渲染
+                        await asyncio.sleep(0)
+                        await manager.send_json_to_topic(topic, {
+                            "topic": topic,
+                            "data": {
+                                "type": "control-status-message",
+                                "initData": {
+                                    "status": "finished_successfully"
+                                }
+                            }
+                        }, websocket)
+                        control_sent = True
+                        # 计划已完成，后续如仍有流数据，继续透传；不强制关闭连接
+            except Exception:
+                # 解析或字段缺失不阻断主流程
+                pass
+    finally:
+        # 连接断开或发送失败时关闭消息流，结束回放文件录制
+        await stream.aclose()
+
+
+async def _no_stream_handler(resp, topic, websocket):
+    logger.info(f"/deep-research/search >>>>>>>>>>> resp: {resp}")
+    await manager.send_json({
+        "topic": topic,
+        "data": {
+            "type": resp.get("contentType") or "multi-modal",
+            "uuid": str(uuid.uuid4()),
+            "timestamp": get_timestamp(),
+            "from": "ai",
+            "initData": resp.get("content"),
+            "promptSentences": resp.get("promptSentences") or [],
+            "roleInfo": resp.get("roleInfo"),
+            "extra": resp.get("extra")
+        }
+    }, websocket)
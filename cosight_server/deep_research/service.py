@@ -22,6 +22,7 @@ from cosight_server.deep_research.services.i18n_service import i18n
 from cosight_server.sdk.common.cache import Cache
 from cosight_server.sdk.common.config import custom_config
 from app.common.logger_util import logger
+from app.cosight.tool.async_runtime import run_coro
 from cosight_server.sdk.common.utils import async_request, extract_and_clean_tags, sync_request
 
 from cosight_server.deep_research.entity import IcenterToken, SearchSource
@@ -37,14 +38,7 @@ def loop_sync_extract_entity(task_name, content) -> dict:
 
 
 def _run_loop_task(task_func, params) -> dict:
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        response = loop.run_until_complete(
-            _async_run_task(task_func, params))
-        return response
-    finally:
-        loop.close()
+    return run_coro(_async_run_task(task_func, params))
 
 
 async def _async_run_task(task_func, params) -> dict:
@@ -0,0 +1,252 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from app.common.logger_util import logger
+from config.config import get_broadcast_config
+
+# 清理空闲主题的最小间隔（秒）
+_REAP_INTERVAL_SECONDS = 10.0
+# 连续多少次积压超限后断开该订阅者
+_MAX_OVERFLOWS = 3
+
+
+class _Topic:
+    """一个主题的消息历史与订阅者；历史在所有订阅者之间共享，消息只保存一份"""
+    __slots__ = ("name", "items", "sizes", "base_seq", "size_bytes", "snapshot_seq", "subscribers",
+                 "closed", "changed", "idle_since", "pinned")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items: deque = deque()
+        self.sizes: deque = deque()
+        # items[0] 的序号
+        self.base_seq = 0
+        self.size_bytes = 0
+        # 最近一条可独立展示的完整快照消息的序号，积压过多的订阅者从这里续上
+        self.snapshot_seq: Optional[int] = None
+        self.subscribers: set = set()
+        self.closed = False
+        self.changed: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.idle_since = time.monotonic()
+        # 发布方固定的主题在没有订阅者时也不会被清理，直到 close
+        self.pinned = False
+
+    @property
+    def next_seq(self) -> int:
+        return self.base_seq + len(self.items)
+
+    def notify(self):
+        if not self.changed.done():
+            self.changed.set_result(None)
+        self.changed = asyncio.get_running_loop().create_future()
+
+
+class Subscription:
+    """按游标读取主题消息的订阅者
+
+    每个订阅者只保存自己的游标，积压（已发布未读取的消息数）上限为 max_lag：
+    超限时跳到最近的完整快照继续（快照追赶），连续多次超限则断开（慢消费者驱逐），不会拖慢发布方与其他订阅者。
+    订阅时已有的历史消息不计入积压，新加入的订阅者可以完整补齐。
+    """
+
+    def __init__(self, hub: "BroadcastHub", topic: _Topic, cursor: int):
+        self._hub = hub
+        self._topic = topic
+        self.cursor = cursor
+        # 积压从游标与该序号中较新的一个算起：订阅时已有的历史与上次超限时的积压不重复计算
+        self._lag_base = topic.next_seq
+        self.overflows = 0
+        self.skipped = 0
+        self.evicted = False
+        self._closed = False
+
+    @property
+    def topic(self) -> str:
+        return self._topic.name
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Any:
+        while True:
+            if self._closed:
+                raise StopAsyncIteration
+            topic = self._topic
+            if self.cursor < topic.next_seq:
+                if self.cursor < topic.base_seq:
+                    # 需要的消息已移出历史，从保留范围内最近的快照续上
+                    self._skip_to(topic.snapshot_seq if topic.snapshot_seq is not None
+                                  and topic.snapshot_seq >= topic.base_seq else topic.base_seq)
+                elif topic.next_seq - max(self.cursor, self._lag_base) > self._hub.max_lag:
+                    self._overflow()
+                    if self._closed:
+                        raise StopAsyncIteration
+                item = topic.items[self.cursor - topic.base_seq]
+                self.cursor += 1
+                return item
+            if topic.closed:
+                self.close()
+                raise StopAsyncIteration
+            # 已追上最新消息，重新累计超限次数
+            self.overflows = 0
+            # 共享的 Future 需 shield，避免某个订阅者被取消时影响其他订阅者
+            await asyncio.shield(topic.changed)
+
+    def _overflow(self):
+        topic = self._topic
+        self.overflows += 1
+        if self.overflows > _MAX_OVERFLOWS:
+            logger.warning(f"Evict slow subscriber of topic {topic.name}, {topic.next_seq - self.cursor} messages behind")
+            self.evicted = True
+            self.close()
+            return
+        if topic.snapshot_seq is not None and topic.snapshot_seq > self.cursor:
+            self._skip_to(topic.snapshot_seq)
+        # 之后再积压 max_lag 条才再次判定超限
+        self._lag_base = topic.next_seq
+
+    def _skip_to(self, seq: int):
+        if seq > self.cursor:
+            logger.info(f"Subscriber of topic {self._topic.name} skips {seq - self.cursor} messages to catch up")
+            self.skipped += seq - self.cursor
+            self.cursor = seq
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._hub._unsubscribe(self._topic, self)
+
+    async def aclose(self):
+        self.close()
+
+
+class BroadcastHub:
+    """按主题的消息广播：发布方只写一次，任意多个订阅者各自按游标读取
+
+    - 消息对象在订阅者之间共享，序列化结果随对象缓存，不按订阅者重复序列化
+    - 主题保留最近的消息历史（条数与字节数受限），新加入的订阅者可从指定游标（如 0）开始补齐
+    - 没有订阅者且空闲超过 idle_seconds 的主题会被清理（发布方通过 pin 固定的主题除外）
+    只能在事件循环线程中使用。
+    """
+
+    def __init__(self, max_lag: Optional[int] = None, history_size: Optional[int] = None,
+                 history_mb: Optional[int] = None, idle_seconds: Optional[int] = None):
+        config = get_broadcast_config()
+        self.max_lag = max_lag if max_lag is not None else config["max_lag"]
+        self._history_size = history_size if history_size is not None else config["history_size"]
+        history_mb = history_mb if history_mb is not None else config["history_mb"]
+        self._history_bytes = history_mb * 1024 * 1024
+        self.idle_seconds = idle_seconds if idle_seconds is not None else config["idle_seconds"]
+        self._topics: Dict[str, _Topic] = {}
+        self._last_reap = time.monotonic()
+
+    def has_topic(self, name: str) -> bool:
+        """主题存在且仍在发布"""
+        topic = self._topics.get(name)
+        return topic is not None and not topic.closed
+
+    def subscriber_count(self, name: str) -> int:
+        topic = self._topics.get(name)
+        return len(topic.subscribers) if topic else 0
+
+    def idle_for(self, name: str) -> float:
+        """主题已没有订阅者的时长（秒），有订阅者时为 0"""
+        topic = self._topics.get(name)
+        if topic is None or topic.subscribers:
+            return 0.0
+        return time.monotonic() - topic.idle_since
+
+    def next_seq(self, name: str) -> int:
+        """下一条发布的消息将获得的序号"""
+        topic = self._topics.get(name)
+        return topic.next_seq if topic else 0
+
+    def _get_topic(self, name: str) -> _Topic:
+        topic = self._topics.get(name)
+        if topic is None or topic.closed:
+            topic = self._topics[name] = _Topic(name)
+        return topic
+
+    def publish(self, name: str, item: Any, size: int = 0, snapshot: bool = False) -> int:
+        """发布一条消息并返回其序号
+
+        Args:
+            size: 消息大小（字节），用于限制历史占用的内存
+            snapshot: 该消息是否为完整快照，积压过多的订阅者会从最近的快照续上
+        """
+        self._reap()
+        topic = self._get_topic(name)
+        seq = topic.next_seq
+        topic.items.append(item)
+        topic.sizes.append(size)
+        topic.size_bytes += size
+        if snapshot:
+            topic.snapshot_seq = seq
+        while len(topic.items) > 1 and (len(topic.items) > self._history_size or topic.size_bytes > self._history_bytes):
+            topic.items.popleft()
+            topic.size_bytes -= topic.sizes.popleft()
+            topic.base_seq += 1
+        topic.notify()
+        return seq
+
+    def subscribe(self, name: str, cursor: Optional[int] = None) -> Subscription:
+        """订阅主题；cursor 为 None 时只接收之后发布的消息，否则从该序号开始
+
+        早于保留历史时从最早的一条开始；超出已发布的序号（如主题清理后重新创建）时只接收之后发布的消息。
+        """
+        self._reap()
+        topic = self._get_topic(name)
+        subscription = Subscription(self, topic, topic.next_seq if cursor is None else min(max(cursor, 0), topic.next_seq))
+        topic.subscribers.add(subscription)
+        return subscription
+
+    def pin(self, name: str):
+        """固定主题，没有订阅者时也保留历史，供之后加入的订阅者从头补齐"""
+        self._get_topic(name).pinned = True
+
+    def close(self, name: str):
+        """主题发布结束：订阅者读完剩余消息后结束迭代，之后不再接受新的订阅"""
+        topic = self._topics.get(name)
+        if topic is None or topic.closed:
+            return
+        topic.closed = True
+        topic.notify()
+        # 已有订阅者持有该主题对象继续读完，同名主题再次发布时重新创建
+        del self._topics[name]
+
+    def _unsubscribe(self, topic: _Topic, subscription: Subscription):
+        topic.subscribers.discard(subscription)
+        if not topic.subscribers:
+            topic.idle_since = time.monotonic()
+
+    def _reap(self):
+        now = time.monotonic()
+        if now - self._last_reap < _REAP_INTERVAL_SECONDS:
+            return
+        self._last_reap = now
+        idle = [name for name, topic in self._topics.items()
+                if not topic.subscribers and not topic.pinned and now - topic.idle_since > self.idle_seconds]
+        for name in idle:
+            del self._topics[name]
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: {"subscribers": len(topic.subscribers), "messages": len(topic.items),
+                       "bytes": topic.size_bytes, "next_seq": topic.next_seq}
+                for name, topic in self._topics.items()}
@@ -260,7 +260,7 @@ Please start analysis:"""
             messages = [{"role": "user", "content": prompt}]
             logger.info(f"开始调用LLM进行可信信息分析，语言: {language}, prompt长度: {len(prompt)}")
             
-            response = llm.chat_to_llm(messages)
+            response = await llm.achat_to_llm(messages)
             logger.info(f"LLM响应长度: {len(response) if response else 0}")
             
             # 解析响应并补全五类
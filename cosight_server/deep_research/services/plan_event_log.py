@@ -0,0 +1,218 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import gzip
+import importlib.util
+import io
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+
+from app.common.logger_util import logger
+from config.config import get_plan_log_config
+
+_HAS_ZSTD = importlib.util.find_spec("zstandard") is not None
+
+# 压缩方式对应的文件后缀，日志实际路径为 基础路径 + 后缀
+COMPRESSION_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+_CLOSE = object()
+
+
+class PlanEventLog:
+    """单个计划的事件日志写入器：每条记录一行紧凑 JSON（NDJSON），由专属后台线程批量写入
+
+    - append 只做序列化并入队，不在调用方线程做磁盘 IO
+    - 后台线程持有同一个文件句柄，攒够 block_kb 或距首条未写记录超过 flush_ms 时写入一次
+    - 开启压缩时每次写入一个独立的 gzip 成员 / zstd 帧，进程中断时只丢失尚未写入的一批
+    - fsync 策略: none 不主动落盘；batch 每批写入后 fsync；close 关闭时 fsync 一次
+    - 包含最终结果的计划另存为 final 文件，同一批内只保留最新一份
+    """
+
+    def __init__(self, path: str, final_path: Optional[str] = None, compression: Optional[str] = None,
+                 fsync: Optional[str] = None, flush_ms: Optional[int] = None, block_kb: Optional[int] = None):
+        config = get_plan_log_config()
+        compression = compression or config["compression"]
+        if compression == "zstd" and not _HAS_ZSTD:
+            logger.warning("zstandard is not installed, plan event log falls back to gzip")
+            compression = "gzip"
+        if compression not in COMPRESSION_SUFFIXES:
+            logger.warning(f"Unknown plan event log compression {compression}, writing uncompressed")
+            compression = "none"
+        self.compression = compression
+        self.path = path + COMPRESSION_SUFFIXES[compression]
+        self.final_path = final_path
+        self._fsync = fsync or config["fsync"]
+        self._flush_seconds = (flush_ms if flush_ms is not None else config["flush_ms"]) / 1000
+        self._block_bytes = (block_kb if block_kb is not None else config["block_kb"]) * 1024
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._closed = False
+        self._records = 0
+        self._thread = threading.Thread(target=self._run, name=f"plan-log-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def append(self, record: Any) -> None:
+        """追加一条记录；无法直接序列化的对象按字符串写入"""
+        if self._closed:
+            logger.warning(f"Plan event log {self.path} is closed, dropping record")
+            return
+        if isinstance(record, (dict, list)):
+            line = json.dumps(record, ensure_ascii=False, default=str)
+        else:
+            line = json.dumps(str(record), ensure_ascii=False)
+        self._records += 1
+        self._queue.put(("line", line + "\n"))
+
+    def write_final(self, record: Any) -> None:
+        """记录计划的最终结果，写入 final 文件（整体替换）"""
+        if self._closed or not self.final_path:
+            return
+        self._queue.put(("final", json.dumps(record, ensure_ascii=False, default=str)))
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """写完已入队的记录后关闭文件；可重复调用"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join(timeout)
+
+    @property
+    def records(self) -> int:
+        return self._records
+
+    def _run(self):
+        lines: List[str] = []
+        size = 0
+        final = None
+        deadline = None
+        handle = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is not None and item is not _CLOSE:
+                    kind, payload = item
+                    if kind == "line":
+                        lines.append(payload)
+                        size += len(payload)
+                    else:
+                        final = payload
+                    if deadline is None:
+                        deadline = time.monotonic() + self._flush_seconds
+                if item is None or item is _CLOSE or size >= self._block_bytes or time.monotonic() >= deadline:
+                    if lines:
+                        handle = handle or self._open()
+                        self._write_block(handle, "".join(lines))
+                    if final is not None:
+                        self._write_final(final)
+                    lines, size, final, deadline = [], 0, None, None
+                if item is _CLOSE:
+                    break
+        except Exception as e:
+            logger.error(f"Plan event log writer for {self.path} failed: {e}", exc_info=True)
+        finally:
+            if handle is not None:
+                try:
+                    if self._fsync in ("close", "batch"):
+                        os.fsync(handle.fileno())
+                    handle.close()
+                except OSError as e:
+                    logger.error(f"Closing plan event log {self.path} failed: {e}")
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return open(self.path, "ab")
+
+    def _write_block(self, handle, text: str):
+        data = text.encode("utf-8")
+        if self.compression == "gzip":
+            data = gzip.compress(data, compresslevel=6)
+        elif self.compression == "zstd":
+            import zstandard
+            data = zstandard.ZstdCompressor(level=3).compress(data)
+        handle.write(data)
+        handle.flush()
+        if self._fsync == "batch":
+            os.fsync(handle.fileno())
+
+    def _write_final(self, content: str):
+        # 先写临时文件再替换，读取方不会看到写了一半的结果
+        temp_path = f"{self.final_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, self.final_path)
+
+
+def find_plan_event_log(path: str) -> Optional[str]:
+    """返回基础路径对应的已存在日志文件（未压缩、gzip 或 zstd），不存在时返回 None"""
+    for suffix in COMPRESSION_SUFFIXES.values():
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return None
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        import zstandard
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def iter_plan_events(path: str, skip: int = 0) -> Iterator[Any]:
+    """按写入顺序逐条读出事件日志中的记录，供回放与断点续传使用
+
+    Args:
+        path: 日志文件路径（可为 find_plan_event_log 的返回值）
+        skip: 跳过前多少条记录，用于从上次读到的位置继续
+
+    兼容旧版以 indent=2 多行写入的日志；正在写入的压缩日志末尾不完整的一批会被忽略。
+    """
+    index = 0
+    pending: List[str] = []
+    with _open_text(path) as f:
+        try:
+            for line in f:
+                if pending:
+                    pending.append(line)
+                    # 旧版多行记录以行首的 } 或 ] 结束
+                    if not line.startswith(("}", "]")):
+                        continue
+                    text, pending = "".join(pending), []
+                else:
+                    text = line.strip()
+                    if not text:
+                        continue
+                try:
+                    record = json.loads(text)
+                except ValueError:
+                    if text in ("{", "["):
+                        pending = [line]
+                    continue
+                if index >= skip:
+                    yield record
+                index += 1
+        except EOFError:
+            logger.debug(f"Plan event log {path} ends with an incomplete block")
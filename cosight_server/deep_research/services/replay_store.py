@@ -0,0 +1,463 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from threading import Lock
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from app.common.logger_util import logger
+from config.config import get_replay_record_config
+
+REPLAY_FILE_NAME = "replay.json"
+DEFAULT_TITLE = "未命名任务"
+
+# 录制时每积累多少条消息写一次索引
+_INDEX_FLUSH_MESSAGES = 50
+# 录制时每个会话文件句柄的缓冲区大小
+_WRITE_BUFFER_BYTES = 64 * 1024
+# 回放时每次在线程中读取的消息数
+_REPLAY_READ_BATCH = 50
+# 按原始节奏回放时，两条消息之间最长等待时间（秒）
+_MAX_REPLAY_GAP_SECONDS = 10.0
+
+
+def extract_title(line: bytes) -> Optional[str]:
+    """从回放记录（一行响应JSON）中读取计划标题"""
+    try:
+        content = json.loads(line).get("content", {})
+        if isinstance(content, str):
+            content = json.loads(content)
+        if isinstance(content, dict):
+            return content.get("title")
+    except Exception:
+        pass
+    return None
+
+
+class ReplayIndex:
+    """回放索引（SQLite）：记录每个工作区 replay.json 的标题、消息数、时间，以及每条消息的字节偏移与录制时间
+
+    - 录制时随写入更新，列出工作区无需读取回放文件
+    - 回放时按偏移直接定位到指定消息，并可按录制时间还原节奏
+    - 索引建立之前已有的回放文件在首次列出时扫描一次补齐，之后列出只查询索引
+    """
+
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        self.path = os.path.join(base_path, "replay_index.db")
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_failed = False
+        self._sync_lock = Lock()
+        self._synced = False
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        """懒加载索引库，打开失败时不再使用索引；须在持有锁时调用"""
+        if self._conn is not None or self._disk_failed:
+            return self._conn
+        try:
+            os.makedirs(self.base_path, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS workspaces (
+                                name TEXT PRIMARY KEY,
+                                title TEXT,
+                                message_count INTEGER NOT NULL,
+                                size INTEGER NOT NULL,
+                                started_at REAL,
+                                updated_at REAL NOT NULL)""")
+            conn.execute("""CREATE TABLE IF NOT EXISTS messages (
+                                workspace TEXT NOT NULL,
+                                seq INTEGER NOT NULL,
+                                offset INTEGER NOT NULL,
+                                length INTEGER NOT NULL,
+                                ts REAL,
+                                PRIMARY KEY (workspace, seq))""")
+            conn.commit()
+            self._conn = conn
+            logger.info(f"Replay index opened at {self.path}")
+        except Exception as e:
+            self._disk_failed = True
+            logger.warning(f"Replay index unavailable: {e}")
+        return self._conn
+
+    def workspace_name(self, workspace_dir: str) -> Optional[str]:
+        """工作区位于 base_path 下时返回其目录名，否则返回 None（不建立索引）"""
+        workspace_dir = os.path.abspath(workspace_dir)
+        if os.path.dirname(workspace_dir) != os.path.abspath(self.base_path):
+            return None
+        return os.path.basename(workspace_dir)
+
+    def append(self, name: str, entries: List[Tuple[int, int, int, Optional[float]]], title: Optional[str] = None):
+        """写入消息索引，entries 为 (序号, 字节偏移, 长度, 录制时间)
+
+        序号由写入方给出，同一条消息重复写入（录制与补齐扫描同时发生）时结果不变。
+        """
+        if not entries:
+            return
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return
+            try:
+                conn.executemany("INSERT OR REPLACE INTO messages (workspace, seq, offset, length, ts) VALUES (?, ?, ?, ?, ?)",
+                                 [(name, seq, offset, length, ts) for seq, offset, length, ts in entries])
+                last_seq, last_offset, last_length, last_ts = entries[-1]
+                conn.execute("INSERT OR IGNORE INTO workspaces (name, title, message_count, size, started_at, updated_at) "
+                             "VALUES (?, NULL, 0, 0, ?, ?)", (name, entries[0][3], last_ts or time.time()))
+                conn.execute("""UPDATE workspaces SET message_count = MAX(message_count, ?), size = MAX(size, ?),
+                                    updated_at = ?, title = COALESCE(title, ?) WHERE name = ?""",
+                             (last_seq + 1, last_offset + last_length, last_ts or time.time(), title, name))
+                conn.commit()
+            except Exception as e:
+                logger.warning(f"Update replay index for {name} failed: {e}")
+
+    def _indexed(self) -> Dict[str, int]:
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return {}
+            return dict(conn.execute("SELECT name, size FROM workspaces").fetchall())
+
+    def scan(self, name: str, from_offset: int = 0, known_count: int = 0):
+        """扫描回放文件（从 from_offset 开始）补齐索引，用于索引建立之前的记录或录制中断的情况"""
+        replay_path = os.path.join(self.base_path, name, REPLAY_FILE_NAME)
+        entries, title = [], None
+        try:
+            mtime = os.path.getmtime(replay_path)
+            with open(replay_path, "rb") as f:
+                f.seek(from_offset)
+                offset = from_offset
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # 最后一行尚未写完
+                        break
+                    if line.strip():
+                        if known_count + len(entries) == 0:
+                            title = extract_title(line)
+                        entries.append((known_count + len(entries), offset, len(line), None))
+                    offset += len(line)
+        except OSError as e:
+            logger.warning(f"Scan replay file {replay_path} failed: {e}")
+            return
+        if entries:
+            self.append(name, entries, title or (DEFAULT_TITLE if not known_count else None))
+        with self._lock:
+            if self._conn is None:
+                return
+            # 空文件也登记，避免每次列出时重复扫描
+            self._conn.execute("INSERT OR IGNORE INTO workspaces (name, title, message_count, size, updated_at) "
+                               "VALUES (?, ?, 0, 0, ?)", (name, DEFAULT_TITLE, mtime))
+            self._conn.execute("UPDATE workspaces SET updated_at = ? WHERE name = ?", (mtime, name))
+            self._conn.commit()
+
+    def refresh(self, name: str) -> Optional[Tuple[int, int]]:
+        """回放文件比索引新（录制中断后未写索引）时补齐尾部；返回 (消息数, 已索引字节数)，无索引时返回 None"""
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return None
+            row = conn.execute("SELECT message_count, size FROM workspaces WHERE name = ?", (name,)).fetchone()
+        replay_path = os.path.join(self.base_path, name, REPLAY_FILE_NAME)
+        try:
+            file_size = os.path.getsize(replay_path)
+        except OSError:
+            return row
+        if row is None or file_size > row[1]:
+            self.scan(name, row[1] if row else 0, row[0] if row else 0)
+            with self._lock:
+                row = self._conn.execute("SELECT message_count, size FROM workspaces WHERE name = ?",
+                                         (name,)).fetchone()
+        return row
+
+    def sync(self):
+        """补齐未建立索引的工作区，清理已删除的工作区"""
+        if not os.path.isdir(self.base_path):
+            return
+        indexed = self._indexed()
+        names = set()
+        for name in os.listdir(self.base_path):
+            if name in indexed:
+                names.add(name)
+            elif os.path.isfile(os.path.join(self.base_path, name, REPLAY_FILE_NAME)):
+                names.add(name)
+                self.scan(name)
+        self._forget([name for name in indexed if name not in names])
+
+    def _forget(self, names: List[str]):
+        if not names:
+            return
+        with self._lock:
+            if self._conn is not None:
+                self._conn.executemany("DELETE FROM messages WHERE workspace = ?", [(name,) for name in names])
+                self._conn.executemany("DELETE FROM workspaces WHERE name = ?", [(name,) for name in names])
+                self._conn.commit()
+
+    def ensure_synced(self):
+        """首次使用时与工作区目录同步一次；之后录制随写入更新索引，无需再遍历目录"""
+        with self._sync_lock:
+            if not self._synced:
+                self.sync()
+                self._synced = True
+
+    def list_workspaces(self, offset: int = 0, limit: int = 0) -> Tuple[int, List[Dict[str, Any]]]:
+        """按工作区名称倒序（即创建时间倒序）分页列出，limit 为 0 时返回全部；返回 (总数, 当前页)"""
+        self.ensure_synced()
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return 0, []
+            total = conn.execute("SELECT COUNT(*) FROM workspaces").fetchone()[0]
+            rows = conn.execute("SELECT name, title, message_count, updated_at FROM workspaces "
+                                "ORDER BY name DESC LIMIT ? OFFSET ?",
+                                (limit if limit > 0 else -1, max(offset, 0))).fetchall()
+        # 只检查当前页，清理已被删除的工作区
+        removed = [row[0] for row in rows if not os.path.isdir(os.path.join(self.base_path, row[0]))]
+        if removed:
+            self._forget(removed)
+            total -= len(removed)
+            rows = [row for row in rows if row[0] not in removed]
+        return total, [{"name": name, "title": title or DEFAULT_TITLE, "message_count": message_count,
+                        "updated_at": updated_at} for name, title, message_count, updated_at in rows]
+
+    def locate(self, name: str, seq: int) -> Optional[Tuple[int, int]]:
+        """返回第 seq 条消息的字节偏移与索引中的消息总数；未建立索引时返回 None"""
+        row = self.refresh(name)
+        if row is None:
+            return None
+        message_count, size = row
+        with self._lock:
+            if seq >= message_count:
+                return size, message_count
+            row = self._conn.execute("SELECT offset FROM messages WHERE workspace = ? AND seq = ?",
+                                     (name, max(seq, 0))).fetchone()
+        return (row[0] if row else 0), message_count
+
+    def timestamps(self, name: str, start: int) -> Dict[int, Optional[float]]:
+        with self._lock:
+            conn = self._get_conn()
+            if conn is None:
+                return {}
+            return dict(conn.execute("SELECT seq, ts FROM messages WHERE workspace = ? AND seq >= ?",
+                                     (name, start)).fetchall())
+
+
+class ReplayRecorder:
+    """录制一个会话的回放文件，并随写入更新回放索引
+
+    写入通过 replay_writer 交给后台写线程完成：文件句柄在首次写入时打开并一直保持到 close，
+    事件循环线程只负责入队，不做磁盘 IO。
+    """
+
+    def __init__(self, index: ReplayIndex, workspace_dir: str, writer: Optional["ReplayWriter"] = None):
+        self.index = index
+        self.path = os.path.join(workspace_dir, REPLAY_FILE_NAME)
+        self.name = index.workspace_name(workspace_dir)
+        self.writer = writer or replay_writer
+        self.closed = threading.Event()
+        # 以下状态只在写线程中访问
+        self._handle = None
+        self._offset = 0
+        self._seq = 0
+        self._title = None
+        self._entries: List[Tuple[int, int, int, Optional[float]]] = []
+        self._closing = False
+
+    async def write(self, chunk: bytes):
+        """写入一条消息（统一以换行结束）；写队列已满时等待空位"""
+        if chunk and not self._closing:
+            await self.writer.put(self, chunk, time.time())
+
+    def close(self):
+        """写完已入队的消息后关闭文件；不等待，可重复调用"""
+        if not self._closing:
+            self._closing = True
+            self.writer.close(self)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._handle = open(self.path, "ab", buffering=_WRITE_BUFFER_BYTES)
+        self._offset = self._handle.tell()
+        if self.name is not None and self._offset:
+            # 在已有回放文件后继续录制，先让索引与文件一致
+            row = self.index.refresh(self.name)
+            self._seq = row[0] if row else 0
+
+    def _write(self, chunk: bytes, ts: float):
+        if self._handle is None:
+            self._open()
+        if not chunk.endswith(b"\n"):
+            chunk += b"\n"
+        self._handle.write(chunk)
+        if self.name is None:
+            return
+        if self._seq == 0:
+            self._title = extract_title(chunk)
+        self._entries.append((self._seq, self._offset, len(chunk), ts))
+        self._offset += len(chunk)
+        self._seq += 1
+        if len(self._entries) >= _INDEX_FLUSH_MESSAGES:
+            self._flush()
+
+    def _flush(self):
+        """文件缓冲写入磁盘后再更新索引，保证索引中的偏移都可读"""
+        if self._handle is not None:
+            self._handle.flush()
+        if self.name is not None and self._entries:
+            entries, self._entries = self._entries, []
+            self.index.append(self.name, entries, self._title)
+
+    def _close(self):
+        try:
+            self._flush()
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+        finally:
+            self.closed.set()
+
+
+class ReplayWriter:
+    """回放文件的后台写线程，所有会话共用
+
+    - 写入请求进入队列，待写入的消息数超过 queue_size 时，写入方等待空位（不阻塞事件循环）
+    - 每个会话保持一个带缓冲的文件句柄，每隔 flush_ms 把有新数据的会话刷盘并更新索引
+    - 会话关闭时写完已入队的消息再关闭句柄
+    """
+
+    def __init__(self, queue_size: Optional[int] = None, flush_ms: Optional[int] = None):
+        config = get_replay_record_config()
+        self._queue_size = queue_size if queue_size is not None else config["queue_size"]
+        self._flush_seconds = (flush_ms if flush_ms is not None else config["flush_ms"]) / 1000
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._slots = threading.Semaphore(self._queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="replay-writer", daemon=True)
+                self._thread.start()
+
+    async def put(self, recorder: ReplayRecorder, chunk: bytes, ts: float):
+        if not self._slots.acquire(blocking=False):
+            acquiring = asyncio.ensure_future(asyncio.to_thread(self._slots.acquire))
+            try:
+                await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # 线程中的等待无法取消，取得名额后立即归还，避免名额泄漏
+                acquiring.add_done_callback(lambda _: self._slots.release())
+                raise
+        self._ensure_started()
+        self._queue.put((recorder, chunk, ts))
+
+    def close(self, recorder: ReplayRecorder):
+        # 关闭请求不占用队列名额，保证在队列已满时也能投递
+        self._ensure_started()
+        self._queue.put((recorder, None, None))
+
+    def _run(self):
+        dirty = set()
+        next_flush = time.monotonic() + self._flush_seconds
+        while True:
+            try:
+                recorder, chunk, ts = self._queue.get(timeout=max(next_flush - time.monotonic(), 0))
+            except queue.Empty:
+                recorder = None
+            if recorder is not None:
+                try:
+                    if chunk is None:
+                        dirty.discard(recorder)
+                        recorder._close()
+                    else:
+                        recorder._write(chunk, ts)
+                        dirty.add(recorder)
+                except Exception as e:
+                    logger.error(f"Write replay file {recorder.path} failed: {e}", exc_info=True)
+                finally:
+                    if chunk is not None:
+                        self._slots.release()
+            if time.monotonic() >= next_flush:
+                for item in dirty:
+                    try:
+                        item._flush()
+                    except Exception as e:
+                        logger.error(f"Flush replay file {item.path} failed: {e}")
+                dirty.clear()
+                next_flush = time.monotonic() + self._flush_seconds
+
+
+replay_writer = ReplayWriter()
+
+
+def iter_replay(index: ReplayIndex, workspace_dir: str, start: int = 0) -> Iterator[Tuple[Optional[float], bytes]]:
+    """从第 start 条消息开始逐条读出回放记录，返回 (录制时间, 消息)；有索引时直接定位，否则顺序跳过"""
+    replay_path = os.path.join(workspace_dir, REPLAY_FILE_NAME)
+    name = index.workspace_name(workspace_dir)
+    located = index.locate(name, start) if name else None
+    timestamps = index.timestamps(name, start) if located else {}
+    seq = start if located else 0
+    with open(replay_path, "rb") as f:
+        if located:
+            f.seek(located[0])
+        for line in f:
+            if not line.strip():
+                continue
+            if seq >= start:
+                yield timestamps.get(seq), line.rstrip(b"\n")
+            seq += 1
+
+
+async def aiter_replay(index: ReplayIndex, workspace_dir: str,
+                       start: int = 0) -> AsyncIterator[Tuple[Optional[float], bytes]]:
+    """iter_replay 的异步版本：索引查询与文件读取按批在线程中完成，不阻塞事件循环"""
+    records = iter_replay(index, workspace_dir, start)
+    try:
+        while True:
+            batch = await asyncio.to_thread(lambda: list(itertools.islice(records, _REPLAY_READ_BATCH)))
+            for record in batch:
+                yield record
+            if len(batch) < _REPLAY_READ_BATCH:
+                return
+    finally:
+        try:
+            records.close()
+        except ValueError:
+            # 取消时线程中的读取尚未结束，文件随生成器回收关闭
+            pass
+
+
+def replay_delay(pacing: str, speed: float, interval: float, previous_ts: Optional[float],
+                 ts: Optional[float]) -> float:
+    """两条回放消息之间的等待时间
+
+    Args:
+        pacing: original 按录制时的间隔；fixed 固定间隔；instant 不等待
+        speed: 播放倍速
+        interval: fixed 模式（以及无录制时间的旧记录）的间隔（秒）
+    """
+    if pacing == "instant" or speed <= 0:
+        return 0.0
+    if pacing == "original" and previous_ts is not None and ts is not None:
+        return min(max(ts - previous_ts, 0.0), _MAX_REPLAY_GAP_SECONDS) / speed
+    return interval / speed
@@ -5,6 +5,9 @@ class MessageService {
         // 存储当前step的pending tool starts (等待complete的tool_start消息)
         this.pendingToolStarts = new Map(); // stepIndex -> Array of tool_start events
 
+        // 最近一次完整的计划数据，用于合并 changeType=patch 的增量消息
+        this.latestPlan = null;
+
         // 恢复本地存储的step tool events
         this.restoreStepToolEvents();
     }
@@ -77,11 +80,26 @@ class MessageService {
     }
 
     stepMessageHandler(messageData) {
+        // 增量消息先合并到最近一次的完整计划上，再按全量消息处理
+        if (messageData.data?.changeType === 'patch') {
+            messageData = this.applyPlanPatch(messageData);
+            if (!messageData) {
+                return;
+            }
+        } else if (messageData.data?.changeType === 'append') {
+            // 最终总结/步骤备注的流式片段，追加到最近一次的完整计划上
+            messageData = this.applyPlanAppend(messageData);
+            if (!messageData) {
+                return;
+            }
+        }
+
         // 调用 createDag 方法来创建DAG图
         const result = createDag(messageData);
         if (!result) {
             return;
         }
+        this.latestPlan = messageData.data?.content || messageData.data?.initData || null;
 
         // 成功后持久化消息到本地以便刷新恢复
         try {
@@ -115,6 +133,81 @@ class MessageService {
         }
     }
 
+    /**
+     * 将 changeType=patch 的计划增量合并为完整计划消息
+     * 基准版本不一致（如刷新后中途接入）时丢弃，等待服务端下一次全量
+     */
+    applyPlanPatch(messageData) {
+        const patch = messageData.data?.content || messageData.data?.initData;
+        const base = this.latestPlan;
+        if (!patch || !base || base.version !== patch.base_version) {
+            console.warn('计划增量与本地版本不匹配，等待下一次全量', patch?.base_version, base?.version);
+            return null;
+        }
+
+        const stepFields = ['step_statuses', 'step_notes', 'step_details', 'step_files', 'step_tool_calls'];
+        const merged = { ...base };
+        Object.keys(patch).forEach(key => {
+            if (key === 'base_version') {
+                return;
+            }
+            if (key === 'step_tool_calls_append') {
+                const toolCalls = { ...(merged.step_tool_calls || {}) };
+                Object.entries(patch[key]).forEach(([step, calls]) => {
+                    toolCalls[step] = [...(toolCalls[step] || []), ...calls];
+                });
+                merged.step_tool_calls = toolCalls;
+            } else if (stepFields.includes(key)) {
+                merged[key] = { ...(merged[key] || {}), ...patch[key] };
+            } else {
+                merged[key] = patch[key];
+            }
+        });
+
+        return {
+            ...messageData,
+            data: {
+                ...messageData.data,
+                changeType: 'replace',
+                content: messageData.data?.content ? merged : undefined,
+                initData: messageData.data?.content ? messageData.data.initData : merged
+            }
+        };
+    }
+
+    /**
+     * 将 changeType=append 的流式片段（target 为 result 或 step_notes）追加为完整计划消息
+     * 片段不改变计划版本，后续的计划全量/增量消息会以完整内容覆盖
+     */
+    applyPlanAppend(messageData) {
+        const fragment = messageData.data?.content || messageData.data?.initData;
+        const base = this.latestPlan;
+        if (!fragment || !base) {
+            return null;
+        }
+
+        const merged = { ...base };
+        if (fragment.target === 'result') {
+            merged.result = fragment.reset ? '' : (merged.result || '') + (fragment.delta || '');
+        } else if (fragment.target === 'step_notes' && fragment.step) {
+            const stepNotes = { ...(merged.step_notes || {}) };
+            stepNotes[fragment.step] = fragment.reset ? '' : (stepNotes[fragment.step] || '') + (fragment.delta || '');
+            merged.step_notes = stepNotes;
+        } else {
+            return null;
+        }
+
+        return {
+            ...messageData,
+            data: {
+                ...messageData.data,
+                changeType: 'replace',
+                content: messageData.data?.content ? merged : undefined,
+                initData: messageData.data?.content ? messageData.data.initData : merged
+            }
+        };
+    }
+
     /**
      * 基于topic生成并复用稳定的planId(messageSerialNumber)
      */
@@ -174,6 +267,28 @@ class MessageService {
         const stepEvents = this.stepToolEvents.get(stepIndex);
         const pendingStarts = this.pendingToolStarts.get(stepIndex);
 
+        if (eventType === 'tool_update') {
+            // 已完成工具事件的后续更新（如搜索结果的iframe可嵌入性检查结论），按sequence替换处理结果
+            const record = stepEvents.find(record =>
+                record.complete_event &&
+                record.complete_event.sequence === toolEventData.sequence &&
+                record.tool_name === toolEventData.tool_name
+            );
+            if (record) {
+                record.tool_result = toolEventData.processed_result || record.tool_result;
+                record.complete_event = {
+                    ...record.complete_event,
+                    processed_result: toolEventData.processed_result,
+                    extra: toolEventData.extra || record.complete_event.extra
+                };
+                this.updateStepPanel(stepIndex, record);
+                this.persistStepToolEvents();
+            } else {
+                console.warn(`未找到需要更新的工具记录: ${toolEventData.tool_name}, sequence: ${toolEventData.sequence}`);
+            }
+            return;
+        }
+
         if (eventType === 'tool_start') {
             // 处理tool_start消息
             const toolStartEvent = {
@@ -9,6 +9,8 @@ class WebsocketService {
         this._webSocketPath = '/api/openans-support-chatbot/v1/robot/wss/messages';
         this._topics = [];
         this._subscribers = {};
+        // 各topic已收到的最后一条消息序号，重新订阅时据此从服务端补齐断线期间的消息
+        this._lastSeq = {};
         this._receiveMessage = new EventTarget();
         this._tryCount = 1;
         this.MAX_RETRY = Infinity;
@@ -129,6 +131,7 @@ class WebsocketService {
             if (this._subscribers[topic]) {
                 this._subscribers[topic].unsubscribe();
             }
+            delete this._lastSeq[topic];
             if (this._topics.indexOf(topic) !== -1) {
                 this._topics.splice(this._topics.indexOf(topic), 1);
             }
@@ -138,6 +141,7 @@ class WebsocketService {
                 this._subscribers[subscriber].unsubscribe();
             });
             this._topics = [];
+            this._lastSeq = {};
         }
     }
 
@@ -256,6 +260,10 @@ class WebsocketService {
             return;
         }
 
+        if (respData.topic && Number.isInteger(respData.seq)) {
+            this._lastSeq[respData.topic] = respData.seq;
+        }
+
         // 触发自定义事件
         this._receiveMessage.dispatchEvent(new CustomEvent('message', {
             detail: respData
@@ -288,6 +296,10 @@ class WebsocketService {
                 action: 'subscribe',
                 topic: topic
             };
+            // 已收到过该topic的消息时，从下一条开始补齐
+            if (Number.isInteger(this._lastSeq[topic])) {
+                data.cursor = this._lastSeq[topic] + 1;
+            }
             this._webSocket.send(JSON.stringify(data));
         } catch (e) {
             console.warn('发送subscribe失败:', e);
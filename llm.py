@@ -12,44 +12,28 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
-import httpx
-from openai import OpenAI
-
 from app.common.logger_util import logger
 from app.cosight.llm.chat_llm import ChatLLM
 from config.config import *
 
 
 def set_model(model_config: dict[str, Optional[str | int | float]]):
-    http_client_kwargs = {
-        "headers": {
-            'Content-Type': 'application/json',
-            'Authorization': model_config['api_key']
-        },
-        "verify": False,
-        "trust_env": False
-    }
-
-    if model_config['proxy']:
-        http_client_kwargs["proxy"] = model_config['proxy']
-
-    openai_llm = OpenAI(
-        base_url=model_config['base_url'],
-        api_key=model_config['api_key'],
-        http_client=httpx.Client(**http_client_kwargs)
-    )
-
+    # 模型客户端按 base_url 共享连接池，在首次调用时于所在事件循环中创建
     chat_llm_kwargs = {
         "model": model_config['model'],
         "base_url": model_config['base_url'],
         "api_key": model_config['api_key'],
-        "client": openai_llm
+        "proxy": model_config['proxy']
     }
 
     if model_config.get('max_tokens') is not None:
         chat_llm_kwargs['max_tokens'] = model_config['max_tokens']
     if model_config.get('temperature') is not None:
         chat_llm_kwargs['temperature'] = model_config['temperature']
+    if model_config.get('rpm') is not None:
+        chat_llm_kwargs['rpm'] = model_config['rpm']
+    if model_config.get('tpm') is not None:
+        chat_llm_kwargs['tpm'] = model_config['tpm']
 
     return ChatLLM(**chat_llm_kwargs)
 
@@ -0,0 +1,122 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""网页正文提取性能对比
+
+对一组保存在本地的网页，比较原先的 BeautifulSoup(html.parser) 提取方式与 html_extract 各解析后端的耗时。
+
+用法:
+    # 先把待测网页保存到语料目录（每行一个URL）
+    python tools/bench_html_extract.py --corpus bench_pages --save urls.txt
+    # 运行对比
+    python tools/bench_html_extract.py --corpus bench_pages --repeat 5
+    python tools/bench_html_extract.py --corpus bench_pages --main-content
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.cosight.tool.html_extract import DROP_TAGS, BOILERPLATE_TAGS, extract_text  # noqa: E402
+
+
+def baseline_extract(html: str) -> str:
+    """原先 fetch_url_content 中的提取方式"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    for element in soup(["script", "style", "nav", "footer", "iframe", "noscript"]):
+        element.decompose()
+    text = soup.get_text(separator='\n')
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+def save_pages(url_file: Path, corpus: Path) -> None:
+    import requests
+    corpus.mkdir(parents=True, exist_ok=True)
+    for url in url_file.read_text(encoding="utf-8").split():
+        try:
+            response = requests.get(url, timeout=30, headers={"User-Agent": "Mozilla/5.0"})
+            response.raise_for_status()
+        except Exception as e:
+            print(f"跳过 {url}: {e}")
+            continue
+        response.encoding = response.apparent_encoding
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16] + ".html"
+        (corpus / name).write_text(response.text, encoding="utf-8")
+        print(f"已保存 {url} -> {name} ({len(response.text)} 字符)")
+
+
+def measure(extract, pages, repeat: int):
+    """返回 (每页耗时中位数列表(ms), 输出总字符数)"""
+    per_page = []
+    output_chars = 0
+    for html in pages:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            text = extract(html)
+            timings.append((time.perf_counter() - start) * 1000)
+        per_page.append(statistics.median(timings))
+        output_chars += len(text)
+    return per_page, output_chars
+
+
+def main():
+    parser = argparse.ArgumentParser(description="网页正文提取性能对比")
+    parser.add_argument("--corpus", required=True, type=Path, help="保存网页（*.html）的目录")
+    parser.add_argument("--save", type=Path, help="先抓取该文件中的URL（每行一个）保存到语料目录")
+    parser.add_argument("--repeat", type=int, default=3, help="每个页面重复次数，取中位数")
+    parser.add_argument("--main-content", action="store_true", help="html_extract 使用正文模式")
+    args = parser.parse_args()
+
+    if args.save:
+        save_pages(args.save, args.corpus)
+    pages = [path.read_text(encoding="utf-8", errors="replace")
+             for path in sorted(args.corpus.glob("*.htm*"))]
+    if not pages:
+        sys.exit(f"{args.corpus} 中没有 .html 文件")
+    print(f"语料: {len(pages)} 个页面, 共 {sum(len(page) for page in pages) / 1024 / 1024:.1f} MB 字符, "
+          f"每页重复 {args.repeat} 次\n")
+
+    drop_tags = DROP_TAGS + BOILERPLATE_TAGS
+    candidates = [("baseline bs4/html.parser", baseline_extract)]
+    for backend, module in (("selectolax", "selectolax"), ("lxml", "lxml"), ("bs4", "bs4")):
+        if importlib.util.find_spec(module) is None:
+            print(f"未安装 {module}，跳过 {backend} 后端")
+            continue
+        candidates.append((f"html_extract/{backend}",
+                           lambda html, backend=backend: extract_text(html, args.main_content, drop_tags, backend)))
+
+    baseline_total = None
+    print(f"\n{'方式':<28}{'总计(ms)':>12}{'中位数(ms)':>12}{'P95(ms)':>12}{'输出字符':>12}{'加速比':>10}")
+    for name, extract in candidates:
+        per_page, output_chars = measure(extract, pages, args.repeat)
+        total = sum(per_page)
+        baseline_total = baseline_total or total
+        p95 = sorted(per_page)[max(int(len(per_page) * 0.95) - 1, 0)]
+        print(f"{name:<28}{total:>12.1f}{statistics.median(per_page):>12.2f}{p95:>12.2f}"
+              f"{output_chars:>12}{baseline_total / total:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Copyright 2025 ZTE Corporation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""回放录制吞吐对比
+
+模拟多个并发会话同时录制 replay.json，比较原先每条消息在事件循环线程中重新打开文件追加写入的方式，
+与 ReplayRecorder 后台写线程方式的总耗时、吞吐，以及事件循环的调度延迟（反映其他客户端被阻塞的程度）。
+
+用法:
+    python tools/bench_replay_recording.py --sessions 200 --messages 100 --message-kb 8
+    python tools/bench_replay_recording.py --sessions 50 --messages 50 --message-kb 256 --queue-size 2000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cosight_server.deep_research.services.replay_store import (  # noqa: E402
+    ReplayIndex, ReplayRecorder, ReplayWriter, iter_replay)
+
+
+def make_message(index: int, size: int) -> bytes:
+    payload = {"contentType": "lui-message-manus-step", "code": 0, "message": "ok",
+               "content": {"title": "回放录制测试", "index": index, "padding": "x" * size}}
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+async def monitor_loop(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    """周期性休眠，记录实际唤醒时间比预期晚了多少（毫秒）"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append((loop.time() - expected) * 1000)
+
+
+async def session_reopen(workspace: str, messages, _):
+    """原方式：每条消息打开一次文件追加写入"""
+    path = os.path.join(workspace, "replay.json")
+    for message in messages:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(message.decode("utf-8"))
+        await asyncio.sleep(0)
+
+
+async def session_sink(workspace: str, messages, context):
+    index, writer = context
+    recorder = ReplayRecorder(index, workspace, writer)
+    try:
+        for message in messages:
+            await recorder.write(message)
+            await asyncio.sleep(0)
+    finally:
+        recorder.close()
+    await asyncio.to_thread(recorder.closed.wait)
+
+
+async def run(mode: str, base: str, sessions: int, messages, context):
+    workspaces = []
+    for i in range(sessions):
+        workspace = os.path.join(base, f"work_space_{mode}_{i:05d}")
+        os.makedirs(workspace, exist_ok=True)
+        workspaces.append(workspace)
+    session = session_reopen if mode == "reopen" else session_sink
+    stop, lags = asyncio.Event(), []
+    monitor = asyncio.create_task(monitor_loop(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(session(workspace, messages, context) for workspace in workspaces))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    return elapsed, lags, workspaces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制吞吐对比")
+    parser.add_argument("--sessions", type=int, default=200, help="并发会话数")
+    parser.add_argument("--messages", type=int, default=100, help="每个会话的消息数")
+    parser.add_argument("--message-kb", type=int, default=8, help="每条消息的大小（KB）")
+    parser.add_argument("--queue-size", type=int, default=10000, help="后台写线程待写入消息数上限")
+    parser.add_argument("--flush-ms", type=int, default=1000, help="后台写线程刷盘间隔（毫秒）")
+    parser.add_argument("--dir", type=Path, help="测试目录，默认使用临时目录（结束后删除）")
+    args = parser.parse_args()
+
+    base = str(args.dir) if args.dir else tempfile.mkdtemp(prefix="bench_replay_")
+    os.makedirs(base, exist_ok=True)
+    messages = [make_message(i, args.message_kb * 1024) for i in range(args.messages)]
+    total_mb = sum(len(message) for message in messages) * args.sessions / 1024 / 1024
+    print(f"{args.sessions} 个会话 x {args.messages} 条消息, 共 {total_mb:.1f} MB\n")
+
+    index = ReplayIndex(base)
+    context = (index, ReplayWriter(args.queue_size, args.flush_ms))
+    print(f"{'方式':<10}{'耗时(s)':>10}{'吞吐(MB/s)':>12}{'循环延迟P50(ms)':>18}{'P99(ms)':>10}{'最大(ms)':>10}")
+    try:
+        for mode in ("reopen", "sink"):
+            elapsed, lags, workspaces = asyncio.run(run(mode, base, args.sessions, messages, context))
+            lags = sorted(lags) or [0.0]
+            p99 = lags[max(int(len(lags) * 0.99) - 1, 0)]
+            print(f"{mode:<10}{elapsed:>10.2f}{total_mb / elapsed:>12.1f}{statistics.median(lags):>18.2f}"
+                  f"{p99:>10.2f}{lags[-1]:>10.2f}")
+            # 校验录制结果完整
+            for workspace in workspaces:
+                count = sum(1 for _ in iter_replay(index, workspace))
+                if count != args.messages:
+                    sys.exit(f"{workspace} 只录制了 {count}/{args.messages} 条消息")
+    finally:
+        if not args.dir:
+            shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()